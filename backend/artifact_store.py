@@ -0,0 +1,165 @@
+"""
+artifact_store.py
+
+Content-addressed local store for raw GitHub artifacts (patches, diffs, PR/commit/review payloads).
+
+Blobs are zlib-compressed and stored once under objects/<sha[:2]>/<sha>.z, keyed by the
+SHA-256 of their uncompressed bytes. A small SQLite index maps (repo, pr_number, kind)
+to a blob hash plus optional JSON metadata, so identical content fetched through
+different paths is stored only once. Every GitHub fetch path reads through this store,
+so re-analysis with a new prompt or model never touches the network again.
+
+Configure with ARTIFACT_STORE_DIR, or set ARTIFACT_STORE_DISABLED=1 to bypass it.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARTIFACT_STORE_DIR = os.getenv("ARTIFACT_STORE_DIR", os.path.join(BASE_DIR, "artifacts"))
+ARTIFACT_STORE_ENABLED = os.getenv("ARTIFACT_STORE_DISABLED", "") != "1"
+
+
+class ArtifactStore:
+    """Local, compressed, content-addressed store of raw PR artifacts."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "index.db"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS artifacts (
+                repo TEXT NOT NULL,
+                pr_number INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                meta TEXT,
+                stored_at TEXT NOT NULL,
+                PRIMARY KEY (repo, pr_number, kind)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def _object_path(self, sha: str) -> str:
+        return os.path.join(self.objects_dir, sha[:2], sha + ".z")
+
+    def put(self, repo: str, pr_number: int, kind: str, data: bytes, meta: Optional[Dict[str, Any]] = None) -> str:
+        """Store data for (repo, pr_number, kind) and return its content hash."""
+        sha = hashlib.sha256(data).hexdigest()
+        path = self._object_path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(zlib.compress(data, 6))
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts (repo, pr_number, kind, sha256, size, meta, stored_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (repo, int(pr_number), kind, sha, len(data), json.dumps(meta) if meta else None,
+                 datetime.now(timezone.utc).isoformat()),
+            )
+            self._conn.commit()
+        return sha
+
+    def get_with_meta(self, repo: str, pr_number: int, kind: str) -> Tuple[Optional[bytes], Optional[Dict[str, Any]]]:
+        """Return (data, meta) for (repo, pr_number, kind), or (None, None) if not stored."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256, meta FROM artifacts WHERE repo = ? AND pr_number = ? AND kind = ?",
+                (repo, int(pr_number), kind),
+            ).fetchone()
+        if not row:
+            return None, None
+        try:
+            with open(self._object_path(row[0]), "rb") as f:
+                data = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            return None, None
+        if hashlib.sha256(data).hexdigest() != row[0]:
+            print(f"[STORE] Checksum mismatch for {repo}#{pr_number} {kind}. Ignoring stored copy.")
+            return None, None
+        return data, json.loads(row[1]) if row[1] else {}
+
+    def get(self, repo: str, pr_number: int, kind: str) -> Optional[bytes]:
+        return self.get_with_meta(repo, pr_number, kind)[0]
+
+    def put_text(self, repo: str, pr_number: int, kind: str, text: str, meta: Optional[Dict[str, Any]] = None) -> str:
+        return self.put(repo, pr_number, kind, text.encode("utf-8"), meta)
+
+    def get_text(self, repo: str, pr_number: int, kind: str) -> Optional[str]:
+        data = self.get(repo, pr_number, kind)
+        return data.decode("utf-8") if data is not None else None
+
+    def put_json(self, repo: str, pr_number: int, kind: str, value: Any) -> str:
+        return self.put(repo, pr_number, kind, json.dumps(value, sort_keys=True).encode("utf-8"))
+
+    def get_json(self, repo: str, pr_number: int, kind: str) -> Any:
+        data = self.get(repo, pr_number, kind)
+        return json.loads(data) if data is not None else None
+
+    def has(self, repo: str, pr_number: int, kind: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM artifacts WHERE repo = ? AND pr_number = ? AND kind = ?",
+                (repo, int(pr_number), kind),
+            ).fetchone() is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, raw_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts").fetchone()
+        return {"artifacts": count, "raw_bytes": raw_bytes}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> Optional[ArtifactStore]:
+    """Return the process-wide artifact store, or None if it is disabled."""
+    global _store
+    if not ARTIFACT_STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore(ARTIFACT_STORE_DIR)
+    return _store
+
+
+def read_through_text(repo: str, pr_number: int, kind: str, fetch: Callable[[], str]) -> str:
+    """Return stored text for (repo, pr_number, kind), calling fetch() and storing it on a miss."""
+    store = get_store()
+    if store is None:
+        return fetch()
+    text = store.get_text(repo, pr_number, kind)
+    if text is None:
+        text = fetch()
+        store.put_text(repo, pr_number, kind, text)
+    return text
+
+
+def read_through_json(repo: str, pr_number: int, kind: str, fetch: Callable[[], Any]) -> Any:
+    """Return a stored JSON payload for (repo, pr_number, kind), calling fetch() and storing it on a miss."""
+    store = get_store()
+    if store is None:
+        return fetch()
+    value = store.get_json(repo, pr_number, kind)
+    if value is None:
+        value = fetch()
+        store.put_json(repo, pr_number, kind, value)
+    return value
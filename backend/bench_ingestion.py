@@ -0,0 +1,176 @@
+"""
+bench_ingestion.py
+
+Offline throughput benchmark for each GitHub ingestion path, run against github_standin.
+
+Reports PRs/min, total requests per PR and API requests per PR (requests to api.github.com
+paths, which are the ones that spend rate-limit budget) for every path.
+
+Usage:
+    python bench_ingestion.py --synthesize --prs 100 --latency-ms 50
+    python bench_ingestion.py --cassettes cassettes/react --repo facebook/react --prs 50 --paths rest graphql
+    python bench_ingestion.py --synthesize --rate-limit 200 --error-rate 0.02 --paths rest-threaded
+
+The response cache and artifact store are disabled so every run measures the network path.
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from github_standin import FaultConfig, start_standin_process, synthesize_cassettes
+
+
+def _run_rest(github_client, owner, repo, pr_numbers, args):
+    for pr_number in pr_numbers:
+        github_client.fetch_comprehensive_pr_metadata(owner, repo, pr_number)
+
+
+def _run_rest_threaded(github_client, owner, repo, pr_numbers, args):
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        list(executor.map(lambda n: github_client.fetch_comprehensive_pr_metadata(owner, repo, n), pr_numbers))
+
+
+def _run_async(github_client, owner, repo, pr_numbers, args):
+    asyncio.run(github_client.afetch_comprehensive_pr_metadata_batch(owner, repo, pr_numbers, concurrency=args.workers))
+
+
+def _run_graphql(github_client, owner, repo, pr_numbers, args):
+    github_client.fetch_pr_metadata_batch_graphql(owner, repo, pr_numbers)
+
+
+def _run_listing(github_client, owner, repo, pr_numbers, args):
+    for _ in github_client.iter_merged_prs(owner, repo, limit=len(pr_numbers)):
+        pass
+
+
+def _run_scraper(github_client, owner, repo, pr_numbers, args):
+    import scraper
+    token_manager = scraper.TokenManager(["bench-token-1", "bench-token-2"])
+    failed = 0
+    for pr_number in pr_numbers:
+        success, _ = scraper.download_patch(pr_number, token_manager, repo=f"{owner}/{repo}")
+        failed += not success
+    if failed:
+        raise Exception(f"{failed} of {len(pr_numbers)} downloads failed")
+
+
+def _run_scraper_async(github_client, owner, repo, pr_numbers, args, controller=None):
+    import scraper
+    token_manager = scraper.TokenManager(["bench-token-1", "bench-token-2"])
+    jobs = [(f"{owner}/{repo}", pr_number) for pr_number in pr_numbers]
+    _, failed = asyncio.run(scraper.download_all_async(jobs, token_manager, max(1, args.workers // 2), controller))
+    if failed:
+        raise Exception(f"{failed} of {len(pr_numbers)} downloads failed")
+
+
+def _run_scraper_aimd(github_client, owner, repo, pr_numbers, args):
+    import scraper
+    controller = scraper.AIMDController()
+    try:
+        _run_scraper_async(github_client, owner, repo, pr_numbers, args, controller)
+    finally:
+        controller.log_rate()
+
+
+def _unexpected_statuses(stats, args):
+    """Status counts that mean the path did not measure what it claims, e.g. 404s from missing cassettes.
+    403/429 are only expected when the run injects rate limits or errors."""
+    expected = {"304"}
+    if args.rate_limit or args.error_rate or args.secondary_rate:
+        expected |= {"403", "429"}
+    return {status: count for status, count in stats["by_status"].items()
+            if not status.startswith("2") and status not in expected}
+
+
+INGESTION_PATHS = {
+    "rest": _run_rest,
+    "rest-threaded": _run_rest_threaded,
+    "async": _run_async,
+    "graphql": _run_graphql,
+    "listing": _run_listing,
+    "scraper": _run_scraper,
+    "scraper-async": _run_scraper_async,
+    "scraper-aimd": _run_scraper_aimd,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GitHub ingestion paths against the local stand-in.")
+    parser.add_argument("--cassettes", help="Cassette directory (defaults to a temp dir with --synthesize)")
+    parser.add_argument("--synthesize", action="store_true", help="Generate synthetic cassettes first")
+    parser.add_argument("--repo", default="acme/widgets", help='Repository in the format "owner/repo"')
+    parser.add_argument("--prs", type=int, default=50, help="Number of PRs per path (default: 50)")
+    parser.add_argument("--paths", nargs="+", default=list(INGESTION_PATHS), choices=list(INGESTION_PATHS))
+    parser.add_argument("--workers", type=int, default=8, help="Concurrency for threaded/async paths")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Injected latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--rate-limit", type=int, default=0, help="Per-token budget per window (0 = unlimited)")
+    parser.add_argument("--rate-window", type=float, default=60)
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of 429 responses")
+    parser.add_argument("--secondary-rate", type=float, default=0, help="Fraction of secondary-limit 403s")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    owner, repo = args.repo.split("/")
+    cassettes = args.cassettes or tempfile.mkdtemp(prefix="standin-")
+    if args.synthesize:
+        synthesize_cassettes(cassettes, owner, repo, args.prs)
+
+    faults = FaultConfig(args.latency_ms, args.jitter_ms, args.rate_limit, args.rate_window,
+                         args.error_rate, args.secondary_rate, args.retry_after)
+    process, base = start_standin_process(cassettes, faults=faults)
+
+    # Clients read these at import time
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    os.environ.update({
+        "GITHUB_API_URL": base,
+        "GITHUB_WEB_URL": base,
+        "GITHUB_PATCH_URL": f"{base}/raw/{{owner}}/{{repo}}/pull/{{pr_number}}.patch",
+        "GITHUB_CACHE_DISABLED": "1",
+        "ARTIFACT_STORE_DISABLED": "1",
+    })
+    import github_client
+    import scraper
+    scraper.LOG_FILE = os.path.join(workdir, "download_log.txt")
+    scraper.TOKEN_STATUS_FILE = os.path.join(workdir, "token_status.json")
+    scraper.TOKEN_STATUS_DB = os.path.join(workdir, "token_status.db")
+
+    pr_numbers = list(range(1, args.prs + 1))
+    rows = []
+    for name in args.paths:
+        requests.post(f"{base}/_standin/reset")
+        # Fresh patches file per path, so one scraper path does not skip PRs another already stored
+        scraper.ALL_PATCHES_FILE = os.path.join(workdir, f"all_patches.{name}.txt")
+        start = time.perf_counter()
+        error = ""
+        try:
+            INGESTION_PATHS[name](github_client, owner, repo, pr_numbers, args)
+        except Exception as e:
+            error = str(e)[:60]
+        elapsed = time.perf_counter() - start
+        stats = requests.get(f"{base}/_standin/stats").json()
+        unexpected = _unexpected_statuses(stats, args)
+        if not error and unexpected:
+            error = f"FAILED: unexpected responses {unexpected}"
+        elif not error and not any(status.startswith("2") for status in stats["by_status"]):
+            error = "FAILED: no successful responses"
+        rows.append((name, elapsed, stats, error))
+
+    print("\n==== INGESTION BENCHMARK ====")
+    print(f"{args.prs} PRs per path, {args.latency_ms:.0f}ms latency, stand-in at {base}")
+    print(f"{'path':<14} {'seconds':>8} {'PRs/min':>9} {'req/PR':>7} {'api/PR':>7}  status counts")
+    for name, elapsed, stats, error in rows:
+        prs_per_min = args.prs / elapsed * 60 if elapsed else 0
+        print(f"{name:<14} {elapsed:>8.2f} {prs_per_min:>9.1f} {stats['total_requests'] / args.prs:>7.2f} "
+              f"{stats['api_requests'] / args.prs:>7.2f}  {stats['by_status']} {error}")
+    process.terminate()
+
+
+if __name__ == "__main__":
+    main()
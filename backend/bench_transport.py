@@ -0,0 +1,61 @@
+"""
+bench_transport.py
+
+Benchmark requests/sec for bare `requests.get` versus the shared pooled transport.
+
+Usage:
+    python bench_transport.py --requests 200 --threads 8
+    python bench_transport.py --url http://127.0.0.1:8765/rate_limit --http2
+
+The default URL is GitHub's /rate_limit endpoint, which does not count against
+the rate limit.
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import transport
+
+
+def _run(label, get, url, headers, total, threads):
+    def one(_):
+        response = get(url, headers=headers)
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        statuses = list(executor.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for s in statuses if s != 200)
+    print(f"[BENCH] {label:<10} {total} requests in {elapsed:.2f}s -> {total / elapsed:.1f} req/s ({errors} non-200)")
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare bare requests.get with the pooled transport.")
+    parser.add_argument("--url", default="https://api.github.com/rate_limit", help="URL to GET repeatedly")
+    parser.add_argument("--requests", type=int, default=100, help="Number of requests per run (default: 100)")
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent threads (default: 4)")
+    parser.add_argument("--token", help="Optional GitHub token for the Authorization header")
+    parser.add_argument("--pool-maxsize", type=int, default=None, help="Override HTTP_POOL_MAXSIZE")
+    parser.add_argument("--http2", action="store_true", help="Use HTTP/2 for the pooled run")
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"token {args.token}"} if args.token else {}
+    transport.configure(pool_maxsize=args.pool_maxsize, http2=args.http2 or None)
+
+    # Warm up DNS and the pool so the pooled run measures steady state
+    transport.get(args.url, headers=headers)
+
+    before = _run("bare", lambda url, headers: requests.get(url, headers=headers, timeout=30),
+                  args.url, headers, args.requests, args.threads)
+    after = _run("pooled", transport.get, args.url, headers, args.requests, args.threads)
+    print(f"[BENCH] Speedup: {after / before:.2f}x")
+    transport.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,17 @@ def extract_pr_numbers(filepath):
                 pr_numbers.append(match.group(1))
     return pr_numbers
 
+def extract_pr_numbers_from_store(repo):
+    from patch_store import get_patch_store
+    return [str(pr) for pr in get_patch_store().pr_numbers(repo)]
+
 if __name__ == "__main__":
     import sys
-    # Default path is all_patches.txt in the same directory as the script
-    path = sys.argv[1] if len(sys.argv) > 1 else "all_patches.txt"
-    pr_numbers = extract_pr_numbers(path)
+    if len(sys.argv) > 2 and sys.argv[1] == "--store":
+        # python count.py --store owner/repo
+        pr_numbers = extract_pr_numbers_from_store(sys.argv[2])
+    else:
+        # Default path is all_patches.txt in the same directory as the script
+        path = sys.argv[1] if len(sys.argv) > 1 else "all_patches.txt"
+        pr_numbers = extract_pr_numbers(path)
     print("\n".join(pr_numbers)) 
\ No newline at end of file
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine, Column, Integer, String, JSON
+import threading
+from sqlalchemy import create_engine, event, Column, Integer, String, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -60,3 +61,72 @@ def get_db():
         yield db
     finally:
         db.close()
+
+class ProcessedPRs:
+    """
+    In-memory set of (repo_url, pr_number) pairs already stored in pull_requests.
+
+    Loaded with a single query on first use, then kept current by session events:
+    rows flushed by any SessionLocal session are added when that session commits
+    and dropped if it rolls back. Rows written by other processes are not seen
+    until refresh() is called.
+    """
+    def __init__(self):
+        self._keys = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Reload the whole set from the database"""
+        session = SessionLocal()
+        try:
+            keys = {(repo_url, int(pr_number)) for repo_url, pr_number in
+                    session.query(PullRequest.repo_url, PullRequest.pr_number)}
+        finally:
+            session.close()
+        with self._lock:
+            self._keys = keys
+        print(f"[DB] Loaded {len(keys)} processed PRs.")
+
+    def _ensure_loaded(self):
+        if self._keys is None:
+            self.refresh()
+
+    def contains(self, repo_url, pr_number):
+        self._ensure_loaded()
+        return (repo_url, int(pr_number)) in self._keys
+
+    def __contains__(self, key):
+        repo_url, pr_number = key
+        return self.contains(repo_url, pr_number)
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._keys)
+
+    def _apply(self, added, removed):
+        with self._lock:
+            if self._keys is None:
+                return
+            self._keys.difference_update(removed)
+            self._keys.update(added)
+
+processed_prs = ProcessedPRs()
+
+def _pr_key(obj):
+    return (obj.repo_url, int(obj.pr_number))
+
+@event.listens_for(SessionLocal, "after_flush")
+def _track_flushed_prs(session, flush_context):
+    pending = session.info.setdefault("processed_prs", (set(), set()))
+    pending[0].update(_pr_key(obj) for obj in session.new if isinstance(obj, PullRequest))
+    pending[1].update(_pr_key(obj) for obj in session.deleted if isinstance(obj, PullRequest))
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_committed_prs(session):
+    added, removed = session.info.pop("processed_prs", (set(), set()))
+    if added or removed:
+        processed_prs._apply(added, removed)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_rolled_back_prs(session):
+    session.info.pop("processed_prs", None)
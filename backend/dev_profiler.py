@@ -2,15 +2,9 @@ import json
 from typing import Any, Dict, List
 from db import SessionLocal, PullRequest, DevSkillProfile, init_db
 from collections import defaultdict
-import requests
-import os
-import re
 from datetime import datetime
 from pydantic import BaseModel
-
-LLAMA_API_URL = "https://api.llama.com/v1/chat/completions"
-LLAMA_MODEL = "Llama-4-Maverick-17B-128E-Instruct-FP8"
-LLAMA_API_KEY = os.getenv("LLAMA_API_KEY")
+import llm_client
 
 author_prompts = {
     "synthesis_guidelines": """
@@ -240,46 +234,19 @@ def aggregate_pr_metrics(prs: List[PullRequest]) -> Dict[str, Any]:
         "pr_analyses_for_llm": pr_analyses_for_llm
     }
 
-def extract_json_from_text(text):
-    # Try to find the first {...} block in the text
-    match = re.search(r'({.*})', text, re.DOTALL)
-    if match:
-        return match.group(1)
-    return text  # fallback
-
 def synthesize_developer_skills(pr_analyses_for_llm: List[Dict], synthesis_guidelines: str) -> Dict[str, Any]:
     print(f"[INFO] Preparing prompt for LLM with {len(pr_analyses_for_llm)} PR analyses...")
     prompt = author_prompts["synthesis_guidelines"] + "\n\n" + json.dumps(pr_analyses_for_llm, indent=2)
-    payload = {
-        "model": LLAMA_MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-        "max_completion_tokens": 2048,
-        "temperature": 0.7
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {LLAMA_API_KEY}"
-    }
     print("[INFO] Sending request to Llama API...")
-    response = requests.post(LLAMA_API_URL, json=payload, headers=headers, timeout=90)
-    if response.status_code != 200:
-        print(f"[ERROR] Llama API error: {response.status_code} {response.text}")
-        raise Exception(f"Llama API error: {response.status_code} {response.text}")
-    result = response.json()
     try:
-        text_response = result["completion_message"]["content"]["text"]
-        print("[INFO] LLM response received. Parsing JSON...")
-        cleaned_text = text_response
-        if "```json" in cleaned_text:
-            cleaned_text = cleaned_text.split("```json")[1]
-        if "```" in cleaned_text:
-            cleaned_text = cleaned_text.split("```")[0]
-        cleaned_text = cleaned_text.strip()
-        cleaned_text = extract_json_from_text(cleaned_text)
-        return json.loads(cleaned_text)
+        return llm_client.complete(prompt, max_completion_tokens=2048, timeout=90, label="dev_profiler",
+                                   parse=llm_client.parse_json_response)
+    except llm_client.ResponseParseError as e:
+        print(f"[ERROR] Llama response was not valid JSON: {e.text}. Error: {str(e.__cause__)}")
+        raise Exception(f"Llama response was not valid JSON: {e.text}. Error: {str(e.__cause__)}")
     except Exception as e:
-        print(f"[ERROR] Llama response was not valid JSON: {result}. Error: {str(e)}")
-        raise Exception(f"Llama response was not valid JSON: {result}. Error: {str(e)}")
+        print(f"[ERROR] {e}")
+        raise
 
 class DevSkillProfileModel(BaseModel):
     developer: str
@@ -379,6 +346,11 @@ def has_profile(developer: str) -> bool:
 
 if __name__ == "__main__":
     import argparse
+    parser = argparse.ArgumentParser(description="Build skill profiles for developers with analyzed PRs.")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Bypass the on-disk LLM response cache")
+    args = parser.parse_args()
+    if args.no_llm_cache:
+        llm_client.LLM_CACHE_ENABLED = False
     init_db()
     developers = get_all_developers()
     print(f"[INFO] Found {len(developers)} developers in the database.")
@@ -389,3 +361,5 @@ if __name__ == "__main__":
         print(f"\n[INFO] Profiling developer: {developer}")
         profile = profile_developer(developer)
         print(json.dumps(profile, indent=2))
+    if llm_client.LLM_CACHE_ENABLED:
+        print(f"[CACHE] LLM response cache: {llm_client.cache_stats()}")
@@ -0,0 +1,268 @@
+"""
+diff_condenser.py
+
+Fits a unified diff (or a `git format-patch` dump) into a prompt budget.
+
+Instead of cutting the diff at a fixed character count, the diff is parsed into
+files and hunks, each hunk is scored by how much it says about the change (added
+logic in source files scores high; lockfiles, snapshots, minified or generated
+files, whitespace-only edits and context lines score low), and the best hunks are
+packed into the budget. Selected hunks are emitted in their original order, and
+every file that lost hunks gets a one-line summary so the model still sees the
+full shape of the PR.
+
+Usage:
+    python diff_condenser.py some.patch --budget 5000
+"""
+
+import argparse
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from diff_filter import BINARY, get_classifier
+
+DIFF_BUDGET_CHARS = int(os.getenv("DIFF_BUDGET_CHARS", "5000"))
+
+# Share of the budget kept for the commit message(s) before the first file
+PREAMBLE_SHARE = 0.15
+# Share of the budget the "not shown" summary lines may take
+SUMMARY_SHARE = 0.2
+# Hunks scoring below this (pure context, comment tweaks) are only summarized, never packed
+MIN_HUNK_SCORE = 0.5
+# Files of these kinds are only summarized, however many lines they change
+SUMMARY_ONLY_KINDS = ("generated", "binary")
+# Don't bother truncating a hunk into less room than this
+MIN_PARTIAL_HUNK_CHARS = 300
+
+TEST_PATTERN = re.compile(r"(^|/)(tests?|__tests__|spec)/|(_test|\.test|\.spec|_spec)\.\w+$|(^|/)test_[^/]+$")
+DOC_PATTERN = re.compile(r"\.(md|rst|txt|adoc)$|(^|/)(docs?|CHANGELOG[^/]*)(/|$)", re.IGNORECASE)
+COMMENT_PREFIXES = ("#", "//", "/*", "*", "--", ";", "<!--")
+
+# Relative weight of a file's hunks by what kind of file it is
+FILE_WEIGHTS = {"source": 1.0, "test": 0.6, "doc": 0.4, "generated": 0.02, "binary": 0.0}
+
+FILE_HEADER_RE = re.compile(r"^diff --git a/(.+?) b/(.+)$")
+HUNK_HEADER_RE = re.compile(r"^@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@")
+
+
+@dataclass
+class Hunk:
+    lines: List[str]
+    added: int = 0
+    removed: int = 0
+    score: float = 0.0
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+@dataclass
+class FileDiff:
+    path: str
+    header: List[str] = field(default_factory=list)
+    hunks: List[Hunk] = field(default_factory=list)
+    kind: str = "source"
+
+    @property
+    def added(self) -> int:
+        return sum(h.added for h in self.hunks)
+
+    @property
+    def removed(self) -> int:
+        return sum(h.removed for h in self.hunks)
+
+    def summary(self, shown: int) -> str:
+        if not self.hunks:
+            return f"# {self.path}: {'binary' if self.kind == 'binary' else 'no textual changes'}"
+        label = f", {self.kind}" if self.kind != "source" else ""
+        what = f"{len(self.hunks) - shown} of {len(self.hunks)} hunks omitted" if shown else "not shown"
+        return f"# {self.path} (+{self.added}/-{self.removed}{label}): {what}"
+
+
+def classify_path(path: str) -> str:
+    """Return 'binary', 'generated', 'test', 'doc' or 'source' for a file path."""
+    kind = get_classifier().classify_path(path)
+    if kind == BINARY:
+        return "binary"
+    if kind:
+        # Vendored code and fixtures are as uninformative as generated files
+        return "generated"
+    if TEST_PATTERN.search(path):
+        return "test"
+    if DOC_PATTERN.search(path):
+        return "doc"
+    return "source"
+
+
+def parse_diff(diff_text: str):
+    """
+    Split a diff into the text before the first file (commit messages in patch dumps)
+    and a list of FileDiff with their hunks.
+
+    Returns:
+        (preamble, files)
+    """
+    preamble: List[str] = []
+    files: List[FileDiff] = []
+    current: Optional[FileDiff] = None
+    hunk: Optional[Hunk] = None
+    for line in diff_text.splitlines():
+        match = FILE_HEADER_RE.match(line)
+        if match:
+            current = FileDiff(path=match.group(2), header=[line], kind=classify_path(match.group(2)))
+            files.append(current)
+            hunk = None
+        elif current is None:
+            preamble.append(line)
+        elif HUNK_HEADER_RE.match(line):
+            hunk = Hunk(lines=[line])
+            current.hunks.append(hunk)
+        elif hunk is None:
+            current.header.append(line)
+            if line.startswith("Binary files ") or line == "GIT binary patch":
+                current.kind = "binary"
+        elif line != "-- " and (line.startswith(("+", "-", " ", "\\")) or line == ""):
+            hunk.lines.append(line)
+        else:
+            # Anything else ends the file, e.g. the "-- " signature or next commit of a patch dump
+            hunk = None
+            current = None
+            preamble.append(line)
+    for file_diff in files:
+        for h in file_diff.hunks:
+            _score_hunk(h, FILE_WEIGHTS[file_diff.kind])
+    return preamble, files
+
+
+def _line_weight(content: str) -> float:
+    stripped = content.strip()
+    if not stripped:
+        return 0.0
+    if stripped.startswith(COMMENT_PREFIXES):
+        return 0.5
+    return 1.0
+
+
+def _score_hunk(hunk: Hunk, file_weight: float) -> None:
+    removed_lines = []
+    added_lines = []
+    for line in hunk.lines[1:]:
+        if line.startswith("-"):
+            hunk.removed += 1
+            removed_lines.append("".join(line[1:].split()))
+        elif line.startswith("+"):
+            hunk.added += 1
+            added_lines.append(line[1:])
+    removed = set(removed_lines)
+    added = {"".join(content.split()) for content in added_lines}
+    score = 0.0
+    for content in added_lines:
+        # A "+" line that matches a "-" line except for whitespace is a reformat, not logic
+        if "".join(content.split()) in removed:
+            score += 0.1
+        else:
+            score += 2.0 * _line_weight(content)
+    # ...and its "-" side adds nothing
+    score += 0.5 * sum(1 for content in removed_lines if content not in added)
+    hunk.score = score * file_weight
+
+
+def _truncate_hunk(hunk: Hunk, room: int) -> Optional[str]:
+    marker = "... (hunk truncated)\n"
+    kept, used = [], len(marker)
+    for line in hunk.lines:
+        if used + len(line) + 1 > room:
+            break
+        kept.append(line)
+        used += len(line) + 1
+    if len(kept) < 2:
+        return None
+    return "\n".join(kept) + "\n" + marker
+
+
+def condense_diff(diff_text: str, budget: int = DIFF_BUDGET_CHARS) -> str:
+    """
+    Condense a diff to at most `budget` characters, keeping the most informative hunks.
+
+    Args:
+        diff_text: Unified diff or format-patch text
+        budget: Maximum characters to return
+
+    Returns:
+        The diff itself if it fits, otherwise the selected hunks plus per-file summary lines
+    """
+    if len(diff_text) <= budget:
+        return diff_text
+    preamble, files = parse_diff(diff_text)
+    if not files:
+        return diff_text[:budget]
+
+    preamble_text = "\n".join(line for line in preamble if line.strip())
+    preamble_text = preamble_text[:int(budget * PREAMBLE_SHARE)]
+    remaining = budget - (len(preamble_text) + 1 if preamble_text else 0)
+
+    # Reserve room for one summary line per file, collapsing the tail if there are too many
+    summaries = [f.summary(0) for f in files]
+    summary_room = min(sum(len(s) + 1 for s in summaries), int(budget * SUMMARY_SHARE))
+    remaining -= summary_room
+
+    ranked = sorted(((h.score, i, j) for i, f in enumerate(files) if f.kind not in SUMMARY_ONLY_KINDS
+                     for j, h in enumerate(f.hunks) if h.score >= MIN_HUNK_SCORE), key=lambda item: -item[0])
+    chosen = {}  # (file index, hunk index) -> text
+    headers_paid = set()
+    for _, i, j in ranked:
+        if remaining <= 0:
+            break
+        header_cost = 0 if i in headers_paid else sum(len(line) + 1 for line in files[i].header)
+        text = files[i].hunks[j].text
+        if header_cost + len(text) <= remaining:
+            chosen[(i, j)] = text
+        elif remaining - header_cost >= MIN_PARTIAL_HUNK_CHARS:
+            partial = _truncate_hunk(files[i].hunks[j], remaining - header_cost)
+            if partial is None:
+                continue
+            chosen[(i, j)] = partial
+        else:
+            continue
+        headers_paid.add(i)
+        remaining -= header_cost + len(chosen[(i, j)])
+
+    parts = [preamble_text + "\n"] if preamble_text else []
+    omitted = []
+    for i, file_diff in enumerate(files):
+        shown = [j for j in range(len(file_diff.hunks)) if (i, j) in chosen]
+        if shown:
+            parts.append("\n".join(file_diff.header) + "\n")
+            parts.extend(chosen[(i, j)] for j in shown)
+        if len(shown) < len(file_diff.hunks) or not file_diff.hunks:
+            omitted.append(file_diff.summary(len(shown)))
+
+    room = summary_room + max(remaining, 0)
+    for n, line in enumerate(omitted):
+        tail = f"# ... {len(omitted) - n} more files not listed\n"
+        needed = len(line) + 1 + (len(tail) if n < len(omitted) - 1 else 0)
+        if needed > room:
+            if len(tail) <= room:
+                parts.append(tail)
+            break
+        parts.append(line + "\n")
+        room -= len(line) + 1
+    return "".join(parts)[:budget]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Condense a diff to a character budget.")
+    parser.add_argument("path", help="Diff or patch file")
+    parser.add_argument("--budget", type=int, default=DIFF_BUDGET_CHARS)
+    args = parser.parse_args()
+
+    with open(args.path, "r", encoding="utf-8", errors="ignore") as f:
+        text = f.read()
+    condensed = condense_diff(text, args.budget)
+    print(condensed)
+    _, parsed = parse_diff(text)
+    print(f"[CONDENSE] {len(text)} -> {len(condensed)} chars, {len(parsed)} files, "
+          f"{sum(len(p.hunks) for p in parsed)} hunks")
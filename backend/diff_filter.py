@@ -0,0 +1,329 @@
+"""
+diff_filter.py
+
+Drops generated, vendored, fixture and binary files from a diff before it is prompted
+or stored.
+
+Files are classified by path rules first and by their content second:
+
+- Path rules are gitattributes-style lines, `pattern attribute...`, where attribute is
+  one of linguist-generated, linguist-vendored, fixture or binary. A `-attribute` or
+  `attribute=false` unsets it, so a repo can keep files the defaults would drop. Patterns
+  without a slash match the file name at any depth, `**` matches any number of
+  directories, and later rules win. DEFAULT_RULES cover lockfiles, snapshots, minified
+  bundles, build output, vendored trees, fixtures and common binary formats; extra rules
+  are read from the file named by DIFF_FILTER_RULES.
+- Content checks catch what paths miss: `GIT binary patch` / `Binary files ... differ`
+  markers, "@generated" / "DO NOT EDIT" banners near the top of added code, and
+  minified output (very long added lines).
+
+Each dropped file is reduced to a one-line stub, and per-kind file and line counts are
+kept for direct_metadata. A PR whose files are all dropped needs no LLM call at all.
+
+Usage:
+    python diff_filter.py some.patch
+"""
+
+import argparse
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+from diff_stats import file_spans
+
+GENERATED = "generated"
+VENDORED = "vendored"
+FIXTURE = "fixture"
+BINARY = "binary"
+
+# gitattributes-style attribute names -> kind
+ATTRIBUTES = {
+    "linguist-generated": GENERATED,
+    "generated": GENERATED,
+    "linguist-vendored": VENDORED,
+    "vendored": VENDORED,
+    "fixture": FIXTURE,
+    "binary": BINARY,
+}
+
+DEFAULT_RULES = """
+package-lock.json linguist-generated
+npm-shrinkwrap.json linguist-generated
+yarn.lock linguist-generated
+pnpm-lock.yaml linguist-generated
+poetry.lock linguist-generated
+Pipfile.lock linguist-generated
+Cargo.lock linguist-generated
+Gemfile.lock linguist-generated
+composer.lock linguist-generated
+go.sum linguist-generated
+flake.lock linguist-generated
+**/__snapshots__/** linguist-generated
+*.snap linguist-generated
+*.min.js linguist-generated
+*.min.css linguist-generated
+*.map linguist-generated
+*.bundle.js linguist-generated
+*_pb2.py linguist-generated
+*_pb2_grpc.py linguist-generated
+*.pb.go linguist-generated
+*.generated.* linguist-generated
+*.g.dart linguist-generated
+dist/** linguist-generated
+build/** linguist-generated
+vendor/** linguist-vendored
+**/vendor/** linguist-vendored
+node_modules/** linguist-vendored
+**/node_modules/** linguist-vendored
+third_party/** linguist-vendored
+**/third_party/** linguist-vendored
+**/fixtures/** fixture
+**/__fixtures__/** fixture
+**/testdata/** fixture
+*.png binary
+*.jpg binary
+*.jpeg binary
+*.gif binary
+*.ico binary
+*.webp binary
+*.pdf binary
+*.zip binary
+*.gz binary
+*.jar binary
+*.woff binary
+*.woff2 binary
+*.ttf binary
+*.eot binary
+*.otf binary
+*.mp4 binary
+*.mp3 binary
+*.so binary
+*.dylib binary
+*.dll binary
+*.exe binary
+"""
+DIFF_FILTER_RULES = os.getenv("DIFF_FILTER_RULES")
+
+# Added lines longer than this mean minified or otherwise machine-written output
+MAX_LINE_LENGTH = 1000
+# ...as does an average added line this long over at least MIN_LINES_FOR_AVERAGE lines
+MAX_AVERAGE_LINE_LENGTH = 300
+MIN_LINES_FOR_AVERAGE = 5
+# Only comments in the first added lines are searched for "generated" banners
+BANNER_LINES = 10
+COMMENT_PREFIXES = ("#", "//", "/*", "*", "--", ";", "<!--", "'")
+GENERATED_BANNER_RE = re.compile(
+    r"@generated|DO NOT EDIT|Code generated .* DO NOT EDIT|auto-?generated|This file was generated",
+    re.IGNORECASE,
+)
+# Stub lines listed after the condensed diff in a prompt
+MAX_PROMPT_STUBS = 20
+
+
+def _glob_to_regex(pattern: str) -> re.Pattern:
+    """Translate a gitattributes-style glob into a regex over a slash-separated path."""
+    anchored = "/" in pattern.rstrip("/")
+    pattern = pattern.lstrip("/")
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    body = "".join(out)
+    return re.compile(("^" if anchored else "^(?:.*/)?") + body + "$")
+
+
+def parse_rules(text: str) -> List[Tuple[re.Pattern, str, bool]]:
+    """Parse gitattributes-style lines into (regex, kind, enabled) rules."""
+    rules = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        pattern, *attributes = line.split()
+        for attribute in attributes:
+            enabled = not attribute.startswith(("-", "!")) and not attribute.endswith("=false")
+            name = attribute.lstrip("-!").split("=", 1)[0]
+            if name in ATTRIBUTES:
+                rules.append((_glob_to_regex(pattern), ATTRIBUTES[name], enabled))
+    return rules
+
+
+class FileClassifier:
+    """Classifies changed files as generated, vendored, fixture, binary or None (keep)."""
+
+    def __init__(self, rules_text: str = DEFAULT_RULES, rules_path: Optional[str] = DIFF_FILTER_RULES):
+        self.rules = parse_rules(rules_text)
+        if rules_path:
+            with open(rules_path, "r", encoding="utf-8") as f:
+                self.rules.extend(parse_rules(f.read()))
+
+    def classify_path(self, path: str) -> Optional[str]:
+        kinds: Dict[str, bool] = {}
+        for regex, kind, enabled in self.rules:
+            if regex.match(path):
+                kinds[kind] = enabled
+        # A later `-attribute` rule unsets what an earlier one set
+        for kind in (BINARY, VENDORED, GENERATED, FIXTURE):
+            if kinds.get(kind):
+                return kind
+        return None
+
+    def classify(self, path: str, section: str) -> Optional[str]:
+        """Classify a file from its path and, failing that, from its diff section."""
+        kind = self.classify_path(path)
+        if kind:
+            return kind
+        if "\nGIT binary patch\n" in section or re.search(r"\nBinary files .* differ", section):
+            return BINARY
+        added = [line[1:] for line in section.split("\n") if line.startswith("+") and not line.startswith("+++ ")]
+        if not added:
+            return None
+        if any(line.lstrip().startswith(COMMENT_PREFIXES) and GENERATED_BANNER_RE.search(line)
+               for line in added[:BANNER_LINES]):
+            return GENERATED
+        longest = max(len(line) for line in added)
+        average = sum(len(line) for line in added) / len(added)
+        if longest > MAX_LINE_LENGTH or (len(added) >= MIN_LINES_FOR_AVERAGE and average > MAX_AVERAGE_LINE_LENGTH):
+            return GENERATED
+        return None
+
+
+@dataclass
+class FilteredDiff:
+    text: str
+    kept_files: int = 0
+    # kind -> [(path, additions, deletions)]
+    dropped: Dict[str, List[Tuple[str, int, int]]] = field(default_factory=dict)
+    # (offset in text, stub line) for with_stubs()
+    _stubs: List[Tuple[int, str]] = field(default_factory=list)
+
+    @property
+    def all_filtered(self) -> bool:
+        """True if the diff had files and every one of them was dropped."""
+        return self.kept_files == 0 and bool(self.dropped)
+
+    def stub_lines(self) -> List[str]:
+        return [stub for _, stub in self._stubs]
+
+    def with_stubs(self) -> str:
+        """The filtered diff with each dropped file's stub line where the file used to be."""
+        parts, last = [], 0
+        for offset, stub in self._stubs:
+            parts.append(self.text[last:offset])
+            parts.append(stub + "\n")
+            last = offset
+        parts.append(self.text[last:])
+        return "".join(parts)
+
+    def prompt_stubs(self, limit: int = MAX_PROMPT_STUBS) -> str:
+        """Stub lines to list after a condensed diff, capped at `limit` lines."""
+        stubs = self.stub_lines()
+        if not stubs:
+            return ""
+        lines = stubs[:limit]
+        if len(stubs) > limit:
+            lines.append(f"# ... and {len(stubs) - limit} more filtered files")
+        return "Filtered files:\n" + "\n".join(lines) + "\n"
+
+    def metadata(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """Per-kind counts of dropped files and lines, for direct_metadata."""
+        return {"filtered_files": {
+            kind: {"files": len(files), "additions": sum(a for _, a, _ in files),
+                   "deletions": sum(d for _, _, d in files)}
+            for kind, files in self.dropped.items()
+        }}
+
+
+_default_classifier: Optional[FileClassifier] = None
+
+
+def get_classifier() -> FileClassifier:
+    """Shared classifier built from DEFAULT_RULES and DIFF_FILTER_RULES."""
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = FileClassifier()
+    return _default_classifier
+
+
+def filter_diff(diff: Union[str, bytes], classifier: Optional[FileClassifier] = None) -> FilteredDiff:
+    """
+    Remove generated, vendored, fixture and binary files from a diff.
+
+    Args:
+        diff: Unified diff or format-patch text
+        classifier: FileClassifier to use (default: get_classifier())
+
+    Returns:
+        FilteredDiff with the remaining text, stub lines and per-kind counts
+    """
+    classifier = classifier or get_classifier()
+    data = diff.encode("utf-8", errors="replace") if isinstance(diff, str) else bytes(diff)
+    parts: List[str] = []
+    stubs: List[Tuple[int, str]] = []
+    dropped: Dict[str, List[Tuple[str, int, int]]] = {}
+    kept = 0
+    last = 0
+    length = 0
+    for path, start, hunks_at, end in file_spans(data):
+        kind = classifier.classify(path, data[start:end].decode("utf-8", errors="replace"))
+        if kind is None:
+            kept += 1
+            continue
+        hunks = data[hunks_at:end] if hunks_at >= 0 else b""
+        added, deleted = hunks.count(b"\n+"), hunks.count(b"\n-")
+        dropped.setdefault(kind, []).append((path, added, deleted))
+        parts.append(data[last:start].decode("utf-8", errors="replace"))
+        length += len(parts[-1])
+        stubs.append((length, f"# [{kind}] {path}: +{added}/-{deleted} lines omitted"))
+        last = end
+    if not dropped:
+        text = diff if isinstance(diff, str) else data.decode("utf-8", errors="replace")
+        return FilteredDiff(text=text, kept_files=kept)
+    parts.append(data[last:].decode("utf-8", errors="replace"))
+    return FilteredDiff(text="".join(parts), kept_files=kept, dropped=dropped, _stubs=stubs)
+
+
+def filtered_analysis(filtered: FilteredDiff) -> Dict[str, object]:
+    """ai_analysis stand-in for a PR that only touched filtered files, so no LLM call is needed."""
+    kinds = ", ".join(sorted(filtered.dropped))
+    return {
+        "work": {
+            "summary": f"Only {kinds} files changed.",
+            "pr_type": "chore",
+            "pr_reason": f"Every changed file was classified as {kinds}; the PR was not sent for analysis.",
+            "domain_tag": "others",
+            "tag_reason": "No hand-written source changes.",
+            "skills": [],
+        },
+        "skipped_llm": True,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show which files of a diff would be filtered.")
+    parser.add_argument("path", help="Diff or patch file")
+    parser.add_argument("--rules", default=DIFF_FILTER_RULES, help="Extra gitattributes-style rules file")
+    args = parser.parse_args()
+
+    with open(args.path, "r", encoding="utf-8", errors="ignore") as f:
+        text = f.read()
+    filtered = filter_diff(text, FileClassifier(rules_path=args.rules))
+    for stub in filtered.stub_lines():
+        print(stub)
+    print(f"[FILTER] kept {filtered.kept_files} files, {len(text)} -> {len(filtered.text)} chars, "
+          f"{filtered.metadata()['filtered_files']}")
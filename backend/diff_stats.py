@@ -0,0 +1,257 @@
+"""
+diff_stats.py
+
+Deterministic, LLM-free change statistics for a diff.
+
+Each file section of a unified diff or format-patch dump is mapped to a language by
+its extension (or well-known filename), and its added/removed lines are counted with
+bytes.count over the hunk region, so no per-line Python work is done. Results are
+aggregated per language, per file and per directory and stored in an analysis's
+`direct_metadata`; the `code_changes` list replaces the numbers the LLM used to guess
+from a truncated diff.
+
+Patch dumps with several commits count every commit's hunks, so a line changed in
+two commits counts twice (GitHub's PR totals are net of the whole PR).
+
+Whole patch dumps and patch stores can be processed in bulk across a process pool.
+
+Usage:
+    python diff_stats.py --patches all_patches.txt --output diff_stats.json
+    python diff_stats.py --store facebook/react --processes 8
+"""
+
+import argparse
+import json
+import mmap
+import os
+import posixpath
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+from patch_index import scan_records
+
+# Largest per-file and per-directory lists kept in direct_metadata (by lines changed)
+MAX_FILE_ENTRIES = 100
+MAX_DIRECTORY_ENTRIES = 50
+# Patches handed to each worker at a time in bulk mode
+BULK_BATCH_SIZE = 256
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": "Python", ".pyi": "Python", ".pyx": "Cython",
+    ".js": "JavaScript", ".mjs": "JavaScript", ".cjs": "JavaScript", ".jsx": "JavaScript",
+    ".ts": "TypeScript", ".tsx": "TypeScript", ".mts": "TypeScript", ".cts": "TypeScript",
+    ".java": "Java", ".kt": "Kotlin", ".kts": "Kotlin", ".scala": "Scala", ".groovy": "Groovy",
+    ".go": "Go", ".rs": "Rust", ".rb": "Ruby", ".php": "PHP", ".swift": "Swift",
+    ".c": "C", ".h": "C", ".cc": "C++", ".cpp": "C++", ".cxx": "C++", ".hpp": "C++", ".hh": "C++",
+    ".m": "Objective-C", ".mm": "Objective-C++", ".cs": "C#", ".fs": "F#", ".vb": "Visual Basic",
+    ".dart": "Dart", ".lua": "Lua", ".pl": "Perl", ".pm": "Perl", ".r": "R", ".jl": "Julia",
+    ".ex": "Elixir", ".exs": "Elixir", ".erl": "Erlang", ".hs": "Haskell", ".ml": "OCaml",
+    ".clj": "Clojure", ".elm": "Elm", ".zig": "Zig", ".nim": "Nim", ".sol": "Solidity",
+    ".sh": "Shell", ".bash": "Shell", ".zsh": "Shell", ".fish": "Shell", ".ps1": "PowerShell",
+    ".sql": "SQL", ".graphql": "GraphQL", ".gql": "GraphQL", ".proto": "Protocol Buffers",
+    ".html": "HTML", ".htm": "HTML", ".vue": "Vue", ".svelte": "Svelte", ".astro": "Astro",
+    ".css": "CSS", ".scss": "SCSS", ".sass": "SCSS", ".less": "Less",
+    ".json": "JSON", ".yml": "YAML", ".yaml": "YAML", ".toml": "TOML", ".xml": "XML",
+    ".ini": "INI", ".cfg": "INI", ".gradle": "Gradle", ".cmake": "CMake", ".tf": "HCL", ".hcl": "HCL",
+    ".md": "Markdown", ".mdx": "Markdown", ".rst": "reStructuredText", ".txt": "Text", ".ipynb": "Jupyter Notebook",
+}
+LANGUAGE_BY_FILENAME = {
+    "Dockerfile": "Dockerfile", "Makefile": "Makefile", "CMakeLists.txt": "CMake",
+    "Gemfile": "Ruby", "Rakefile": "Ruby", "BUILD": "Starlark", "WORKSPACE": "Starlark",
+    "Jenkinsfile": "Groovy", "Vagrantfile": "Ruby",
+}
+OTHER = "Other"
+
+FILE_HEADER_RE = re.compile(rb"diff --git a/(.+?) b/(.+?)\r?\n")
+# The end of a file's hunks in format-patch output: the signature or the next commit
+SECTION_END_RE = re.compile(rb"\n-- \r?\n|\nFrom [0-9a-f]{40} ")
+
+
+def language_for(path: str) -> str:
+    """Language of a file from its name or extension."""
+    name = posixpath.basename(path)
+    if name in LANGUAGE_BY_FILENAME:
+        return LANGUAGE_BY_FILENAME[name]
+    if name.startswith("Dockerfile"):
+        return "Dockerfile"
+    return LANGUAGE_BY_EXTENSION.get(posixpath.splitext(name)[1].lower(), OTHER)
+
+
+def file_spans(data: bytes) -> Iterator[Tuple[str, int, int, int]]:
+    """
+    Locate every file section of a diff.
+
+    Yields:
+        (path, start, hunks_start, end) byte offsets: the section is data[start:end] and its
+        hunks are data[hunks_start:end] (hunks_start is -1 for binary, mode-only or pure
+        renames). A format-patch signature or next commit after the last hunk is excluded.
+    """
+    starts = [0] if data.startswith(b"diff --git ") else []
+    at = data.find(b"\ndiff --git ")
+    while at >= 0:
+        starts.append(at + 1)
+        at = data.find(b"\ndiff --git ", at + 1)
+    for n, start in enumerate(starts):
+        end = starts[n + 1] if n + 1 < len(starts) else len(data)
+        match = FILE_HEADER_RE.match(data, start, end)
+        if match is None:
+            continue
+        path = match.group(2).decode("utf-8", errors="replace")
+        hunks_at = data.find(b"\n@@ ", match.end() - 1, end)
+        stop = SECTION_END_RE.search(data, hunks_at if hunks_at >= 0 else match.end() - 1, end)
+        yield path, start, hunks_at, stop.start() + 1 if stop else end
+
+
+def _file_sections(data: bytes) -> Iterator[Tuple[str, int, int]]:
+    """Yield (path, additions, deletions) for every file section in a diff."""
+    for path, _, hunks_at, end in file_spans(data):
+        if hunks_at < 0:
+            yield path, 0, 0
+            continue
+        hunks = data[hunks_at:end]
+        yield path, hunks.count(b"\n+"), hunks.count(b"\n-")
+
+
+def _ranked(totals: Dict[str, List[int]], key_name: str, limit: int) -> List[Dict[str, Any]]:
+    rows = sorted(totals.items(), key=lambda item: -(item[1][0] + item[1][1]))
+    return [{key_name: key, "additions": added, "deletions": deleted} for key, (added, deleted) in rows[:limit]]
+
+
+def diff_stats(diff: Union[str, bytes]) -> Dict[str, Any]:
+    """
+    Count added and removed lines per language, file and directory.
+
+    Args:
+        diff: Unified diff or format-patch text
+
+    Returns:
+        Dict with additions, deletions, changed_files, code_changes (per language),
+        files and directories (largest first, capped)
+    """
+    data = diff.encode("utf-8", errors="replace") if isinstance(diff, str) else bytes(diff)
+    files: Dict[str, List[int]] = {}
+    for path, added, deleted in _file_sections(data):
+        totals = files.setdefault(path, [0, 0])
+        totals[0] += added
+        totals[1] += deleted
+
+    languages: Dict[str, List[int]] = {}
+    file_counts: Dict[str, int] = {}
+    directories: Dict[str, List[int]] = {}
+    for path, (added, deleted) in files.items():
+        language = language_for(path)
+        totals = languages.setdefault(language, [0, 0])
+        totals[0] += added
+        totals[1] += deleted
+        file_counts[language] = file_counts.get(language, 0) + 1
+        totals = directories.setdefault(posixpath.dirname(path) or ".", [0, 0])
+        totals[0] += added
+        totals[1] += deleted
+
+    code_changes = [
+        {"language": language, "lines_of_code": added + deleted, "additions": added,
+         "deletions": deleted, "files": file_counts[language]}
+        for language, (added, deleted) in languages.items()
+    ]
+    code_changes.sort(key=lambda row: -row["lines_of_code"])
+    file_rows = _ranked(files, "path", MAX_FILE_ENTRIES)
+    for row in file_rows:
+        row["language"] = language_for(row["path"])
+    return {
+        "additions": sum(added for added, _ in files.values()),
+        "deletions": sum(deleted for _, deleted in files.values()),
+        "changed_files": len(files),
+        "code_changes": code_changes,
+        "files": file_rows,
+        "directories": _ranked(directories, "path", MAX_DIRECTORY_ENTRIES),
+    }
+
+
+def merge_direct_metadata(metadata: Dict[str, Any], diff: Union[str, bytes]) -> Dict[str, Any]:
+    """
+    Add diff statistics to a direct_metadata dict. Values already present (e.g. GitHub's
+    own additions/deletions, which are net of the whole PR) are kept.
+    """
+    merged = dict(metadata)
+    for key, value in diff_stats(diff).items():
+        merged.setdefault(key, value)
+    return merged
+
+
+def _stats_for_file_range(path: str, start: int, end: int) -> List[Tuple[int, Dict[str, Any]]]:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return [(pr_number, diff_stats(mm[body_start:marker_at]))
+                for pr_number, body_start, marker_at, _ in scan_records(mm, start, end)]
+
+
+def _stats_for_store_batch(repo: str, pr_numbers: List[int]) -> List[Tuple[int, Dict[str, Any]]]:
+    from patch_store import get_patch_store
+    store = get_patch_store()
+    results = []
+    for pr_number in pr_numbers:
+        patch = store.get_patch(repo, pr_number)
+        if patch is not None:
+            results.append((pr_number, diff_stats(patch)))
+    return results
+
+
+def stats_for_patches_file(patches_path: str, processes: int = os.cpu_count() or 1) -> Dict[int, Dict[str, Any]]:
+    """Diff stats for every PR in a patch dump, with the file split into one byte range per process."""
+    size = os.path.getsize(patches_path)
+    if size == 0:
+        return {}
+    if processes <= 1:
+        return dict(_stats_for_file_range(patches_path, 0, size))
+    step = -(-size // processes)
+    starts = list(range(0, size, step))
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        chunks = pool.map(_stats_for_file_range, [patches_path] * len(starts), starts,
+                          [min(start + step, size) for start in starts])
+        return {pr_number: stats for chunk in chunks for pr_number, stats in chunk}
+
+
+def stats_for_store(repo: str, processes: int = os.cpu_count() or 1) -> Dict[int, Dict[str, Any]]:
+    """Diff stats for every patch of a repo in the patch store, in batches across a process pool."""
+    from patch_store import get_patch_store
+    pr_numbers = get_patch_store().pr_numbers(repo)
+    batches = [pr_numbers[i:i + BULK_BATCH_SIZE] for i in range(0, len(pr_numbers), BULK_BATCH_SIZE)]
+    if processes <= 1 or len(batches) <= 1:
+        return {pr_number: stats for batch in batches for pr_number, stats in _stats_for_store_batch(repo, batch)}
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        chunks = pool.map(_stats_for_store_batch, [repo] * len(batches), batches)
+        return {pr_number: stats for chunk in chunks for pr_number, stats in chunk}
+
+
+def language_totals(all_stats: Dict[int, Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """Sum per-language changes over many PRs."""
+    totals: Dict[str, Dict[str, int]] = {}
+    for stats in all_stats.values():
+        for row in stats["code_changes"]:
+            entry = totals.setdefault(row["language"], {"prs": 0, "additions": 0, "deletions": 0})
+            entry["prs"] += 1
+            entry["additions"] += row["additions"]
+            entry["deletions"] += row["deletions"]
+    return dict(sorted(totals.items(), key=lambda item: -(item[1]["additions"] + item[1]["deletions"])))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute per-language diff statistics for many PRs.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--patches", help="Patch dump such as all_patches.txt")
+    source.add_argument("--store", help='Repository in the patch store, in the format "owner/repo"')
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", help="Write per-PR stats to this JSON file")
+    args = parser.parse_args()
+
+    if args.patches:
+        all_stats = stats_for_patches_file(args.patches, args.processes)
+    else:
+        all_stats = stats_for_store(args.store, args.processes)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({str(pr_number): stats for pr_number, stats in sorted(all_stats.items())}, f, indent=2)
+        print(f"[STATS] Wrote stats for {len(all_stats)} PRs to {args.output}")
+    print(f"[STATS] {len(all_stats)} PRs")
+    for language, totals in language_totals(all_stats).items():
+        print(f"  {language}: +{totals['additions']} -{totals['deletions']} in {totals['prs']} PRs")
@@ -4,11 +4,18 @@ github-client.py
 Handles GitHub API calls and direct patch/diff scraping for PRs.
 """
 
-import requests
+import asyncio
+import json
 import os
-from typing import Any, Dict, List, Optional
-from datetime import datetime
-import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional
+from datetime import datetime, timedelta, timezone
+import time
+from requests.structures import CaseInsensitiveDict
+import transport
+from artifact_store import get_store, read_through_json, read_through_text
+from disk_cache import DiskLRUCache
 
 # Load tokens from file
 TOKEN_FILE = os.path.join(os.path.dirname(__file__), 'github_tokens.txt')
@@ -16,13 +23,337 @@ with open(TOKEN_FILE, 'r') as f:
     TOKENS = [line.strip() for line in f if line.strip()]
 if not TOKENS:
     raise Exception("No GitHub tokens found in backend/github_tokens.txt")
-token_cycle = itertools.cycle(TOKENS)
 
-def get_next_token():
-    token = next(token_cycle)
+# Base URLs can point at a local stand-in (see github_standin.py) for offline benchmarking
+API_BASE_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+WEB_BASE_URL = os.getenv("GITHUB_WEB_URL", "https://github.com").rstrip("/")
+GRAPHQL_URL = f"{API_BASE_URL}/graphql"
+# PRs per aliased GraphQL query; GitHub's node limits make 25-50 the sweet spot
+GRAPHQL_BATCH_SIZE = 25
+
+# Diffs are streamed and cut off at this many bytes; prompts only use the head of the diff
+DIFF_MAX_BYTES = int(os.getenv("GITHUB_DIFF_MAX_BYTES", str(512 * 1024)))
+
+# The search API returns at most this many results per query
+SEARCH_RESULT_CAP = 1000
+
+# Max in-flight requests for the async fetchers
+ASYNC_CONCURRENCY = int(os.getenv("GITHUB_ASYNC_CONCURRENCY", "16"))
+
+# Conditional-request (ETag / Last-Modified) response cache
+CACHE_DIR = os.getenv("GITHUB_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "http"))
+CACHE_MAX_BYTES = int(os.getenv("GITHUB_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_ENABLED = os.getenv("GITHUB_CACHE_DISABLED", "") != "1"
+# Response headers worth replaying from a cached entry
+_CACHED_HEADERS = ("ETag", "Last-Modified", "Content-Type", "Link")
+
+
+class CachedResponse:
+    """
+    Minimal stand-in for a requests/httpx response, built from a cache entry
+    when GitHub answers 304 Not Modified.
+    """
+
+    def __init__(self, entry: Dict[str, Any], headers):
+        self.status_code = 200
+        self.text = entry["body"]
+        self.content = self.text.encode("utf-8")
+        self.headers = CaseInsensitiveDict(entry.get("headers", {}))
+        # Keep fresh rate-limit headers from the 304 itself
+        self.headers.update(headers)
+        self.from_cache = True
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class ResponseCache:
+    """
+    On-disk HTTP cache for GitHub GETs. Stores ETag/Last-Modified with each body,
+    revalidates with If-None-Match/If-Modified-Since, and serves the stored body
+    on 304 (which GitHub does not count against the rate limit).
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.store = DiskLRUCache(directory, max_bytes)
+        self.hits = 0    # 304s served from cache
+        self.misses = 0  # full 200 responses
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, Any]], headers: Dict[str, str]) -> str:
+        # Accept changes the representation (e.g. raw README vs JSON), so it is part of the key
+        return DiskLRUCache.make_key(url, params or {}, headers.get("Accept", ""))
+
+    def conditional_headers(self, key: str):
+        """Return (entry, headers) where headers carry the validators for the stored entry, if any."""
+        entry = self.store.get(key)
+        if not entry:
+            return None, {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return entry, headers
+
+    def resolve(self, key: str, entry: Optional[Dict[str, Any]], response):
+        """Turn a 304 into the cached body, or store a fresh cacheable 200."""
+        if response.status_code == 304 and entry:
+            with self._lock:
+                self.hits += 1
+            return CachedResponse(entry, response.headers)
+        if response.status_code == 200:
+            with self._lock:
+                self.misses += 1
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                self.store.set(key, {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "headers": {h: response.headers[h] for h in _CACHED_HEADERS if h in response.headers},
+                    "body": response.text,
+                })
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        store_stats = self.store.stats()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "evictions": store_stats["evictions"],
+            "bytes": store_stats["bytes"],
+            "max_bytes": store_stats["max_bytes"],
+        }
+
+
+response_cache = ResponseCache(CACHE_DIR, CACHE_MAX_BYTES) if CACHE_ENABLED else None
+
+class TokenScheduler:
+    """
+    Thread-safe token picker driven by the X-RateLimit-* headers GitHub returns.
+
+    Budgets are tracked per token and per rate-limit resource (core, search, graphql).
+    acquire() hands out the token with the most remaining budget, skips tokens parked
+    until their reset, and only blocks when every token is drained.
+    """
+
+    DEFAULT_LIMIT = 5000
+    # How long acquire() waits for a record()/release() when every token's budget is reserved
+    RESERVED_POLL_SECONDS = 1.0
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = list(tokens)
+        # (token, resource) -> {"remaining", "reset", "parked_until"}
+        self._state: Dict[tuple, Dict[str, float]] = {}
+        self._cond = threading.Condition()
+
+    def _status(self, token: str, resource: str) -> Dict[str, float]:
+        status = self._state.get((token, resource))
+        if status is None:
+            status = {"limit": self.DEFAULT_LIMIT, "remaining": self.DEFAULT_LIMIT, "reset": 0, "parked_until": 0}
+            self._state[(token, resource)] = status
+        return status
+
+    def _try_acquire(self, resource: str):
+        """Return (token, 0) if one is available, else (None, seconds until the next one frees up)."""
+        now = time.time()
+        best, best_remaining, next_free = None, 0, None
+        for token in self.tokens:
+            status = self._status(token, resource)
+            if status["parked_until"] > now:
+                free_at = status["parked_until"]
+            else:
+                if status["parked_until"]:
+                    status["parked_until"] = 0
+                    if status["reset"] <= now:
+                        # Reset window passed: the budget is full again until headers say otherwise
+                        status["remaining"] = status["limit"]
+                if status["remaining"] > best_remaining:
+                    best, best_remaining = token, status["remaining"]
+                    continue
+                if status["remaining"] > 0:
+                    continue
+                # Budget fully reserved by in-flight requests: busy until their responses
+                # record()/release() it, or until the reset window refills it
+                free_at = status["reset"] if status["reset"] > now else now + self.RESERVED_POLL_SECONDS
+            next_free = free_at if next_free is None else min(next_free, free_at)
+        if best is None:
+            return None, max(0.0, next_free - now)
+        # Reserve one request so concurrent callers spread across tokens
+        self._status(best, resource)["remaining"] -= 1
+        return best, 0.0
+
+    def acquire(self, resource: str = "core") -> str:
+        """Return the best available token, blocking only while every token is parked."""
+        with self._cond:
+            while True:
+                token, wait = self._try_acquire(resource)
+                if token is not None:
+                    return token
+                if wait > self.RESERVED_POLL_SECONDS:
+                    print(f"[RATE LIMIT] All tokens exhausted for '{resource}'. Waiting {wait:.0f}s for the next reset.")
+                # record() and release() notify, so a returned reservation wakes us early
+                self._cond.wait(timeout=wait + 1)
+
+    async def aacquire(self, resource: str = "core") -> str:
+        """Async acquire that sleeps on the event loop instead of blocking the thread."""
+        while True:
+            with self._cond:
+                token, wait = self._try_acquire(resource)
+            if token is not None:
+                return token
+            if wait > self.RESERVED_POLL_SECONDS:
+                print(f"[RATE LIMIT] All tokens exhausted for '{resource}'. Waiting {wait:.0f}s for the next reset.")
+                await asyncio.sleep(wait + 1)
+            else:
+                await asyncio.sleep(wait)
+
+    def record(self, token: str, response, resource: str = "core") -> None:
+        """Update a token's budget from a response's rate-limit headers and park it if drained."""
+        headers = response.headers
+        remaining = headers.get("X-RateLimit-Remaining")
+        retry_after = headers.get("Retry-After")
+        if remaining is None and retry_after is None:
+            # github.com (.diff/.patch) responses carry no budget; hand back acquire()'s reservation
+            self.release(token, resource)
+            return
+        resource = headers.get("X-RateLimit-Resource", resource)
+        now = time.time()
+        with self._cond:
+            status = self._status(token, resource)
+            if remaining is not None:
+                status["remaining"] = int(remaining)
+            if headers.get("X-RateLimit-Limit"):
+                status["limit"] = int(headers["X-RateLimit-Limit"])
+            if headers.get("X-RateLimit-Reset"):
+                status["reset"] = int(headers["X-RateLimit-Reset"])
+            throttled = retry_after is not None and response.status_code in (403, 429)
+            wait = transport.parse_retry_after(retry_after, now) if throttled else None
+            if wait is not None:
+                status["parked_until"] = now + wait
+            elif throttled or status["remaining"] <= 0:
+                # Drained, or a Retry-After we could not parse: park until the reset header's time
+                status["parked_until"] = max(status["reset"], now + 1)
+            if status["parked_until"] > now:
+                print(f"[RATE LIMIT] Token {token[:8]}... parked for {status['parked_until'] - now:.0f}s ({resource}).")
+            self._cond.notify_all()
+
+    def park(self, token: str, resource: str = "core") -> None:
+        """Park a token that was throttled without a usable Retry-After until its reset, or for a minute."""
+        now = time.time()
+        with self._cond:
+            status = self._status(token, resource)
+            status["parked_until"] = max(status["parked_until"], status["reset"], now + 60)
+            print(f"[RATE LIMIT] Token {token[:8]}... parked for {status['parked_until'] - now:.0f}s ({resource}).")
+            self._cond.notify_all()
+
+    def release(self, token: str, resource: str = "core") -> None:
+        """Return the request acquire() reserved, for a response that reported no budget."""
+        with self._cond:
+            status = self._status(token, resource)
+            status["remaining"] = min(status["limit"], status["remaining"] + 1)
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Current budgets keyed by '<token prefix>:<resource>', for logging."""
+        with self._cond:
+            return {f"{t[:8]}:{r}": dict(s) for (t, r), s in self._state.items()}
+
+
+token_scheduler = TokenScheduler(TOKENS)
+
+
+def is_rate_limited(response, body: Optional[bytes] = None) -> bool:
+    """
+    True if GitHub rejected the request for primary or secondary rate limiting.
+    Pass `body` for streamed responses, whose .text can no longer be read.
+    """
+    if response.status_code not in (403, 429):
+        return False
+    if response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers:
+        return True
+    if body is not None:
+        return b"rate limit" in body.lower()
+    return "rate limit" in response.text.lower()
+
+
+def is_graphql_rate_limited(response) -> bool:
+    """True for a throttled GraphQL call: a 403/429, or a 200 whose errors include type RATE_LIMITED."""
+    if is_rate_limited(response):
+        return True
+    if response.status_code != 200:
+        return False
+    try:
+        errors = response.json().get("errors") or []
+    except ValueError:
+        return False
+    return any(error.get("type") == "RATE_LIMITED" for error in errors)
+
+
+def _rate_limit_resource(url: str) -> str:
+    if "/search/" in url:
+        return "search"
+    if url.endswith("/graphql"):
+        return "graphql"
+    return "core"
+
+
+def get_next_token(resource: str = "core"):
+    token = token_scheduler.acquire(resource)
     print(f"[TOKEN] Using token: {token[:8]}...")  # Only print the first 8 chars for security
     return token
 
+def github_get(url: str, headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, Any]] = None):
+    """
+    GET a GitHub URL through the shared pooled transport, authenticated with the best available token.
+    Rate-limit headers are fed back to the token scheduler; a rate-limited request is retried
+    with another token.
+    """
+    key, entry, validators = None, None, {}
+    if response_cache is not None:
+        key = ResponseCache.key(url, params, headers or {})
+        entry, validators = response_cache.conditional_headers(key)
+    resource = _rate_limit_resource(url)
+    for _ in range(len(TOKENS)):
+        token = get_next_token(resource)
+        request_headers = {"Authorization": f"token {token}", **(headers or {}), **validators}
+        response = transport.get(url, headers=request_headers, params=params)
+        token_scheduler.record(token, response, resource)
+        if not is_rate_limited(response):
+            break
+        print(f"[RATE LIMIT] {url} rate limited on token {token[:8]}... Retrying with another token.")
+    if response_cache is None:
+        return response
+    return response_cache.resolve(key, entry, response)
+
+async def agithub_get(client, url: str, headers: Optional[Dict[str, str]] = None,
+                      params: Optional[Dict[str, Any]] = None):
+    """
+    Async counterpart of github_get, issued on the given httpx.AsyncClient.
+    """
+    key, entry, validators = None, None, {}
+    if response_cache is not None:
+        key = ResponseCache.key(url, params, headers or {})
+        entry, validators = response_cache.conditional_headers(key)
+    resource = _rate_limit_resource(url)
+    for _ in range(len(TOKENS)):
+        token = await token_scheduler.aacquire(resource)
+        request_headers = {"Authorization": f"token {token}", **(headers or {}), **validators}
+        response = await client.get(url, headers=request_headers, params=params)
+        token_scheduler.record(token, response, resource)
+        if not is_rate_limited(response):
+            break
+        print(f"[RATE LIMIT] {url} rate limited on token {token[:8]}... Retrying with another token.")
+    if response_cache is None:
+        return response
+    return response_cache.resolve(key, entry, response)
+
 def fetch_repo_metadata(owner: str, repo: str) -> Dict[str, Any]:
     """
     Fetch repository metadata from the GitHub API.
@@ -34,35 +365,44 @@ def fetch_repo_metadata(owner: str, repo: str) -> Dict[str, Any]:
     Raises:
         Exception if the request fails
     """
-    url = f"https://api.github.com/repos/{owner}/{repo}"
-    token = get_next_token()
-    headers = {"Authorization": f"token {token}"}
-    response = requests.get(url, headers=headers)
+    url = f"{API_BASE_URL}/repos/{owner}/{repo}"
+    response = github_get(url)
     if response.status_code != 200:
         raise Exception(f"Failed to fetch repo metadata: {response.status_code} {response.text}")
     return response.json()
 
 
-def list_merged_prs(owner: str, repo: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+def _parse_github_time(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def iter_merged_prs(owner: str, repo: str, since: Optional[datetime] = None,
+                    limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
     """
-    List merged pull requests for a repository using the GitHub API.
+    Yield merged pull requests page by page, newest activity first.
+    PRs are listed by last update, and merged_at <= updated_at, so paging stops as soon as
+    a page reaches PRs last updated before `since`.
     Args:
         owner: Repository owner username or org
         repo: Repository name
-        limit: Maximum number of merged PRs to return (optional)
-    Returns:
-        List of dictionaries, each representing a merged PR
+        since: Only yield PRs merged at or after this time (optional)
+        limit: Maximum number of merged PRs to yield (optional)
+    Yields:
+        Dictionaries, each representing a merged PR
     """
-    url = f"https://api.github.com/repos/{owner}/{repo}/pulls"
-    token = get_next_token()
-    headers = {"Authorization": f"token {token}"}
-    params = {"state": "closed", "per_page": 100}
-    prs = []
+    url = f"{API_BASE_URL}/repos/{owner}/{repo}/pulls"
+    params = {"state": "closed", "sort": "updated", "direction": "desc", "per_page": 100}
+    since = _as_utc(since) if since else None
+    count = 0
     page = 1
     while True:
         params["page"] = page
         print(f"[GITHUB] Fetching PRs page {page}...")
-        response = requests.get(url, headers=headers, params=params)
+        response = github_get(url, params=params)
         if response.status_code != 200:
             print(f"[ERROR] Failed to fetch PRs: {response.status_code} {response.text}")
             print(f"[ERROR] Response headers: {response.headers}")
@@ -75,15 +415,105 @@ def list_merged_prs(owner: str, repo: str, limit: Optional[int] = None) -> List[
         if not data:
             break
         for pr in data:
-            if pr.get("merged_at"):
-                prs.append(pr)
-                if limit is not None and len(prs) >= limit:
-                    print(f"[GITHUB] Reached limit of {limit} merged PRs.")
-                    return prs
-        print(f"[GITHUB] Total merged PRs collected so far: {len(prs)}")
+            if since and pr.get("updated_at") and _parse_github_time(pr["updated_at"]) < since:
+                print(f"[GITHUB] Reached PRs last updated before {since.isoformat()}. Stopping. Total: {count}")
+                return
+            if not pr.get("merged_at"):
+                continue
+            if since and _parse_github_time(pr["merged_at"]) < since:
+                continue
+            yield pr
+            count += 1
+            if limit is not None and count >= limit:
+                print(f"[GITHUB] Reached limit of {limit} merged PRs.")
+                return
+        print(f"[GITHUB] Total merged PRs collected so far: {count}")
         page += 1
-    print(f"[GITHUB] Finished fetching merged PRs. Total: {len(prs)}")
-    return prs  # Always return a list
+    print(f"[GITHUB] Finished fetching merged PRs. Total: {count}")
+
+
+def list_merged_prs(owner: str, repo: str, limit: Optional[int] = None,
+                    since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    List merged pull requests for a repository using the GitHub API.
+    Args:
+        owner: Repository owner username or org
+        repo: Repository name
+        limit: Maximum number of merged PRs to return (optional)
+        since: Only return PRs merged at or after this time (optional)
+    Returns:
+        List of dictionaries, each representing a merged PR
+    """
+    return list(iter_merged_prs(owner, repo, since=since, limit=limit))  # Always return a list
+
+
+def _search_merged_window(owner: str, repo: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """
+    Fetch all PRs merged in [start, end] with the search API. The search API caps each
+    query at 1000 results, so over-full windows are split in half and fetched recursively.
+    """
+    url = f"{API_BASE_URL}/search/issues"
+    window = f"{start.strftime('%Y-%m-%dT%H:%M:%SZ')}..{end.strftime('%Y-%m-%dT%H:%M:%SZ')}"
+    params = {"q": f"repo:{owner}/{repo} is:pr is:merged merged:{window}", "per_page": 100,
+              "sort": "updated", "order": "desc"}
+    items = []
+    page = 1
+    while True:
+        params["page"] = page
+        response = github_get(url, params=params)
+        if response.status_code != 200:
+            raise Exception(f"Failed to search merged PRs: {response.status_code} {response.text}")
+        data = response.json()
+        total = data.get("total_count", 0)
+        if total > SEARCH_RESULT_CAP and end - start > timedelta(minutes=1):
+            middle = start + (end - start) / 2
+            print(f"[GITHUB] Window {window} has {total} PRs (> {SEARCH_RESULT_CAP}). Splitting.")
+            return _search_merged_window(owner, repo, start, middle) + _search_merged_window(owner, repo, middle, end)
+        for item in data.get("items", []):
+            # Search returns issue-shaped items; surface merged_at like the pulls API does
+            item["merged_at"] = (item.get("pull_request") or {}).get("merged_at") or item.get("closed_at")
+            items.append(item)
+        if len(data.get("items", [])) < params["per_page"] or page * params["per_page"] >= min(total, SEARCH_RESULT_CAP):
+            break
+        page += 1
+    print(f"[GITHUB] Window {window}: {len(items)} merged PRs.")
+    return items
+
+
+def search_merged_prs(owner: str, repo: str, since: datetime, until: Optional[datetime] = None,
+                      windows: int = 8, max_workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield PRs merged between `since` and `until` using the search API (`is:merged merged:A..B`).
+    The range is split into `windows` slices that are fetched in parallel across tokens;
+    each slice's PRs are yielded as soon as it completes.
+    Args:
+        owner: Repository owner username or org
+        repo: Repository name
+        since: Start of the merge window
+        until: End of the merge window (defaults to now)
+        windows: Number of date slices to fetch in parallel
+        max_workers: Thread count (defaults to one per slice, capped at the number of tokens)
+    Yields:
+        Dictionaries, each representing a merged PR (issue-shaped, with merged_at set)
+    """
+    since = _as_utc(since)
+    until = _as_utc(until) if until else datetime.now(timezone.utc)
+    step = (until - since) / windows
+    bounds = [(since + step * i, since + step * (i + 1)) for i in range(windows)]
+    seen = set()
+    executor = ThreadPoolExecutor(max_workers=max_workers or min(windows, len(TOKENS)))
+    try:
+        futures = [executor.submit(_search_merged_window, owner, repo, start, end) for start, end in bounds]
+        for future in as_completed(futures):
+            for pr in future.result():
+                # Adjacent windows share their boundary second
+                if pr["number"] in seen:
+                    continue
+                seen.add(pr["number"])
+                yield pr
+    finally:
+        # A consumer that stops early (break, close()) should not spend search budget on unread windows
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 def fetch_pr_patch(owner: str, repo: str, pr_number: int) -> str:
@@ -96,84 +526,144 @@ def fetch_pr_patch(owner: str, repo: str, pr_number: int) -> str:
     Returns:
         String containing the patch content
     """
-    url = f"https://github.com/{owner}/{repo}/pull/{pr_number}.patch"
-    token = get_next_token()
-    headers = {"Authorization": f"token {token}"}
-    response = requests.get(url, headers=headers)
+    return read_through_text(f"{owner}/{repo}", pr_number, "patch", lambda: _download_pr_patch(owner, repo, pr_number))
+
+
+def _download_pr_patch(owner: str, repo: str, pr_number: int) -> str:
+    url = f"{WEB_BASE_URL}/{owner}/{repo}/pull/{pr_number}.patch"
+    response = github_get(url)
     if response.status_code != 200:
         raise Exception(f"Failed to fetch PR patch: {response.status_code} {response.text}")
     return response.text
 
 
+def _get_json_checked(url: str, what: str) -> Any:
+    response = github_get(url)
+    if response.status_code != 200:
+        raise Exception(f"Failed to fetch PR {what}: {response.status_code} {response.text}")
+    return response.json()
+
+
 def fetch_pr_patch_and_comments(owner: str, repo: str, pr_number: int) -> Dict[str, Any]:
     """
     Fetch the .patch content and review comments for a pull request.
     Returns a dictionary with 'patch' and 'review_comments'.
     """
+    repo_key = f"{owner}/{repo}"
     # Fetch patch
-    patch_url = f"https://github.com/{owner}/{repo}/pull/{pr_number}.patch"
-    token = get_next_token()
-    headers = {"Authorization": f"token {token}"}
-
-    patch_response = requests.get(patch_url, headers=headers)
-    if patch_response.status_code != 200:
-        raise Exception(f"Failed to fetch PR patch: {patch_response.status_code} {patch_response.text}")
+    patch = fetch_pr_patch(owner, repo, pr_number)
 
     # Fetch review comments
-    review_comments_url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}/comments"
-    token = get_next_token()
-    headers["Authorization"] = f"token {token}"
-    review_comments_response = requests.get(review_comments_url, headers=headers)
-    if review_comments_response.status_code != 200:
-        raise Exception(f"Failed to fetch PR review comments: {review_comments_response.status_code} {review_comments_response.text}")
+    review_comments_url = f"{API_BASE_URL}/repos/{owner}/{repo}/pulls/{pr_number}/comments"
+    review_comments = read_through_json(repo_key, pr_number, "review_comments",
+                                        lambda: _get_json_checked(review_comments_url, "review comments"))
 
     return {
-        "patch": patch_response.text,
-        "review_comments": review_comments_response.json()
+        "patch": patch,
+        "review_comments": review_comments
     }
 
 
-def fetch_comprehensive_pr_metadata(owner: str, repo: str, pr_number: int) -> Dict[str, Any]:
+def _decode_capped_diff(body: bytes, truncated: bool) -> str:
+    if truncated:
+        # Drop the partial last line so the diff still parses as whole lines
+        cut = body.rfind(b"\n")
+        body = body[:cut + 1] if cut != -1 else body
+    return body.decode("utf-8", errors="replace")
+
+
+def _stored_diff(owner: str, repo: str, pr_number: int, max_bytes: Optional[int]):
     """
-    Fetch comprehensive metadata for a pull request, including commits, reviews, diff, and stats.
+    The stored diff, cut to max_bytes, or None if there is none or it was truncated
+    at a smaller cap than the one asked for now.
     """
-    token = get_next_token()
-    headers = {"Authorization": f"token {token}"}
+    store = get_store()
+    if store is None:
+        return None
+    data, meta = store.get_with_meta(f"{owner}/{repo}", pr_number, "diff")
+    if data is None:
+        return None
+    truncated = meta.get("truncated", False)
+    if truncated:
+        # Entries from before the cap was recorded were cut at about their own length
+        stored_cap = meta.get("max_bytes") or len(data)
+        if max_bytes is None or max_bytes > stored_cap:
+            return None
+    if max_bytes is not None and len(data) > max_bytes:
+        return _decode_capped_diff(data[:max_bytes], True), True
+    return data.decode("utf-8"), truncated
 
-    # Fetch PR data
-    pr_url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}"
-    pr_response = requests.get(pr_url, headers=headers)
-    if pr_response.status_code != 200:
-        raise Exception(f"Failed to fetch PR data: {pr_response.status_code} {pr_response.text}")
-    pr_data = pr_response.json()
 
-    # Fetch commits data
-    commits_url = pr_data.get("commits_url")
-    token = get_next_token()
-    headers["Authorization"] = f"token {token}"
-    commits_response = requests.get(commits_url, headers=headers)
-    if commits_response.status_code != 200:
-        raise Exception(f"Failed to fetch PR commits: {commits_response.status_code} {commits_response.text}")
-    commits_data = commits_response.json()
+def _store_diff(owner: str, repo: str, pr_number: int, diff: str, truncated: bool, max_bytes: Optional[int]):
+    store = get_store()
+    if store is not None:
+        store.put_text(f"{owner}/{repo}", pr_number, "diff", diff,
+                       meta={"truncated": truncated, "max_bytes": max_bytes if truncated else None})
+    return diff, truncated
 
-    # Fetch reviews data
-    reviews_url = pr_data.get("url") + "/reviews"
-    token = get_next_token()
-    headers["Authorization"] = f"token {token}"
-    reviews_response = requests.get(reviews_url, headers=headers)
-    if reviews_response.status_code != 200:
-        raise Exception(f"Failed to fetch PR reviews: {reviews_response.status_code} {reviews_response.text}")
-    reviews_data = reviews_response.json()
-
-    # Fetch diff
-    diff_url = f"https://github.com/{owner}/{repo}/pull/{pr_number}.diff"
-    token = get_next_token()
-    headers["Authorization"] = f"token {token}"
-    diff_response = requests.get(diff_url, headers=headers)
-    if diff_response.status_code != 200:
-        raise Exception(f"Failed to fetch PR diff: {diff_response.status_code} {diff_response.text}")
-    diff = diff_response.text
 
+def _check_diff_response(pr_number: int, response, body: bytes, truncated: bool, max_bytes: Optional[int]) -> None:
+    if response.status_code != 200:
+        raise Exception(f"Failed to fetch PR diff: {response.status_code} {body[:500].decode('utf-8', errors='replace')}")
+    if truncated:
+        print(f"[GITHUB] Diff for PR #{pr_number} truncated at {max_bytes} bytes.")
+
+
+def fetch_pr_diff(owner: str, repo: str, pr_number: int, max_bytes: Optional[int] = DIFF_MAX_BYTES):
+    """
+    Stream a pull request's .diff, stopping once max_bytes have been read.
+    Args:
+        owner: Repository owner username or org
+        repo: Repository name
+        pr_number: Pull request number
+        max_bytes: Byte cap for the download (None for no cap)
+    Returns:
+        Tuple of (diff text, truncated flag)
+    """
+    stored = _stored_diff(owner, repo, pr_number, max_bytes)
+    if stored is not None:
+        return stored
+    diff_url = f"{WEB_BASE_URL}/{owner}/{repo}/pull/{pr_number}.diff"
+    # Same token bookkeeping and rate-limit retry as github_get
+    for _ in range(len(TOKENS)):
+        token = get_next_token()
+        headers = {"Authorization": f"token {token}"}
+        response, body, truncated = transport.stream_get(diff_url, headers=headers, max_bytes=max_bytes)
+        token_scheduler.record(token, response)
+        if not is_rate_limited(response, body):
+            break
+        print(f"[RATE LIMIT] {diff_url} rate limited on token {token[:8]}... Retrying with another token.")
+    _check_diff_response(pr_number, response, body, truncated, max_bytes)
+    return _store_diff(owner, repo, pr_number, _decode_capped_diff(body, truncated), truncated, max_bytes)
+
+
+async def afetch_pr_diff(client, owner: str, repo: str, pr_number: int, max_bytes: Optional[int] = DIFF_MAX_BYTES):
+    """
+    Async counterpart of fetch_pr_diff on the given httpx.AsyncClient.
+    """
+    stored = _stored_diff(owner, repo, pr_number, max_bytes)
+    if stored is not None:
+        return stored
+    diff_url = f"{WEB_BASE_URL}/{owner}/{repo}/pull/{pr_number}.diff"
+    for _ in range(len(TOKENS)):
+        token = await token_scheduler.aacquire()
+        headers = {"Authorization": f"token {token}"}
+        response, body, truncated = await transport.astream_get(client, diff_url, headers=headers, max_bytes=max_bytes)
+        token_scheduler.record(token, response)
+        if not is_rate_limited(response, body):
+            break
+        print(f"[RATE LIMIT] {diff_url} rate limited on token {token[:8]}... Retrying with another token.")
+    _check_diff_response(pr_number, response, body, truncated, max_bytes)
+    return _store_diff(owner, repo, pr_number, _decode_capped_diff(body, truncated), truncated, max_bytes)
+
+
+def build_pr_metadata(repo: str, pr_number: int, pr_data: Dict[str, Any], commits_data: List[Dict[str, Any]],
+                      reviews_data: List[Dict[str, Any]], diff: str, diff_truncated: bool = False) -> Dict[str, Any]:
+    """
+    Assemble the metadata dict used by pr_profiler from raw REST payloads
+    (PR, commits, reviews) and the PR diff. Size fields come from the PR itself,
+    so they stay accurate when the diff was truncated.
+    """
     # Calculate time to first review and time to merge
     created_at = pr_data.get("created_at")
     merged_at = pr_data.get("merged_at")
@@ -201,6 +691,7 @@ def fetch_comprehensive_pr_metadata(owner: str, repo: str, pr_number: int) -> Di
         "additions": additions,
         "deletions": deletions,
         "pr_size": additions + deletions,
+        "changed_files": pr_data.get("changed_files", 0),
         "number_of_commits": pr_data.get("commits", 0),
         "commit": [
             {
@@ -221,11 +712,268 @@ def fetch_comprehensive_pr_metadata(owner: str, repo: str, pr_number: int) -> Di
             for review in reviews_data if review.get("body")
         ],
         "review_count": len(reviews_data),
-        "diff_data": diff
+        "diff_data": diff,
+        "diff_truncated": diff_truncated
     }
     return metadata
 
 
+def fetch_comprehensive_pr_metadata(owner: str, repo: str, pr_number: int) -> Dict[str, Any]:
+    """
+    Fetch comprehensive metadata for a pull request, including commits, reviews, diff, and stats.
+    """
+    repo_key = f"{owner}/{repo}"
+    # Fetch PR data
+    pr_url = f"{API_BASE_URL}/repos/{owner}/{repo}/pulls/{pr_number}"
+    pr_data = read_through_json(repo_key, pr_number, "pr", lambda: _get_json_checked(pr_url, "data"))
+
+    # Fetch commits data
+    commits_url = pr_data.get("commits_url")
+    commits_data = read_through_json(repo_key, pr_number, "commits", lambda: _get_json_checked(commits_url, "commits"))
+
+    # Fetch reviews data
+    reviews_url = pr_data.get("url") + "/reviews"
+    reviews_data = read_through_json(repo_key, pr_number, "reviews", lambda: _get_json_checked(reviews_url, "reviews"))
+
+    # Fetch diff (streamed and size-capped)
+    diff, diff_truncated = fetch_pr_diff(owner, repo, pr_number)
+
+    return build_pr_metadata(repo, pr_number, pr_data, commits_data, reviews_data, diff, diff_truncated)
+
+
+async def afetch_comprehensive_pr_metadata(owner: str, repo: str, pr_number: int, client=None,
+                                           semaphore: Optional[asyncio.Semaphore] = None) -> Dict[str, Any]:
+    """
+    Async variant of fetch_comprehensive_pr_metadata.
+    The PR is fetched first; commits, reviews and the diff are then fetched concurrently.
+    Args:
+        owner: Repository owner username or org
+        repo: Repository name
+        pr_number: Pull request number
+        client: Optional shared httpx.AsyncClient (one is created and closed if omitted)
+        semaphore: Optional semaphore bounding in-flight requests
+    Returns:
+        The same metadata dict as fetch_comprehensive_pr_metadata
+    """
+    owns_client = client is None
+    if owns_client:
+        client = transport.new_async_client()
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(ASYNC_CONCURRENCY)
+
+    store = get_store()
+    repo_key = f"{owner}/{repo}"
+
+    async def get_json(kind: str, url: str, what: str):
+        if store is not None:
+            stored = store.get_json(repo_key, pr_number, kind)
+            if stored is not None:
+                return stored
+        async with semaphore:
+            response = await agithub_get(client, url)
+        if response.status_code != 200:
+            raise Exception(f"Failed to fetch PR {what}: {response.status_code} {response.text}")
+        data = response.json()
+        if store is not None:
+            store.put_json(repo_key, pr_number, kind, data)
+        return data
+
+    async def get_diff():
+        async with semaphore:
+            return await afetch_pr_diff(client, owner, repo, pr_number)
+
+    try:
+        pr_url = f"{API_BASE_URL}/repos/{owner}/{repo}/pulls/{pr_number}"
+        pr_data = await get_json("pr", pr_url, "data")
+
+        commits_data, reviews_data, (diff, diff_truncated) = await asyncio.gather(
+            get_json("commits", pr_data.get("commits_url"), "commits"),
+            get_json("reviews", pr_data.get("url") + "/reviews", "reviews"),
+            get_diff(),
+        )
+    finally:
+        if owns_client:
+            await client.aclose()
+
+    return build_pr_metadata(repo, pr_number, pr_data, commits_data, reviews_data, diff, diff_truncated)
+
+
+async def afetch_comprehensive_pr_metadata_batch(owner: str, repo: str, pr_numbers: List[int],
+                                                 concurrency: int = ASYNC_CONCURRENCY) -> Dict[int, Dict[str, Any]]:
+    """
+    Fetch comprehensive metadata for many pull requests concurrently.
+    All PRs share one pooled async client and one semaphore of `concurrency` in-flight requests.
+    Returns:
+        Dictionary mapping PR number to its metadata dict. PRs that fail are logged and omitted.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    client = transport.new_async_client(max_connections=concurrency)
+    try:
+        results = await asyncio.gather(
+            *(afetch_comprehensive_pr_metadata(owner, repo, n, client=client, semaphore=semaphore) for n in pr_numbers),
+            return_exceptions=True,
+        )
+    finally:
+        await client.aclose()
+
+    metadata_by_pr = {}
+    for pr_number, result in zip(pr_numbers, results):
+        if isinstance(result, Exception):
+            print(f"[ERROR] Failed to fetch metadata for PR #{pr_number}: {result}")
+            continue
+        metadata_by_pr[pr_number] = result
+    print(f"[GITHUB] Fetched metadata for {len(metadata_by_pr)}/{len(pr_numbers)} PRs.")
+    return metadata_by_pr
+
+
+_GRAPHQL_PR_FIELDS = """
+fragment PRFields on PullRequest {
+  number
+  title
+  createdAt
+  mergedAt
+  additions
+  deletions
+  changedFiles
+  author { login }
+  commits(first: 100) {
+    totalCount
+    nodes { commit { oid message author { name date } } }
+  }
+  reviews(first: 100) {
+    totalCount
+    nodes { author { login } state body submittedAt }
+  }
+}
+"""
+
+
+def _graphql_node_to_rest(node: Dict[str, Any]):
+    """
+    Reshape a GraphQL pullRequest node into the (pr, commits, reviews) REST payloads
+    expected by build_pr_metadata.
+    """
+    pr_data = {
+        "title": node.get("title", ""),
+        "user": node.get("author") or {},
+        "created_at": node.get("createdAt"),
+        "merged_at": node.get("mergedAt"),
+        "additions": node.get("additions", 0),
+        "deletions": node.get("deletions", 0),
+        "changed_files": node.get("changedFiles", 0),
+        "commits": node["commits"]["totalCount"],
+    }
+    commits_data = [
+        {
+            "sha": c["commit"]["oid"],
+            "commit": {
+                "message": c["commit"].get("message", ""),
+                "author": c["commit"].get("author") or {},
+            },
+        }
+        for c in node["commits"]["nodes"]
+    ]
+    reviews_data = [
+        {
+            "user": r.get("author") or {},
+            "state": r.get("state", ""),
+            "body": r.get("body", ""),
+            "submitted_at": r.get("submittedAt"),
+        }
+        for r in node["reviews"]["nodes"]
+    ]
+    return pr_data, commits_data, reviews_data
+
+
+def fetch_pr_metadata_batch_graphql(owner: str, repo: str, pr_numbers: List[int],
+                                    batch_size: int = GRAPHQL_BATCH_SIZE,
+                                    include_diff: bool = True) -> Dict[int, Dict[str, Any]]:
+    """
+    Fetch PR metadata, commits and reviews for many PRs with one aliased GraphQL query per batch.
+    Args:
+        owner: Repository owner username or org
+        repo: Repository name
+        pr_numbers: Pull request numbers to fetch
+        batch_size: PRs per GraphQL query (25-50 recommended)
+        include_diff: Also download each PR's .diff (GraphQL does not expose diffs)
+    Returns:
+        Dictionary mapping PR number to the same metadata dict fetch_comprehensive_pr_metadata returns.
+        PRs missing from the response are logged and omitted.
+    """
+    store = get_store()
+    repo_key = f"{owner}/{repo}"
+    nodes = {}
+    if store is not None:
+        for pr_number in pr_numbers:
+            node = store.get_json(repo_key, pr_number, "graphql_pr")
+            if node is not None:
+                nodes[pr_number] = node
+    missing = [n for n in pr_numbers if n not in nodes]
+    if nodes:
+        print(f"[GITHUB] {len(nodes)} PRs served from the artifact store, {len(missing)} to query.")
+
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        aliases = "\n".join(f"    pr_{n}: pullRequest(number: {int(n)}) {{ ...PRFields }}" for n in batch)
+        query = (
+            "query($owner: String!, $name: String!) {\n"
+            "  repository(owner: $owner, name: $name) {\n"
+            f"{aliases}\n"
+            "  }\n"
+            "}\n" + _GRAPHQL_PR_FIELDS
+        )
+        print(f"[GITHUB] GraphQL batch of {len(batch)} PRs ({start + len(batch)}/{len(missing)})...")
+        # Same token bookkeeping and rate-limit retry as github_get, on the graphql budget
+        for _ in range(len(TOKENS)):
+            token = get_next_token("graphql")
+            response = transport.post(
+                GRAPHQL_URL,
+                headers={"Authorization": f"bearer {token}"},
+                json={"query": query, "variables": {"owner": owner, "name": repo}},
+            )
+            token_scheduler.record(token, response, "graphql")
+            if not is_graphql_rate_limited(response):
+                break
+            if "Retry-After" not in response.headers and response.headers.get("X-RateLimit-Remaining") != "0":
+                # e.g. RATE_LIMITED in a 200 body: nothing told record() to park the token
+                token_scheduler.park(token, "graphql")
+            print(f"[RATE LIMIT] GraphQL batch rate limited on token {token[:8]}... Retrying with another token.")
+        else:
+            raise Exception(f"GraphQL batch still rate limited after {len(TOKENS)} attempts: "
+                            f"{response.status_code} {response.text}")
+        if response.status_code != 200:
+            raise Exception(f"Failed to fetch PRs via GraphQL: {response.status_code} {response.text}")
+        payload = response.json()
+        for error in payload.get("errors") or []:
+            print(f"[ERROR] GraphQL: {error.get('message')}")
+        repository = (payload.get("data") or {}).get("repository") or {}
+        for pr_number in batch:
+            node = repository.get(f"pr_{pr_number}")
+            if not node:
+                print(f"[ERROR] PR #{pr_number} missing from GraphQL response.")
+                continue
+            nodes[pr_number] = node
+            if store is not None:
+                store.put_json(repo_key, pr_number, "graphql_pr", node)
+
+    metadata_by_pr = {}
+    for pr_number in pr_numbers:
+        node = nodes.get(pr_number)
+        if node is None:
+            continue
+        diff, diff_truncated = "", False
+        if include_diff:
+            try:
+                diff, diff_truncated = fetch_pr_diff(owner, repo, pr_number)
+            except Exception as e:
+                print(f"[ERROR] {e} (PR #{pr_number})")
+                continue
+        pr_data, commits_data, reviews_data = _graphql_node_to_rest(node)
+        metadata_by_pr[pr_number] = build_pr_metadata(repo, pr_number, pr_data, commits_data, reviews_data,
+                                                      diff, diff_truncated)
+    return metadata_by_pr
+
+
 if __name__ == "__main__":
     owner = "facebook"
     repo = "react"
@@ -0,0 +1,495 @@
+"""
+github_standin.py
+
+Local record/replay stand-in for the GitHub endpoints used by github_client, scraper and pr_profiler.
+
+In `record` mode every request is forwarded to GitHub and the response is saved as a
+cassette (one JSON file per request). In `replay` mode cassettes are served back,
+optionally with injected latency, per-token rate-limit headers, 403/429 responses and
+Retry-After. GraphQL PR batches that were never recorded are assembled from the REST
+cassettes, so the GraphQL fetcher can be benchmarked from the same recordings.
+`synthesize` writes a synthetic cassette set for a fake repository.
+
+Usage:
+    python github_standin.py record --cassettes cassettes/react
+    python github_standin.py replay --cassettes cassettes/react --latency-ms 80 --rate-limit 500
+    python github_standin.py synthesize --cassettes cassettes/synthetic --repo acme/widgets --prs 200
+
+Point the clients at it with:
+    GITHUB_API_URL=http://127.0.0.1:8765
+    GITHUB_WEB_URL=http://127.0.0.1:8765
+    GITHUB_PATCH_URL=http://127.0.0.1:8765/raw/<owner>/<repo>/pull/{pr_number}.patch
+
+GET /_standin/stats returns request counters; POST /_standin/reset clears them.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+API_UPSTREAM = "https://api.github.com"
+WEB_UPSTREAM = "https://github.com"
+RAW_UPSTREAM = "https://patch-diff.githubusercontent.com"
+API_PREFIXES = ("/repos/", "/search/", "/graphql", "/rate_limit", "/user")
+# Response headers worth keeping in a cassette
+RECORDED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Link", "X-RateLimit-Resource")
+
+
+def upstream_for(path: str) -> str:
+    if path.startswith("/raw/"):
+        return RAW_UPSTREAM
+    if path.startswith(API_PREFIXES):
+        return API_UPSTREAM
+    return WEB_UPSTREAM
+
+
+def endpoint_kind(path: str) -> str:
+    """Coarse endpoint label used for per-kind request counters."""
+    if path.startswith("/graphql"):
+        return "graphql"
+    if path.startswith("/search/"):
+        return "search"
+    if path.endswith(".diff"):
+        return "diff"
+    if path.endswith(".patch"):
+        return "patch"
+    if path.endswith("/readme"):
+        return "readme"
+    for suffix in ("commits", "reviews", "comments"):
+        if path.endswith("/" + suffix):
+            return suffix
+    if re.search(r"/pulls/\d+$", path):
+        return "pull"
+    if path.endswith("/pulls"):
+        return "pulls_list"
+    return "other"
+
+
+def cassette_key(method: str, path: str, query: str, body: bytes = b"") -> str:
+    canonical_query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    body_hash = hashlib.sha256(body).hexdigest() if body else ""
+    return hashlib.sha256(f"{method} {path}?{canonical_query} {body_hash}".encode("utf-8")).hexdigest()[:32]
+
+
+class CassetteStore:
+    """Directory of recorded interactions, one JSON file per request key."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._interactions: Dict[str, Dict[str, Any]] = {}
+        self._by_path: Dict[str, Dict[str, Any]] = {}
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                    self._index(name[:-5], json.load(f))
+
+    def _index(self, key: str, interaction: Dict[str, Any]) -> None:
+        self._interactions[key] = interaction
+        request = interaction["request"]
+        if request["method"] == "GET" and not request.get("query"):
+            self._by_path[request["path"]] = interaction
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._interactions.get(key)
+
+    def get_path(self, path: str) -> Optional[Dict[str, Any]]:
+        """Look up a query-less GET by path (used to assemble GraphQL responses)."""
+        return self._by_path.get(path)
+
+    def put(self, method: str, path: str, query: str, body: bytes, status: int,
+            headers: Dict[str, str], response_body: str) -> None:
+        key = cassette_key(method, path, query, body)
+        interaction = {
+            "request": {"method": method, "path": path, "query": query},
+            "response": {"status": status, "headers": headers, "body": response_body},
+        }
+        with open(os.path.join(self.directory, key + ".json"), "w", encoding="utf-8") as f:
+            json.dump(interaction, f)
+        self._index(key, interaction)
+
+    def __len__(self) -> int:
+        return len(self._interactions)
+
+
+class FaultConfig:
+    """Latency, rate-limit and error injection settings for replay."""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, rate_limit: int = 0,
+                 rate_window: float = 3600, error_rate: float = 0, secondary_rate: float = 0,
+                 retry_after: int = 1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.error_rate = error_rate
+        self.secondary_rate = secondary_rate
+        self.retry_after = retry_after
+
+
+class StandIn:
+    """Shared state for the stand-in server: cassettes, fault config, budgets and counters."""
+
+    def __init__(self, cassettes: CassetteStore, mode: str = "replay", faults: Optional[FaultConfig] = None):
+        self.cassettes = cassettes
+        self.mode = mode
+        self.faults = faults or FaultConfig()
+        self.base_url = ""
+        self._lock = threading.Lock()
+        self._budgets: Dict[tuple, Dict[str, float]] = {}
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.by_kind = Counter()
+            self.by_status = Counter()
+            self.api_requests = 0
+            self.total_requests = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total_requests": self.total_requests,
+                "api_requests": self.api_requests,
+                "by_kind": dict(self.by_kind),
+                "by_status": {str(k): v for k, v in self.by_status.items()},
+            }
+
+    def count(self, path: str, status: int) -> None:
+        with self._lock:
+            self.total_requests += 1
+            if upstream_for(path) == API_UPSTREAM:
+                self.api_requests += 1
+            self.by_kind[endpoint_kind(path)] += 1
+            self.by_status[status] += 1
+
+    def take_budget(self, token: str, resource: str):
+        """Spend one request from the token's budget. Returns (limit, remaining, reset, allowed)."""
+        limit = self.faults.rate_limit
+        now = time.time()
+        with self._lock:
+            budget = self._budgets.get((token, resource))
+            if budget is None or budget["reset"] <= now:
+                budget = {"remaining": limit, "reset": now + self.faults.rate_window}
+                self._budgets[(token, resource)] = budget
+            if budget["remaining"] <= 0:
+                return limit, 0, int(budget["reset"]), False
+            budget["remaining"] -= 1
+            return limit, int(budget["remaining"]), int(budget["reset"]), True
+
+    def rewrite(self, body: str) -> str:
+        """Point URLs embedded in recorded bodies back at the stand-in."""
+        for upstream in (API_UPSTREAM, WEB_UPSTREAM, RAW_UPSTREAM):
+            body = body.replace(upstream, self.base_url)
+        return body
+
+    def graphql_from_rest(self, body: bytes) -> Optional[Dict[str, Any]]:
+        """Answer an aliased pullRequest batch query from the recorded REST cassettes."""
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return None
+        variables = request.get("variables") or {}
+        owner, name = variables.get("owner"), variables.get("name")
+        aliases = re.findall(r"(\w+):\s*pullRequest\(number:\s*(\d+)\)", request.get("query", ""))
+        if not owner or not name or not aliases:
+            return None
+        repository = {}
+        for alias, number in aliases:
+            base = f"/repos/{owner}/{name}/pulls/{number}"
+            pr = self.cassettes.get_path(base)
+            if pr is None or pr["response"]["status"] != 200:
+                repository[alias] = None
+                continue
+            pr_data = json.loads(pr["response"]["body"])
+            commits = self.cassettes.get_path(base + "/commits")
+            reviews = self.cassettes.get_path(base + "/reviews")
+            commits_data = json.loads(commits["response"]["body"]) if commits else []
+            reviews_data = json.loads(reviews["response"]["body"]) if reviews else []
+            repository[alias] = {
+                "number": pr_data.get("number"),
+                "title": pr_data.get("title"),
+                "createdAt": pr_data.get("created_at"),
+                "mergedAt": pr_data.get("merged_at"),
+                "additions": pr_data.get("additions", 0),
+                "deletions": pr_data.get("deletions", 0),
+                "changedFiles": pr_data.get("changed_files", 0),
+                "author": {"login": (pr_data.get("user") or {}).get("login")},
+                "commits": {
+                    "totalCount": pr_data.get("commits", len(commits_data)),
+                    "nodes": [
+                        {"commit": {"oid": c.get("sha"), "message": c.get("commit", {}).get("message", ""),
+                                    "author": c.get("commit", {}).get("author")}}
+                        for c in commits_data
+                    ],
+                },
+                "reviews": {
+                    "totalCount": len(reviews_data),
+                    "nodes": [
+                        {"author": {"login": (r.get("user") or {}).get("login")}, "state": r.get("state"),
+                         "body": r.get("body", ""), "submittedAt": r.get("submitted_at")}
+                        for r in reviews_data
+                    ],
+                },
+            }
+        return {"data": {"repository": repository}}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed ACKs add ~40ms per request
+    disable_nagle_algorithm = True
+    standin: StandIn = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _send(self, status: int, body: bytes, headers: Dict[str, str]) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send(status, json.dumps(payload).encode("utf-8"), {"Content-Type": "application/json", **(headers or {})})
+
+    def _handle(self, method: str) -> None:
+        standin = self.standin
+        split = urlsplit(self.path)
+        path, query = split.path, split.query
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0) or 0)) if method == "POST" else b""
+
+        if path == "/_standin/stats":
+            return self._send_json(200, standin.stats())
+        if path == "/_standin/reset":
+            standin.reset_stats()
+            return self._send_json(200, {"ok": True})
+
+        faults = standin.faults
+        if faults.latency_ms or faults.jitter_ms:
+            time.sleep(max(0.0, faults.latency_ms + random.uniform(-faults.jitter_ms, faults.jitter_ms)) / 1000)
+
+        rate_headers = {}
+        is_api = upstream_for(path) == API_UPSTREAM
+        if standin.mode == "replay" and faults.rate_limit and is_api:
+            resource = "search" if path.startswith("/search/") else "graphql" if path.startswith("/graphql") else "core"
+            limit, remaining, reset, allowed = standin.take_budget(self.headers.get("Authorization", ""), resource)
+            rate_headers = {
+                "X-RateLimit-Limit": str(limit),
+                "X-RateLimit-Remaining": str(remaining),
+                "X-RateLimit-Reset": str(reset),
+                "X-RateLimit-Resource": resource,
+            }
+            if not allowed:
+                standin.count(path, 403)
+                return self._send_json(403, {"message": "API rate limit exceeded (stand-in)."}, rate_headers)
+
+        roll = random.random()
+        if roll < faults.error_rate:
+            standin.count(path, 429)
+            return self._send_json(429, {"message": "Too many requests (stand-in)."},
+                                   {"Retry-After": str(faults.retry_after), **rate_headers})
+        if roll < faults.error_rate + faults.secondary_rate:
+            standin.count(path, 403)
+            return self._send_json(403, {"message": "You have exceeded a secondary rate limit (stand-in)."},
+                                   {"Retry-After": str(faults.retry_after), **rate_headers})
+
+        key = cassette_key(method, path, query, body)
+        interaction = standin.cassettes.get(key)
+        if interaction is None and standin.mode == "record":
+            interaction = self._record(method, path, query, body)
+        if interaction is None and method == "POST" and path == "/graphql":
+            payload = standin.graphql_from_rest(body)
+            if payload is not None:
+                standin.count(path, 200)
+                return self._send_json(200, payload, rate_headers)
+        if interaction is None:
+            standin.count(path, 404)
+            return self._send_json(404, {"message": f"Not Found (no cassette for {method} {self.path})"})
+
+        response = interaction["response"]
+        headers = {**response.get("headers", {}), **rate_headers}
+        etag = headers.get("ETag")
+        if etag and self.headers.get("If-None-Match") == etag:
+            standin.count(path, 304)
+            return self._send(304, b"", {"ETag": etag, **rate_headers})
+        standin.count(path, response["status"])
+        self._send(response["status"], standin.rewrite(response["body"]).encode("utf-8"), headers)
+
+    def _record(self, method: str, path: str, query: str, body: bytes) -> Dict[str, Any]:
+        url = upstream_for(path) + path + (f"?{query}" if query else "")
+        forward = {h: self.headers[h] for h in ("Authorization", "Accept", "Content-Type") if h in self.headers}
+        upstream = requests.request(method, url, headers=forward, data=body or None, timeout=60)
+        headers = {h: upstream.headers[h] for h in RECORDED_HEADERS if h in upstream.headers}
+        if upstream.status_code in (200, 404):
+            self.standin.cassettes.put(method, path, query, body, upstream.status_code, headers, upstream.text)
+            print(f"[STANDIN] Recorded {method} {path} -> {upstream.status_code}")
+        # Pass GitHub's live rate-limit headers through without persisting them
+        live = {h: v for h, v in upstream.headers.items() if h.lower().startswith("x-ratelimit") or h == "Retry-After"}
+        return {"response": {"status": upstream.status_code, "headers": {**headers, **live}, "body": upstream.text}}
+
+
+def start_standin(cassettes_dir: str, mode: str = "replay", faults: Optional[FaultConfig] = None,
+                  host: str = "127.0.0.1", port: int = 0):
+    """
+    Start the stand-in in a background thread.
+    Returns (server, standin); the server's base URL is standin.base_url.
+    """
+    standin = StandIn(CassetteStore(cassettes_dir), mode=mode, faults=faults)
+    handler = type("BoundStandInHandler", (StandInHandler,), {"standin": standin})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    standin.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, standin
+
+
+def _serve_in_child(cassettes_dir: str, mode: str, faults: FaultConfig, host: str, conn) -> None:
+    server, standin = start_standin(cassettes_dir, mode=mode, faults=faults, host=host)
+    conn.send(standin.base_url)
+    conn.close()
+    threading.Event().wait()
+
+
+def start_standin_process(cassettes_dir: str, mode: str = "replay", faults: Optional[FaultConfig] = None,
+                          host: str = "127.0.0.1"):
+    """
+    Start the stand-in in a child process, so serving does not compete with the
+    benchmarked client for the GIL. Returns (process, base_url); use the
+    /_standin/stats and /_standin/reset endpoints to read counters.
+    """
+    import multiprocessing
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_serve_in_child, args=(cassettes_dir, mode, faults or FaultConfig(), host, child_conn), daemon=True
+    )
+    process.start()
+    return process, parent_conn.recv()
+
+
+def synthesize_cassettes(directory: str, owner: str, repo: str, pr_count: int, seed: int = 0) -> None:
+    """Write a synthetic cassette set for owner/repo with pr_count merged PRs."""
+    rng = random.Random(seed)
+    store = CassetteStore(directory)
+    api = f"{API_UPSTREAM}/repos/{owner}/{repo}"
+    json_headers = {"Content-Type": "application/json; charset=utf-8"}
+
+    def put_json(path: str, payload: Any, query: str = "") -> None:
+        etag = '"' + hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest() + '"'
+        store.put("GET", path, query, b"", 200, {**json_headers, "ETag": etag}, json.dumps(payload))
+
+    put_json(f"/repos/{owner}/{repo}", {"full_name": f"{owner}/{repo}", "name": repo, "owner": {"login": owner}})
+    store.put("GET", f"/repos/{owner}/{repo}/readme", "", b"", 200, {"Content-Type": "text/plain"},
+              f"# {repo}\n\nSynthetic repository used for offline benchmarks.\n")
+
+    prs: List[Dict[str, Any]] = []
+    now = time.time()
+    for number in range(pr_count, 0, -1):
+        created = now - number * 3600 * 6
+        merged = created + rng.randint(1, 72) * 3600
+        author = f"dev{rng.randint(1, 25)}"
+        files = rng.randint(1, 8)
+        additions, deletions = rng.randint(5, 400), rng.randint(0, 200)
+        iso = lambda t: time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t))
+        pr = {
+            "number": number,
+            "title": f"Synthetic change #{number}",
+            "user": {"login": author},
+            "state": "closed",
+            "created_at": iso(created),
+            "updated_at": iso(merged),
+            "merged_at": iso(merged),
+            "url": f"{api}/pulls/{number}",
+            "commits_url": f"{api}/pulls/{number}/commits",
+            "additions": additions,
+            "deletions": deletions,
+            "changed_files": files,
+            "commits": 2,
+        }
+        prs.append(pr)
+        put_json(f"/repos/{owner}/{repo}/pulls/{number}", pr)
+        put_json(f"/repos/{owner}/{repo}/pulls/{number}/commits", [
+            {"sha": hashlib.sha1(f"{number}-{i}".encode()).hexdigest(),
+             "commit": {"message": f"Commit {i} for #{number}", "author": {"name": author, "date": iso(created + i * 60)}}}
+            for i in range(2)
+        ])
+        put_json(f"/repos/{owner}/{repo}/pulls/{number}/reviews", [
+            {"user": {"login": "reviewer"}, "state": "APPROVED", "body": "Looks good", "submitted_at": iso(created + 1800)}
+        ])
+        put_json(f"/repos/{owner}/{repo}/pulls/{number}/comments", [])
+        added, removed = additions // files, deletions // files
+        diff = "".join(
+            f"diff --git a/src/module{f}.js b/src/module{f}.js\n--- a/src/module{f}.js\n+++ b/src/module{f}.js\n"
+            f"@@ -1,{removed} +1,{added} @@\n"
+            + "".join(f"-const legacy{i} = 0;\n" for i in range(removed))
+            + "".join(f"+const value{i} = compute({i});\n" for i in range(added))
+            for f in range(files)
+        )
+        store.put("GET", f"/{owner}/{repo}/pull/{number}.diff", "", b"", 200, {"Content-Type": "text/plain"}, diff)
+        patch = f"From {hashlib.sha1(str(number).encode()).hexdigest()} Mon Sep 17 00:00:00 2001\nSubject: [PATCH] {pr['title']}\n\n{diff}"
+        store.put("GET", f"/{owner}/{repo}/pull/{number}.patch", "", b"", 200, {"Content-Type": "text/plain"}, patch)
+        store.put("GET", f"/raw/{owner}/{repo}/pull/{number}.patch", "", b"", 200, {"Content-Type": "text/plain"}, patch)
+
+    # Closed-PR listing as iter_merged_prs requests it, plus the trailing empty page
+    per_page = 100
+    pages = [prs[i:i + per_page] for i in range(0, len(prs), per_page)] + [[]]
+    for page, items in enumerate(pages, start=1):
+        query = urlencode({"state": "closed", "sort": "updated", "direction": "desc", "per_page": per_page, "page": page})
+        put_json(f"/repos/{owner}/{repo}/pulls", items, query)
+    print(f"[STANDIN] Wrote {len(store)} synthetic cassettes for {owner}/{repo} to {directory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record/replay stand-in for the GitHub API.")
+    parser.add_argument("mode", choices=["record", "replay", "synthesize"])
+    parser.add_argument("--cassettes", required=True, help="Cassette directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random +/- jitter on the latency")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Per-token request budget per window (0 = unlimited)")
+    parser.add_argument("--rate-window", type=float, default=3600, help="Rate-limit window in seconds")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests answered with 429")
+    parser.add_argument("--secondary-rate", type=float, default=0, help="Fraction answered with a secondary-limit 403")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on injected errors")
+    parser.add_argument("--repo", default="acme/widgets", help="owner/repo for synthesize")
+    parser.add_argument("--prs", type=int, default=100, help="Number of PRs for synthesize")
+    args = parser.parse_args()
+
+    if args.mode == "synthesize":
+        owner, repo = args.repo.split("/")
+        synthesize_cassettes(args.cassettes, owner, repo, args.prs)
+        return
+
+    faults = FaultConfig(args.latency_ms, args.jitter_ms, args.rate_limit, args.rate_window,
+                         args.error_rate, args.secondary_rate, args.retry_after)
+    server, standin = start_standin(args.cassettes, mode=args.mode, faults=faults, host=args.host, port=args.port)
+    print(f"[STANDIN] {args.mode} mode on {standin.base_url} with {len(standin.cassettes)} cassettes")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,508 @@
+"""
+llm_client.py
+
+Shared client for the Llama chat completions API.
+
+Every LLM call in the backend goes through here instead of building its own payload and
+calling requests.post:
+
+- Requests use the pooled keep-alive client from transport.py (a per-event-loop
+  httpx.AsyncClient on the async path), so calls reuse connections. Close the async
+  client with `await aclose()` before the loop ends, or wrap the async work in
+  `async with async_session():`.
+- 429 and 5xx responses, timeouts and connection errors are retried with exponential
+  backoff and jitter, honoring Retry-After when the server sends it.
+- A process-wide semaphore caps in-flight calls across all threads and event loops,
+  and a sliding-window tokens-per-minute limiter keeps the estimated token spend
+  under LLM_TOKENS_PER_MINUTE. Reservations are settled with the real usage once
+  the response reports it.
+- Latency, retries and token usage are recorded per call and summarized by label
+  with get_stats().
+- total_timeout bounds a whole call (rate-limit wait, concurrency slot, attempts and
+  backoff) and raises LLMTimeoutError once it is spent, so callers with a deadline
+  never have to abandon a thread that is still retrying.
+- Replies are cached on disk (disk_cache.DiskLRUCache) under a hash of the model,
+  messages, temperature and max_completion_tokens, so a re-run with unchanged prompts
+  answers from the cache without a request or rate-limit slot. The cache is LRU-bounded
+  by LLM_CACHE_MAX_BYTES; cache_stats() reports hits and misses. Callers that parse
+  the reply pass parse=..., so only replies that parse are cached and a bad reply is
+  asked for again on the next run. Pass cache=False to bypass the cache for one call,
+  or set LLM_CACHE_DISABLED=1 (or LLM_CACHE_ENABLED = False) to bypass it entirely.
+
+Configure with LLAMA_API_KEY, LLAMA_API_URL, LLAMA_MODEL, LLM_MAX_CONCURRENCY,
+LLM_TOKENS_PER_MINUTE (0 = unlimited), LLM_CACHE_DIR and LLM_CACHE_MAX_BYTES.
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+import transport
+from disk_cache import DiskLRUCache
+
+TRANSIENT_ERRORS = (requests.Timeout, requests.ConnectionError)
+try:
+    import httpx
+    TRANSIENT_ERRORS += (httpx.TransportError,)
+except ImportError:
+    pass
+
+LLAMA_API_URL = os.getenv("LLAMA_API_URL", "https://api.llama.com/v1/chat/completions")
+LLAMA_MODEL = os.getenv("LLAMA_MODEL", "Llama-4-Maverick-17B-128E-Instruct-FP8")
+LLAMA_API_KEY = os.getenv("LLAMA_API_KEY")
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+DEFAULT_TIMEOUT = 90
+MAX_RETRIES = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Rough prompt size estimate used to reserve TPM budget before the real usage is known
+CHARS_PER_TOKEN = 4
+# Latencies kept per label for percentiles
+LATENCY_WINDOW = 1000
+
+# On-disk response cache
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "llm"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_DISABLED", "") != "1"
+
+
+class ResponseParseError(Exception):
+    """The caller's parse function rejected a reply; `text` holds the raw reply."""
+
+    def __init__(self, message: str, text: str):
+        super().__init__(message)
+        self.text = text
+
+
+class LLMTimeoutError(Exception):
+    """A call ran out of its total_timeout."""
+
+
+class TokenRateLimiter:
+    """Sliding 60-second window of token reservations."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self._entries = deque()  # [timestamp, tokens]
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int):
+        """
+        Reserve tokens, returning (entry, wait): the caller sleeps `wait` seconds before
+        sending and passes `entry` to settle() once the real usage is known.
+        """
+        if self.tokens_per_minute <= 0:
+            return None, 0.0
+        tokens = min(tokens, self.tokens_per_minute)
+        with self._lock:
+            now = time.monotonic()
+            while self._entries and self._entries[0][0] <= now - 60:
+                self._entries.popleft()
+            used = sum(n for _, n in self._entries)
+            start = now
+            for at, n in self._entries:
+                if used + tokens <= self.tokens_per_minute:
+                    break
+                # Wait for this reservation to leave the window
+                used -= n
+                start = at + 60
+            entry = [start, tokens]
+            self._entries.append(entry)
+            return entry, max(0.0, start - now)
+
+    def settle(self, entry, tokens: int) -> None:
+        if entry is not None:
+            with self._lock:
+                entry[1] = tokens
+
+
+class LLMStats:
+    """Per-label call, retry, latency and token counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._labels: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, label: str, latency: float, retries: int, ok: bool,
+               prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        with self._lock:
+            entry = self._labels.setdefault(label, {
+                "calls": 0, "failures": 0, "retries": 0, "prompt_tokens": 0,
+                "completion_tokens": 0, "latency_total": 0.0, "latencies": deque(maxlen=LATENCY_WINDOW),
+            })
+            entry["calls"] += 1
+            entry["failures"] += 0 if ok else 1
+            entry["retries"] += retries
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["latency_total"] += latency
+            entry["latencies"].append(latency)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for label, entry in self._labels.items():
+                latencies = sorted(entry["latencies"])
+                result[label] = {
+                    "calls": entry["calls"],
+                    "failures": entry["failures"],
+                    "retries": entry["retries"],
+                    "prompt_tokens": entry["prompt_tokens"],
+                    "completion_tokens": entry["completion_tokens"],
+                    "avg_latency": round(entry["latency_total"] / entry["calls"], 2),
+                    "p95_latency": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+                }
+            return result
+
+
+_semaphore = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_limiter = TokenRateLimiter(LLM_TOKENS_PER_MINUTE)
+_stats = LLMStats()
+# id(event loop) -> (loop, httpx.AsyncClient)
+_async_clients: Dict[int, Any] = {}
+_cache: Optional[DiskLRUCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    """Call, retry, token and latency summary per label."""
+    return _stats.summary()
+
+
+def get_cache() -> Optional[DiskLRUCache]:
+    """Shared response cache, or None when LLM_CACHE_ENABLED is off."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskLRUCache(LLM_CACHE_DIR, LLM_CACHE_MAX_BYTES)
+        return _cache
+
+
+def cache_stats() -> Optional[Dict[str, Any]]:
+    """Hit/miss/eviction counters of the response cache, or None if it is disabled."""
+    cache = get_cache()
+    return cache.stats() if cache is not None else None
+
+
+def _cache_key(messages: List[Dict[str, str]], max_completion_tokens: int, temperature: float) -> str:
+    return DiskLRUCache.make_key(LLAMA_MODEL, messages, temperature, max_completion_tokens)
+
+
+def _cached_reply(cache: Optional[DiskLRUCache], key: str, parse: Optional[Callable[[str], Any]]):
+    """(True, reply) for a usable cache entry, else (False, None). Entries `parse` rejects are evicted."""
+    if cache is None:
+        return False, None
+    entry = cache.get(key)
+    if not entry or "text" not in entry:
+        return False, None
+    if parse is None:
+        return True, entry["text"]
+    try:
+        return True, parse(entry["text"])
+    except Exception:
+        cache.delete(key)
+        return False, None
+
+
+def _store_reply(cache: Optional[DiskLRUCache], key: str, text: str) -> None:
+    if cache is None:
+        return
+    try:
+        cache.set(key, {"model": LLAMA_MODEL, "text": text, "created_at": time.time()})
+    except OSError as e:
+        print(f"[LLM] Could not write response cache entry: {e}")
+
+
+def _accept(cache: Optional[DiskLRUCache], key: str, text: str, parse: Optional[Callable[[str], Any]]):
+    """Parse a fresh reply if asked to, and cache it only once it has parsed."""
+    result = text
+    if parse is not None:
+        try:
+            result = parse(text)
+        except Exception as e:
+            raise ResponseParseError(f"LLM reply could not be parsed: {e}", text) from e
+    _store_reply(cache, key, text)
+    return result
+
+
+def _payload(messages: List[Dict[str, str]], max_completion_tokens: int, temperature: float) -> Dict[str, Any]:
+    return {
+        "model": LLAMA_MODEL,
+        "messages": messages,
+        "max_completion_tokens": max_completion_tokens,
+        "temperature": temperature,
+    }
+
+
+def _headers() -> Dict[str, str]:
+    if not LLAMA_API_KEY:
+        raise Exception("LLAMA_API_KEY environment variable not set.")
+    return {"Content-Type": "application/json", "Authorization": f"Bearer {LLAMA_API_KEY}"}
+
+
+def _estimate_tokens(messages: List[Dict[str, str]], max_completion_tokens: int) -> int:
+    return sum(len(m.get("content", "")) for m in messages) // CHARS_PER_TOKEN + max_completion_tokens
+
+
+def _usage(result: Dict[str, Any]):
+    """(prompt_tokens, completion_tokens) from a Llama `metrics` list or an OpenAI-style `usage` dict."""
+    metrics = {m.get("metric"): m.get("value", 0) for m in result.get("metrics", []) if isinstance(m, dict)}
+    if metrics:
+        return int(metrics.get("num_prompt_tokens", 0)), int(metrics.get("num_completion_tokens", 0))
+    usage = result.get("usage") or {}
+    return int(usage.get("prompt_tokens", 0)), int(usage.get("completion_tokens", 0))
+
+
+def _extract_text(result: Dict[str, Any]) -> str:
+    try:
+        return result["completion_message"]["content"]["text"]
+    except (KeyError, TypeError):
+        raise Exception(f"Unexpected Llama response: {result}")
+
+
+def _retry_delay(attempt: int, headers=None) -> float:
+    retry_after = headers.get("Retry-After") if headers is not None else None
+    if retry_after:
+        try:
+            return min(MAX_DELAY, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                return min(MAX_DELAY, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    delay = min(MAX_DELAY, BASE_DELAY * (2 ** attempt))
+    return delay + random.uniform(0, delay / 2)
+
+
+def _time_left(ends: Optional[float]) -> Optional[float]:
+    return None if ends is None else max(0.0, ends - time.monotonic())
+
+
+def _attempt_timeout(timeout: float, ends: Optional[float]) -> float:
+    left = _time_left(ends)
+    return timeout if left is None else max(0.001, min(timeout, left))
+
+
+def _out_of_time(ends: Optional[float], wait: float = 0.0) -> bool:
+    """True if waiting `wait` more seconds would reach the deadline."""
+    return ends is not None and time.monotonic() + wait >= ends
+
+
+def _timeout_error(label: str, total_timeout: Optional[float], reason: str) -> LLMTimeoutError:
+    return LLMTimeoutError(f"LLM call ({label}) exceeded its {total_timeout}s total timeout: {reason}")
+
+
+def _finish(label, started, retries, entry, response):
+    """Turn a final response into text, or raise, recording stats either way."""
+    if response.status_code != 200:
+        _stats.record(label, time.monotonic() - started, retries, ok=False)
+        raise Exception(f"Llama API error: {response.status_code} {response.text}")
+    result = response.json()
+    prompt_tokens, completion_tokens = _usage(result)
+    if prompt_tokens or completion_tokens:
+        _limiter.settle(entry, prompt_tokens + completion_tokens)
+    _stats.record(label, time.monotonic() - started, retries, ok=True,
+                  prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return _extract_text(result)
+
+
+def chat(messages: List[Dict[str, str]], max_completion_tokens: int = 2048, temperature: float = 0.7,
+         timeout: float = DEFAULT_TIMEOUT, label: str = "llm", cache: bool = True,
+         parse: Optional[Callable[[str], Any]] = None, total_timeout: Optional[float] = None) -> Any:
+    """
+    Send a chat completion request and return the reply text.
+
+    Args:
+        messages: Chat messages, e.g. [{"role": "user", "content": prompt}]
+        max_completion_tokens: Completion length cap
+        temperature: Sampling temperature
+        timeout: Per-attempt request timeout in seconds
+        label: Name the call is recorded under in get_stats()
+        cache: Look up and store the reply in the response cache (default: True)
+        parse: Optional function applied to the reply, e.g. parse_json_response. If it
+            raises, ResponseParseError is raised and the reply is not cached.
+        total_timeout: Optional budget in seconds for the whole call, retries included;
+            LLMTimeoutError is raised once it is spent
+
+    Returns:
+        The completion text, or parse(text) when parse is given
+    """
+    store = get_cache() if cache else None
+    key = _cache_key(messages, max_completion_tokens, temperature)
+    hit, reply = _cached_reply(store, key, parse)
+    if hit:
+        return reply
+    ends = time.monotonic() + total_timeout if total_timeout is not None else None
+    headers = _headers()
+    payload = _payload(messages, max_completion_tokens, temperature)
+    entry, wait = _limiter.reserve(_estimate_tokens(messages, max_completion_tokens))
+    if wait:
+        if _out_of_time(ends, wait):
+            _limiter.settle(entry, 0)
+            raise _timeout_error(label, total_timeout, f"token budget frees up in {wait:.0f}s")
+        time.sleep(wait)
+    started = time.monotonic()
+    if not _semaphore.acquire(timeout=_time_left(ends)):
+        _limiter.settle(entry, 0)
+        raise _timeout_error(label, total_timeout, "no free concurrency slot")
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = transport.post(LLAMA_API_URL, headers=headers, json=payload,
+                                          timeout=_attempt_timeout(timeout, ends))
+            except Exception as e:
+                if not isinstance(e, TRANSIENT_ERRORS) or attempt == MAX_RETRIES:
+                    _stats.record(label, time.monotonic() - started, attempt, ok=False)
+                    raise
+                delay = _retry_delay(attempt)
+                if _out_of_time(ends, delay):
+                    _stats.record(label, time.monotonic() - started, attempt, ok=False)
+                    raise _timeout_error(label, total_timeout, f"{type(e).__name__}: {e}") from e
+                print(f"[LLM] {label}: {type(e).__name__}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+                delay = _retry_delay(attempt, response.headers)
+                if _out_of_time(ends, delay):
+                    _stats.record(label, time.monotonic() - started, attempt, ok=False)
+                    raise _timeout_error(label, total_timeout, f"HTTP {response.status_code}")
+                print(f"[LLM] {label}: HTTP {response.status_code}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            text = _finish(label, started, attempt, entry, response)
+            return _accept(store, key, text, parse)
+    finally:
+        _semaphore.release()
+
+
+def complete(prompt: str, **kwargs) -> Any:
+    """chat() with a single user message."""
+    return chat([{"role": "user", "content": prompt}], **kwargs)
+
+
+def _async_client():
+    # httpx.AsyncClient is bound to the loop it was created on
+    loop = asyncio.get_running_loop()
+    for loop_id, (owner, _) in list(_async_clients.items()):
+        # A loop that ended without aclose(); its client can no longer be awaited, so let it be collected
+        if owner.is_closed():
+            _async_clients.pop(loop_id, None)
+    cached = _async_clients.get(id(loop))
+    if cached is None or cached[0] is not loop:
+        cached = (loop, transport.new_async_client(max_connections=LLM_MAX_CONCURRENCY))
+        _async_clients[id(loop)] = cached
+    return cached[1]
+
+
+async def aclose() -> None:
+    """Close the running loop's AsyncClient and its connections."""
+    loop = asyncio.get_running_loop()
+    cached = _async_clients.pop(id(loop), None)
+    if cached is not None and cached[0] is loop:
+        await cached[1].aclose()
+
+
+@contextlib.asynccontextmanager
+async def async_session():
+    """Scope for async calls on one loop, e.g. an asyncio.run() body; closes the client on exit."""
+    try:
+        yield
+    finally:
+        await aclose()
+
+
+async def _acquire_slot(ends: Optional[float] = None) -> bool:
+    """Take a concurrency slot, or return False if the deadline `ends` passes first."""
+    # Poll rather than block a thread on the semaphore, so cancellation cannot leak a slot
+    delay = 0.01
+    while not _semaphore.acquire(blocking=False):
+        if _out_of_time(ends):
+            return False
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.25)
+    return True
+
+
+async def achat(messages: List[Dict[str, str]], max_completion_tokens: int = 2048, temperature: float = 0.7,
+                timeout: float = DEFAULT_TIMEOUT, label: str = "llm", cache: bool = True,
+                parse: Optional[Callable[[str], Any]] = None, total_timeout: Optional[float] = None) -> Any:
+    """Async counterpart of chat(); shares its semaphore, token limiter, stats and response cache."""
+    store = get_cache() if cache else None
+    key = _cache_key(messages, max_completion_tokens, temperature)
+    hit, reply = _cached_reply(store, key, parse)
+    if hit:
+        return reply
+    ends = time.monotonic() + total_timeout if total_timeout is not None else None
+    headers = _headers()
+    payload = _payload(messages, max_completion_tokens, temperature)
+    entry, wait = _limiter.reserve(_estimate_tokens(messages, max_completion_tokens))
+    if wait:
+        if _out_of_time(ends, wait):
+            _limiter.settle(entry, 0)
+            raise _timeout_error(label, total_timeout, f"token budget frees up in {wait:.0f}s")
+        await asyncio.sleep(wait)
+    started = time.monotonic()
+    if not await _acquire_slot(ends):
+        _limiter.settle(entry, 0)
+        raise _timeout_error(label, total_timeout, "no free concurrency slot")
+    try:
+        client = _async_client()
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = await client.post(LLAMA_API_URL, headers=headers, json=payload,
+                                             timeout=_attempt_timeout(timeout, ends))
+            except Exception as e:
+                if not isinstance(e, TRANSIENT_ERRORS) or attempt == MAX_RETRIES:
+                    _stats.record(label, time.monotonic() - started, attempt, ok=False)
+                    raise
+                delay = _retry_delay(attempt)
+                if _out_of_time(ends, delay):
+                    _stats.record(label, time.monotonic() - started, attempt, ok=False)
+                    raise _timeout_error(label, total_timeout, f"{type(e).__name__}: {e}") from e
+                print(f"[LLM] {label}: {type(e).__name__}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+                delay = _retry_delay(attempt, response.headers)
+                if _out_of_time(ends, delay):
+                    _stats.record(label, time.monotonic() - started, attempt, ok=False)
+                    raise _timeout_error(label, total_timeout, f"HTTP {response.status_code}")
+                print(f"[LLM] {label}: HTTP {response.status_code}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            text = _finish(label, started, attempt, entry, response)
+            return _accept(store, key, text, parse)
+    finally:
+        _semaphore.release()
+
+
+async def acomplete(prompt: str, **kwargs) -> Any:
+    """achat() with a single user message."""
+    return await achat([{"role": "user", "content": prompt}], **kwargs)
+
+
+def parse_json_response(text: str) -> Any:
+    """Parse a JSON reply, tolerating ```json fences and text around the object."""
+    cleaned = text
+    if "```json" in cleaned:
+        cleaned = cleaned.split("```json", 1)[1]
+    if "```" in cleaned:
+        cleaned = cleaned.split("```", 1)[0]
+    cleaned = cleaned.strip()
+    match = re.search(r"({.*})", cleaned, re.DOTALL)
+    return json.loads(match.group(1) if match else cleaned)
@@ -1,20 +1,28 @@
 import os
-import json
-import re
 from typing import Any, Dict
 from pydantic import BaseModel
-from db import Repository, PullRequest, SessionLocal, init_db
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from db import Repository, PullRequest, SessionLocal, init_db, processed_prs
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 import argparse
+import time
+import mmap
+from patch_index import scan_file_range, scan_records
+from diff_condenser import DIFF_BUDGET_CHARS, condense_diff
+from diff_filter import filter_diff, filtered_analysis
+from diff_stats import merge_direct_metadata
+from metadata_store import metadata_for_repo
 
 # Prompt definitions (copied from pr_profiler.py)
 from pr_profiler import pr_prompts
+import llm_client
 
 PATCHES_PATH = 'all_patches.txt'
-METADATA_PATH = 'pr_metadata.json'
-LLAMA_API_URL = "https://api.llama.com/v1/chat/completions"
-LLAMA_MODEL = "Llama-4-Maverick-17B-128E-Instruct-FP8"
-LLAMA_API_KEY = os.getenv("LLAMA_API_KEY")
+# --parallel mode: per-PR deadline, and how often the single writer commits
+PR_TIMEOUT_SECONDS = 180
+COMMIT_BATCH_SIZE = 20
+COMMIT_INTERVAL_SECONDS = 10
+# Patch dumps smaller than this are scanned in-process even when --parse-processes > 1
+PARALLEL_PARSE_MIN_BYTES = 64 * 1024 * 1024
 
 class PRAnalysis(BaseModel):
     repo_url: str
@@ -23,74 +31,102 @@ class PRAnalysis(BaseModel):
     title: str
     analysis: Dict[Any, Any]
 
-def parse_patches(patches_path):
-    pr_number = None
-    diff_lines = []
-    in_pr = False
-    pr_start_re = re.compile(r'^===== PR #(\d+) =====$')
-    pr_end_re = re.compile(r'^===== END PR #(\d+) =====$')
-    with open(patches_path, 'r', encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            start_match = pr_start_re.match(line.strip())
-            end_match = pr_end_re.match(line.strip())
-            if start_match:
-                pr_number = start_match.group(1)
-                diff_lines = []
-                in_pr = True
-            elif end_match and in_pr and end_match.group(1) == pr_number:
-                yield pr_number, ''.join(diff_lines)
-                pr_number = None
-                diff_lines = []
-                in_pr = False
-            elif in_pr:
-                diff_lines.append(line)
-
-def load_metadata(metadata_path):
-    with open(metadata_path, 'r', encoding='utf-8') as f:
-        metadata_list = json.load(f)
-    return {str(item['pr_number']): item for item in metadata_list}
-
-def analyze_local_pr(repo_url, pr_number, meta, diff):
+def index_patches(patches_path, processes=1):
+    """
+    Find every PR record in a patch dump and return (pr_number, body_start, body_end) byte offsets.
+    With processes > 1 the file is split into byte ranges that are scanned in a process pool;
+    each record belongs to the range its header starts in.
+    """
+    size = os.path.getsize(patches_path)
+    if size == 0:
+        return []
+    if processes <= 1 or size < PARALLEL_PARSE_MIN_BYTES:
+        ranges = [(0, size)]
+    else:
+        step = -(-size // processes)
+        ranges = [(start, min(start + step, size)) for start in range(0, size, step)]
+    if len(ranges) == 1:
+        chunks = [scan_file_range(patches_path, 0, size)]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            chunks = list(pool.map(scan_file_range, [patches_path] * len(ranges),
+                                   [start for start, _ in ranges], [end for _, end in ranges]))
+    # The old line-based parser kept the newline that precedes the END marker
+    return [(pr_number, body_start, marker_at)
+            for chunk in chunks for pr_number, body_start, marker_at, _ in chunk]
+
+def iter_patch_views(patches_path, processes=1):
+    """
+    Yield (pr_number, memoryview) for every PR in a patch dump. The views are zero-copy
+    slices of a read-only mmap and are only valid until the generator is exhausted or closed.
+    """
+    if os.path.getsize(patches_path) == 0:
+        return
+    with open(patches_path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if processes > 1:
+        records = index_patches(patches_path, processes)
+    else:
+        # Scan lazily so a single pass streams through the map
+        records = ((pr, body_start, marker_at) for pr, body_start, marker_at, _ in scan_records(mm))
+    view = memoryview(mm)
+    try:
+        for pr_number, body_start, body_end in records:
+            yield pr_number, view[body_start:body_end]
+    finally:
+        view.release()
+        try:
+            mm.close()
+        except BufferError:
+            # A caller still holds a slice; the map is released once it is collected
+            pass
+
+def parse_patches(patches_path, processes=1):
+    """Yield (pr_number, diff) for every PR in a patch dump, decoding one diff at a time"""
+    for pr_number, view in iter_patch_views(patches_path, processes):
+        diff = str(view, 'utf-8', errors='ignore')
+        view.release()
+        yield str(pr_number), diff
+
+def load_store_patches(repo_url):
+    from patch_store import iter_patches
+    for pr_number, patch in iter_patches(repo_url):
+        yield str(pr_number), patch
+
+def analyze_local_pr(repo_url, pr_number, meta, diff, timeout=90, total_timeout=None):
+    filtered = filter_diff(diff)
+    direct_metadata = merge_direct_metadata(meta, diff)
+    direct_metadata.update(filtered.metadata())
+    if filtered.all_filtered:
+        # Nothing hand-written to analyze; don't spend an LLM call on it
+        print(f"[INFO] PR #{pr_number} only changes {', '.join(sorted(filtered.dropped))} files. Skipping LLM.")
+        return PRAnalysis(
+            repo_url=repo_url,
+            pr_number=int(pr_number),
+            developer=meta.get("author", "Unknown"),
+            title=meta.get("title", ""),
+            analysis={
+                "ai_analysis": filtered_analysis(filtered),
+                "direct_metadata": direct_metadata
+            }
+        )
+
     # Prepare prompt for Llama
     llama_prompt = pr_prompts.synthesis_guidelines + "\n" + pr_prompts.final_type_definition
     pr_info_str = f"PR Title: {meta.get('title', '')}\nAuthor: {meta.get('author', '')}\n"
-    diff_str = f"Diff:\n{diff[:5000]}\n"  # Truncate if too large
+    stubs = filtered.prompt_stubs()
+    diff_str = f"Diff:\n{condense_diff(filtered.text, DIFF_BUDGET_CHARS - len(stubs))}{stubs}\n"
     # No review messages for local
     full_prompt = llama_prompt + pr_info_str + diff_str
 
-    if not LLAMA_API_KEY:
-        raise Exception("LLAMA_API_KEY environment variable not set.")
-    payload = {
-        "model": LLAMA_MODEL,
-        "messages": [
-            {"role": "user", "content": full_prompt}
-        ],
-        "max_completion_tokens": 2048,
-        "temperature": 0.7
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {LLAMA_API_KEY}"
-    }
-    import requests
-    response = requests.post(LLAMA_API_URL, json=payload, headers=headers, timeout=90)
-    if response.status_code != 200:
-        raise Exception(f"Llama API error: {response.status_code} {response.text}")
-    result = response.json()
     try:
-        text_response = result["completion_message"]["content"]["text"]
-        # Clean the response: Remove markdown code block markers if present
-        cleaned_text = text_response
-        if "```json" in cleaned_text:
-            cleaned_text = cleaned_text.split("```json", 1)[1]
-        if "```" in cleaned_text:
-            cleaned_text = cleaned_text.split("```", 1)[0]
-        cleaned_text = cleaned_text.strip()
-        analysis_result_dict = json.loads(cleaned_text)
-    except Exception as e:
-        print(f"[ERROR] Failed to parse Llama response: {e}")
-        print(f"[ERROR] Raw response content: {result}")
-        raise Exception(f"Failed to parse Llama response: {str(e)}. Raw response: {result}")
+        analysis_result_dict = llm_client.complete(full_prompt, max_completion_tokens=2048, timeout=timeout,
+                                                   label="local_pr_analysis", parse=llm_client.parse_json_response,
+                                                   total_timeout=total_timeout)
+    except llm_client.ResponseParseError as e:
+        print(f"[ERROR] Failed to parse Llama response: {e.__cause__}")
+        print(f"[ERROR] Raw response content: {e.text}")
+        raise Exception(f"Failed to parse Llama response: {str(e.__cause__)}. Raw response: {e.text}")
     return PRAnalysis(
         repo_url=repo_url,
         pr_number=int(pr_number),
@@ -98,7 +134,7 @@ def analyze_local_pr(repo_url, pr_number, meta, diff):
         title=meta.get("title", ""),
         analysis={
             "ai_analysis": analysis_result_dict,
-            "direct_metadata": meta
+            "direct_metadata": direct_metadata
         }
     )
 
@@ -114,46 +150,187 @@ def pydantic_to_db_pr(pydantic_obj: PRAnalysis) -> PullRequest:
 def analyze_and_store_local_pr(repo_url, pr_number, meta, diff):
     session = SessionLocal()
     try:
-        pr_row = session.query(PullRequest).filter_by(repo_url=repo_url, pr_number=int(pr_number)).first()
-        if pr_row:
+        if processed_prs.contains(repo_url, pr_number):
             print(f"[INFO] PR #{pr_number} already analyzed. Skipping.")
-            return
+            return False
         result = analyze_local_pr(repo_url, pr_number, meta, diff)
         db_obj = pydantic_to_db_pr(result)
         session.add(db_obj)
         session.commit()
         session.refresh(db_obj)
         print(f"[INFO] Analysis for PR #{pr_number} stored in database.")
+        return True
     except Exception as e:
         print(f"[ERROR] Failed to analyze PR #{pr_number}: {e}")
+        return False
     finally:
         session.close()
 
 def is_pr_in_db(pr_number, repo_url):
-    from db import SessionLocal, PullRequest
-    db = SessionLocal()
+    # In-memory lookup; the processed set is loaded once and updated on every commit
+    return processed_prs.contains(repo_url, pr_number)
+
+class ProgressReporter:
+    """Prints throughput and ETA as analyses complete"""
+    def __init__(self, total=None):
+        self.total = total
+        self.done = 0
+        self.started = time.monotonic()
+
+    def update(self, skipped=False):
+        if skipped:
+            # Skipped PRs shrink the remaining work but say nothing about LLM throughput
+            if self.total:
+                self.total -= 1
+            return
+        self.done += 1
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed * 60 if elapsed > 0 else 0.0
+        line = f"[PROGRESS] {self.done}"
+        if self.total:
+            remaining = max(self.total - self.done, 0)
+            eta = remaining / (rate / 60) if rate > 0 else 0
+            line += f"/{self.total} ({self.done / self.total * 100:.1f}%), ETA {eta / 60:.1f} min"
+        print(f"{line}, {rate:.1f} PRs/min")
+
+def count_patches(patches_path):
+    """Count PR records in a patch dump without decoding them"""
+    if not os.path.exists(patches_path) or os.path.getsize(patches_path) == 0:
+        return 0
+    with open(patches_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return sum(1 for _ in scan_records(mm))
+
+def _commit_rows(session, rows):
+    """Write a batch of analyses in one transaction"""
+    if not rows:
+        return
     try:
-        return db.query(PullRequest).filter_by(repo_url=repo_url, pr_number=pr_number).first() is not None
+        session.add_all(rows)
+        session.commit()
+    except Exception as e:
+        # Fall back to one transaction per row so a single bad row does not lose the batch
+        session.rollback()
+        print(f"[DB] Batch commit of {len(rows)} PRs failed ({e}); retrying one at a time.")
+        for row in rows:
+            try:
+                session.add(row)
+                session.commit()
+            except Exception as row_error:
+                session.rollback()
+                print(f"[FAIL] PR {row.pr_number} could not be stored: {row_error}")
+    rows.clear()
+
+def analyze_parallel(repo_url, patches, metadata, parallel, limit=None, timeout=PR_TIMEOUT_SECONDS, total=None):
+    """
+    Run analyze_local_pr for many PRs with at most `parallel` LLM calls in flight.
+    Worker threads only talk to the LLM; this thread is the single DB writer and commits
+    results in batches, so SQLite never sees concurrent writers. Each PR's `timeout` is
+    enforced inside its LLM call (llm_client's total_timeout), so a slow PR fails and
+    frees its worker instead of being abandoned while it keeps retrying.
+
+    Returns:
+        (indexed, skipped, failed) lists, as in the sequential loop
+    """
+    indexed, skipped, failed = [], [], []
+    progress = ProgressReporter(min(total, limit) if total and limit else total)
+    session = SessionLocal()
+    rows = []
+    pending = {}  # future -> pr_number
+    patches = iter(patches)
+    exhausted = False
+    submitted = 0
+    last_commit = time.monotonic()
+
+    def run(pr_number, meta, patch):
+        # The deadline starts when a worker picks the PR up, not when it is queued
+        return analyze_local_pr(repo_url, pr_number, meta, patch, total_timeout=timeout)
+
+    executor = ThreadPoolExecutor(max_workers=parallel)
+    try:
+        while True:
+            # Top up to `parallel` in-flight calls, pulling patches lazily
+            while not exhausted and len(pending) < parallel and not (limit and submitted >= limit):
+                try:
+                    pr_number, patch = next(patches)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if is_pr_in_db(pr_number, repo_url):
+                    print(f"[SKIP] PR {pr_number} already indexed.")
+                    skipped.append(pr_number)
+                    if not limit:
+                        progress.update(skipped=True)
+                    continue
+                future = executor.submit(run, pr_number, metadata.get(str(pr_number), {}), patch)
+                pending[future] = pr_number
+                submitted += 1
+            if not pending:
+                break
+
+            done, _ = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in done:
+                pr_number = pending.pop(future)
+                try:
+                    rows.append(pydantic_to_db_pr(future.result()))
+                    indexed.append(pr_number)
+                    print(f"[INDEXED] PR {pr_number} analyzed.")
+                except Exception as e:
+                    print(f"[FAIL] PR {pr_number} failed to index: {e}")
+                    failed.append((pr_number, str(e)))
+                progress.update()
+
+            now = time.monotonic()
+            if len(rows) >= COMMIT_BATCH_SIZE or (rows and now - last_commit >= COMMIT_INTERVAL_SECONDS):
+                _commit_rows(session, rows)
+                last_commit = now
+        _commit_rows(session, rows)
     finally:
-        db.close()
+        session.close()
+        executor.shutdown(wait=False, cancel_futures=True)
+    return indexed, skipped, failed
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Analyze local PR patches and index them in the DB.")
     parser.add_argument("repo_url", type=str, help="Repository URL (e.g. owner/repo)")
     parser.add_argument("--limit", type=int, default=None, help="Limit number of PRs to process")
+    parser.add_argument("--parallel", type=int, default=1,
+                        help="Number of concurrent LLM calls (default: 1, sequential)")
+    parser.add_argument("--timeout", type=int, default=PR_TIMEOUT_SECONDS,
+                        help=f"Per-PR deadline in seconds with --parallel (default: {PR_TIMEOUT_SECONDS})")
+    parser.add_argument("--parse-processes", type=int, default=1,
+                        help="Processes used to index PR boundaries in all_patches.txt up front "
+                             "(default: 1, a lazy single pass)")
+    parser.add_argument("--patch-store", action="store_true",
+                        help="Read patches for repo_url from the sharded patch store instead of all_patches.txt")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Bypass the on-disk LLM response cache")
     args = parser.parse_args()
+    if args.no_llm_cache:
+        llm_client.LLM_CACHE_ENABLED = False
 
     repo_url = args.repo_url
     limit = args.limit
 
-    # Load all patches and metadata
-    patches = list(parse_patches(PATCHES_PATH))
-    metadata = load_metadata(METADATA_PATH)
+    # Load patches and metadata; both patch sources are lazy, so only one diff is held in memory at a time
+    if args.patch_store:
+        patches = load_store_patches(repo_url)
+    else:
+        patches = parse_patches(PATCHES_PATH, args.parse_processes)
+    # Looked up per PR from the indexed metadata table instead of loading pr_metadata.json
+    metadata = metadata_for_repo(repo_url)
 
     indexed = []
     skipped = []
     failed = []
     count = 0
+    if args.parallel > 1:
+        if args.patch_store:
+            from patch_store import get_patch_store
+            total = len(get_patch_store().pr_numbers(repo_url))
+        else:
+            total = count_patches(PATCHES_PATH)
+        indexed, skipped, failed = analyze_parallel(repo_url, patches, metadata, args.parallel,
+                                                    limit=limit, timeout=args.timeout, total=total)
+        patches = []
     for pr_number, patch in patches:
         if limit and count >= limit:
             break
@@ -178,4 +355,8 @@ if __name__ == "__main__":
     if failed:
         print("Failed PRs:")
         for pr_number, err in failed:
-            print(f"  PR {pr_number}: {err}")
\ No newline at end of file
+            print(f"  PR {pr_number}: {err}")
+    for label, stats in llm_client.get_stats().items():
+        print(f"LLM ({label}): {stats}")
+    if llm_client.LLM_CACHE_ENABLED:
+        print(f"LLM response cache: {llm_client.cache_stats()}")
@@ -0,0 +1,280 @@
+"""
+metadata_store.py
+
+Indexed local table of PR metadata (title, author, merged_at, ...), replacing pr_metadata.json.
+
+Rows live in a WAL-mode SQLite table keyed by (repo, pr_number), with the CSV row stored
+as JSON. The BigQuery CSV export is streamed in with csv.DictReader and batched upserts,
+and analysis looks rows up by PR number on demand. Memory therefore stays flat however
+many PRs are targeted, and startup does not parse one large JSON file. An existing
+pr_metadata.json is imported once, the first time the store is opened empty.
+
+Repos are keyed by normalize_repo(), so "facebook/react", "Facebook/React" and
+"https://github.com/facebook/react.git" all name the same rows. A CSV row's own
+`repo` (or `owner` + `repo`) columns take precedence over the repo passed in.
+
+Usage:
+    python metadata_store.py import target_prs.csv --repo facebook/react
+    python metadata_store.py show 32675 --repo facebook/react
+    python metadata_store.py count --repo facebook/react
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+METADATA_DB = os.getenv("PR_METADATA_DB", os.path.join(BASE_DIR, "pr_metadata.db"))
+LEGACY_METADATA_FILE = os.path.join(BASE_DIR, "pr_metadata.json")
+DEFAULT_REPO = "facebook/react"
+
+# Rows per executemany() while importing
+IMPORT_BATCH_SIZE = 5000
+
+
+def normalize_repo(repo: str) -> str:
+    """Canonical lowercase "owner/repo" for an "owner/repo" string or a GitHub URL."""
+    repo = repo.strip()
+    match = re.search(r"github\.com[/:]([^/]+)/([^/?#]+)", repo)
+    if match:
+        owner, name = match.groups()
+    else:
+        owner, _, name = repo.strip("/").partition("/")
+        name = name.split("/", 1)[0]
+    if name.endswith(".git"):
+        name = name[:-4]
+    if not owner or not name:
+        raise Exception(f"Invalid repository: {repo!r} (expected owner/repo)")
+    # GitHub owner and repo names are case-insensitive
+    return f"{owner}/{name}".lower()
+
+
+def _row_repo(row: Dict[str, Any], default: str) -> str:
+    """Repo named by a row's own columns, else `default`."""
+    if row.get("owner") and row.get("repo"):
+        return normalize_repo(f"{row['owner']}/{row['repo']}")
+    if row.get("repo") and "/" in row["repo"]:
+        return normalize_repo(row["repo"])
+    return default
+
+
+def _clean_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    cleaned = {key: (value if value != "" else None) for key, value in row.items() if key}
+    cleaned["pr_number"] = int(cleaned["pr_number"])
+    return cleaned
+
+
+class MetadataStore:
+    """SQLite table of PR metadata rows keyed by (repo, pr_number)."""
+
+    def __init__(self, path: str = METADATA_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pr_metadata (
+                repo TEXT NOT NULL,
+                pr_number INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (repo, pr_number)
+            )
+            """
+        )
+        self._conn.commit()
+        self._normalize_keys()
+
+    def _normalize_keys(self) -> None:
+        """Rewrite repo keys stored before normalize_repo() existed."""
+        with self._lock:
+            for (repo,) in self._conn.execute("SELECT DISTINCT repo FROM pr_metadata").fetchall():
+                try:
+                    key = normalize_repo(repo)
+                except Exception:
+                    continue
+                if key != repo:
+                    self._conn.execute("UPDATE OR REPLACE pr_metadata SET repo = ? WHERE repo = ?", (key, repo))
+            self._conn.commit()
+
+    def _upsert(self, rows) -> int:
+        """Write (repo, pr_number, row) triples in batched transactions. Returns the number written."""
+        count = 0
+        batch = []
+        for repo, pr_number, row in rows:
+            batch.append((repo, pr_number, json.dumps(row)))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                count += self._write(batch)
+                batch = []
+        return count + self._write(batch)
+
+    def _write(self, batch) -> int:
+        if not batch:
+            return 0
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO pr_metadata (repo, pr_number, data) VALUES (?, ?, ?) "
+                "ON CONFLICT(repo, pr_number) DO UPDATE SET data = excluded.data",
+                batch,
+            )
+            self._conn.commit()
+        return len(batch)
+
+    def import_csv(self, csv_path: str, repo: str = DEFAULT_REPO) -> int:
+        """Stream a BigQuery CSV export (needs a pr_number column) into the table. Returns the row count."""
+        default = normalize_repo(repo)
+        def rows():
+            with open(csv_path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    if row.get("pr_number"):
+                        row = _clean_row(row)
+                        yield _row_repo(row, default), row["pr_number"], row
+        return self._upsert(rows())
+
+    def import_source(self, source: str, repo: str = DEFAULT_REPO) -> int:
+        """
+        Import a CSV file or every CSV in a directory, as scrape_queue does for --inputs:
+        a file named owner__repo.csv defaults to that repo. Returns the row count.
+        """
+        if os.path.isdir(source):
+            return sum(self.import_source(os.path.join(source, name), repo)
+                       for name in sorted(os.listdir(source)) if name.endswith(".csv"))
+        name = os.path.splitext(os.path.basename(source))[0]
+        if "__" in name:
+            repo = name.replace("__", "/", 1)
+        return self.import_csv(source, repo)
+
+    def import_json(self, json_path: str, repo: str = DEFAULT_REPO) -> int:
+        """One-time migration from the old pr_metadata.json list. Returns the row count."""
+        default = normalize_repo(repo)
+        with open(json_path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+        return self._upsert((_row_repo(row, default), int(row["pr_number"]), row) for row in rows if "pr_number" in row)
+
+    def get(self, repo: str, pr_number) -> Optional[Dict[str, Any]]:
+        """Metadata row for one PR, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM pr_metadata WHERE repo = ? AND pr_number = ?", (normalize_repo(repo), int(pr_number))
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pr_numbers(self, repo: str) -> Iterator[int]:
+        """PR numbers known for a repo, in ascending order, fetched in pages."""
+        repo = normalize_repo(repo)
+        last = -1
+        while True:
+            with self._lock:
+                page = self._conn.execute(
+                    "SELECT pr_number FROM pr_metadata WHERE repo = ? AND pr_number > ? ORDER BY pr_number LIMIT ?",
+                    (repo, last, IMPORT_BATCH_SIZE),
+                ).fetchall()
+            if not page:
+                return
+            for (pr_number,) in page:
+                yield pr_number
+            last = page[-1][0]
+
+    def count(self, repo: Optional[str] = None) -> int:
+        with self._lock:
+            if repo is None:
+                return self._conn.execute("SELECT COUNT(*) FROM pr_metadata").fetchone()[0]
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM pr_metadata WHERE repo = ?", (normalize_repo(repo),)
+            ).fetchone()[0]
+
+    def repos(self) -> List[str]:
+        with self._lock:
+            return [repo for (repo,) in self._conn.execute("SELECT DISTINCT repo FROM pr_metadata ORDER BY repo")]
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM pr_metadata LIMIT 1").fetchone() is None
+
+    def for_repo(self, repo: str) -> "RepoMetadata":
+        return RepoMetadata(self, repo)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RepoMetadata:
+    """
+    Read-only, dict-like view of one repo's rows keyed by str(pr_number), so callers that
+    used the old {pr_number: row} dict keep calling metadata.get(str(pr_number), {}).
+    """
+
+    def __init__(self, store: MetadataStore, repo: str):
+        self.store = store
+        self.repo = normalize_repo(repo)
+
+    def get(self, pr_number, default=None):
+        row = self.store.get(self.repo, pr_number)
+        return default if row is None else row
+
+    def __getitem__(self, pr_number):
+        row = self.store.get(self.repo, pr_number)
+        if row is None:
+            raise KeyError(pr_number)
+        return row
+
+    def __contains__(self, pr_number) -> bool:
+        return self.store.get(self.repo, pr_number) is not None
+
+
+_store: Optional[MetadataStore] = None
+_store_lock = threading.Lock()
+
+
+def get_metadata_store() -> MetadataStore:
+    """Shared MetadataStore, migrating pr_metadata.json on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MetadataStore(METADATA_DB)
+            if _store.is_empty() and os.path.exists(LEGACY_METADATA_FILE):
+                try:
+                    imported = _store.import_json(LEGACY_METADATA_FILE)
+                    print(f"[METADATA] Migrated {imported} rows from {LEGACY_METADATA_FILE}")
+                except Exception as e:
+                    print(f"[METADATA] Error migrating {LEGACY_METADATA_FILE}: {e}")
+        return _store
+
+
+def metadata_for_repo(repo: str) -> RepoMetadata:
+    """
+    Shared store's view of one repo. Warns when the repo has no rows, since every
+    analysis would then be stored with author "Unknown" and an empty title.
+    """
+    store = get_metadata_store()
+    view = store.for_repo(repo)
+    if store.count(repo) == 0:
+        known = ", ".join(store.repos()[:10]) or "none"
+        print(f"[METADATA] Warning: no metadata rows for {view.repo} (known repos: {known}). "
+              f"Import its CSV with: python metadata_store.py import <csv> --repo {view.repo}")
+    return view
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the PR metadata table.")
+    parser.add_argument("command", choices=["import", "show", "count"])
+    parser.add_argument("arg", nargs="?", help="CSV file or directory for import, PR number for show")
+    parser.add_argument("--repo", default=DEFAULT_REPO, help='Repository in the format "owner/repo"')
+    args = parser.parse_args()
+
+    store = get_metadata_store()
+    if args.command == "import":
+        count = store.import_source(args.arg, args.repo)
+        print(f"[METADATA] Imported {count} rows from {args.arg} into {args.repo}")
+    elif args.command == "show":
+        row = store.get(args.repo, args.arg)
+        print(json.dumps(row, indent=2) if row else f"PR #{args.arg} not found")
+    else:
+        print(store.count(args.repo))
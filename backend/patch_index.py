@@ -0,0 +1,298 @@
+"""
+patch_index.py
+
+Sidecar offset index for all_patches.txt.
+
+Each line of `<patches file>.idx` records one downloaded patch as
+`pr_number<TAB>offset<TAB>length<TAB>crc32`, where offset/length locate the patch
+body in the patches file and crc32 is the checksum of those bytes. The index is
+append-only and written right after each patch is appended, so existence checks
+are a dict lookup and any one patch is a single seek + read.
+
+If the patches file grows behind the index's back (another process, a crash between
+the two writes, files from before the index existed), the missing tail is scanned and
+indexed on the next lookup. If it shrinks or no longer matches, the index is rebuilt.
+
+Usage:
+    python patch_index.py [all_patches.txt] --rebuild
+    python patch_index.py [all_patches.txt] --show 1234
+"""
+
+import argparse
+import mmap
+import os
+import re
+import tempfile
+import threading
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+HEADER_RE = re.compile(rb"^===== PR #(\d+) =====\r?\n", re.MULTILINE)
+
+
+def _next_header(buf, pos: int, limit: int):
+    """Find the next header line starting in [pos, limit), using bytes.find to skip through bodies."""
+    match = HEADER_RE.match(buf, 0) if pos == 0 else None
+    while match is None:
+        at = buf.find(b"\n===== PR #", max(pos - 1, 0))
+        if at < 0 or at + 1 >= limit:
+            return None
+        match = HEADER_RE.match(buf, at + 1)
+        pos = at + 2
+    return match if match.start() < limit else None
+
+
+def scan_records(buf, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    Find complete `===== PR #n =====` ... `===== END PR #n =====` records in a bytes-like
+    buffer (typically an mmap) with one pass over the data.
+
+    Only records whose header starts in [start, end) are yielded, so a file can be split
+    at arbitrary offsets and scanned in chunks. Torn records (a header with no END marker
+    before the next header) are skipped; an unfinished final record stops the scan.
+
+    Yields:
+        (pr_number, body_start, end_marker_start, end_marker_end) byte offsets
+    """
+    size = len(buf)
+    end = size if end is None else end
+    match = _next_header(buf, start, end)
+    while match:
+        pr_number = int(match.group(1))
+        body_start = match.end()
+        marker = b"\n===== END PR #%d =====" % pr_number
+        marker_at = buf.find(marker, body_start - 1)
+        next_match = _next_header(buf, body_start, marker_at if marker_at >= 0 else size)
+        if next_match is None and marker_at >= 0:
+            yield pr_number, body_start, marker_at + 1, marker_at + len(marker)
+            match = _next_header(buf, marker_at + len(marker), end)
+        elif next_match is None:
+            # Incomplete trailing record; pick it up once it is finished
+            return
+        else:
+            # Torn record followed by complete ones; skip it
+            match = next_match if next_match.start() < end else None
+
+
+def scan_file_range(path: str, start: int, end: int) -> List[Tuple[int, int, int, int]]:
+    """scan_records over one byte range of a file. Top-level so process pools can call it."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return list(scan_records(mm, start, end))
+
+
+def _header(pr_number: int) -> bytes:
+    return f"\n\n===== PR #{pr_number} =====\n".encode("utf-8")
+
+
+def _footer(pr_number: int) -> bytes:
+    return f"\n===== END PR #{pr_number} =====\n".encode("utf-8")
+
+
+class PatchIndex:
+    """PR number -> (offset, length, crc32) index over a patches file."""
+
+    def __init__(self, patches_path: str):
+        self.patches_path = patches_path
+        self.index_path = patches_path + ".idx"
+        self.entries: Dict[int, Tuple[int, int, int]] = {}
+        # Bytes of the patches file covered by complete, indexed records
+        self._indexed_end = 0
+        # Size of the patches file when we last looked at it
+        self._seen_size = 0
+        self._lock = threading.RLock()
+        self._load()
+
+    def _data_size(self) -> int:
+        try:
+            return os.path.getsize(self.patches_path)
+        except OSError:
+            return 0
+
+    def _load(self) -> None:
+        entries = {}
+        indexed_end = 0
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split("\t")
+                    if len(parts) != 4:
+                        # Torn final line from an interrupted write
+                        continue
+                    pr_number, offset, length, crc = (int(p) for p in parts)
+                    entries[pr_number] = (offset, length, crc)
+                    indexed_end = max(indexed_end, offset + length + len(_footer(pr_number)))
+        except FileNotFoundError:
+            pass
+        except ValueError:
+            entries = None
+
+        size = self._data_size()
+        if entries is None or indexed_end > size or (entries and not self._tail_matches(entries)):
+            print(f"[INDEX] {self.index_path} does not match {self.patches_path}. Rebuilding.")
+            self.rebuild()
+            return
+        self.entries = entries
+        self._indexed_end = indexed_end
+        self._seen_size = indexed_end
+        self.refresh()
+
+    def _tail_matches(self, entries: Dict[int, Tuple[int, int, int]]) -> bool:
+        # The record ending last must still be followed by its END marker
+        pr_number, (offset, length, _) = max(entries.items(), key=lambda item: item[1][0])
+        footer = _footer(pr_number)
+        try:
+            with open(self.patches_path, "rb") as f:
+                f.seek(offset + length)
+                return f.read(len(footer)) == footer
+        except OSError:
+            return False
+
+    def _scan(self, start: int) -> List[Tuple[int, int, int, int]]:
+        """Find complete records in the patches file from byte `start` on."""
+        records = []
+        size = self._data_size()
+        if size <= start:
+            return records
+        with open(self.patches_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for pr_number, body_start, marker_at, _ in scan_records(mm, start):
+                # The newline before the END marker belongs to the marker
+                body_end = max(marker_at - 1, body_start)
+                if body_end > body_start and mm[body_end - 1:body_end] == b"\r":
+                    body_end -= 1
+                records.append((pr_number, body_start, body_end - body_start, zlib.crc32(mm[body_start:body_end])))
+        return records
+
+    def _add(self, records: List[Tuple[int, int, int, int]]) -> None:
+        for pr_number, offset, length, crc in records:
+            self.entries[pr_number] = (offset, length, crc)
+            self._indexed_end = max(self._indexed_end, offset + length + len(_footer(pr_number)))
+
+    def rebuild(self) -> int:
+        """Re-index the whole patches file and rewrite the sidecar atomically. Returns the record count."""
+        with self._lock:
+            self.entries = {}
+            self._indexed_end = 0
+            records = self._scan(0)
+            self._add(records)
+            self._seen_size = self._data_size()
+            directory = os.path.dirname(os.path.abspath(self.index_path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                for pr_number, offset, length, crc in records:
+                    f.write(f"{pr_number}\t{offset}\t{length}\t{crc}\n")
+            os.replace(tmp_path, self.index_path)
+            return len(records)
+
+    def refresh(self) -> None:
+        """Index anything appended to the patches file by someone else since we last looked."""
+        with self._lock:
+            size = self._data_size()
+            if size == self._seen_size:
+                return
+            if size < self._indexed_end:
+                print(f"[INDEX] {self.patches_path} shrank. Rebuilding index.")
+                self.rebuild()
+                return
+            records = self._scan(self._indexed_end)
+            if records:
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write("".join(f"{p}\t{o}\t{n}\t{c}\n" for p, o, n, c in records))
+                self._add(records)
+            self._seen_size = size
+
+    def __contains__(self, pr_number) -> bool:
+        self.refresh()
+        return int(pr_number) in self.entries
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self.entries)
+
+    def pr_numbers(self) -> List[int]:
+        """PR numbers in file order."""
+        self.refresh()
+        return sorted(self.entries, key=lambda pr: self.entries[pr][0])
+
+    def get(self, pr_number) -> Optional[str]:
+        """Read one patch with a single seek. Returns None if it is missing or fails its checksum."""
+        self.refresh()
+        entry = self.entries.get(int(pr_number))
+        if entry is None:
+            return None
+        offset, length, crc = entry
+        with open(self.patches_path, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        if zlib.crc32(data) != crc:
+            print(f"[INDEX] Checksum mismatch for PR #{pr_number} in {self.patches_path}.")
+            return None
+        return data.decode("utf-8", errors="ignore")
+
+    def iter_patches(self) -> Iterator[Tuple[int, str]]:
+        """Yield (pr_number, patch_text) in file order."""
+        for pr_number in self.pr_numbers():
+            patch = self.get(pr_number)
+            if patch is not None:
+                yield pr_number, patch
+
+    def append(self, pr_number, patch_text: str) -> None:
+        """Append one patch to the patches file and record it in the index."""
+        pr_number = int(pr_number)
+        body = patch_text.encode("utf-8")
+        record = _header(pr_number) + body + _footer(pr_number)
+        with self._lock, open(self.patches_path, "ab") as f:
+            if fcntl is not None:
+                # Serialize appenders across processes, so the offset below is where the record lands
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Index whatever other processes appended before we took the lock
+                self.refresh()
+                f.seek(0, os.SEEK_END)
+                start = f.tell()
+                offset = start + len(_header(pr_number))
+                f.write(record)
+                f.flush()
+                crc = zlib.crc32(body)
+                with open(self.index_path, "a", encoding="utf-8") as idx:
+                    idx.write(f"{pr_number}\t{offset}\t{len(body)}\t{crc}\n")
+                self._add([(pr_number, offset, len(body), crc)])
+                # Only what we have indexed counts as seen; later appends are picked up by refresh()
+                self._seen_size = start + len(record)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_indexes: Dict[str, PatchIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(patches_path: str) -> PatchIndex:
+    """Return the shared PatchIndex for a patches file, loading it on first use."""
+    key = os.path.abspath(patches_path)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = PatchIndex(patches_path)
+        return _indexes[key]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the offset index of a patches file.")
+    parser.add_argument("path", nargs="?", default="all_patches.txt")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index the whole file")
+    parser.add_argument("--show", type=int, help="Print one PR's patch")
+    args = parser.parse_args()
+
+    index = PatchIndex(args.path)
+    if args.rebuild:
+        print(f"[INDEX] Indexed {index.rebuild()} patches in {args.path}")
+    if args.show is not None:
+        patch = index.get(args.show)
+        print(patch if patch is not None else f"PR #{args.show} not found")
+    elif not args.rebuild:
+        print(f"[INDEX] {len(index)} patches indexed in {args.path}")
@@ -0,0 +1,389 @@
+"""
+patch_store.py
+
+Compressed, sharded store for downloaded PR patches; the replacement for all_patches.txt.
+
+Each repository gets its own directory of shard files. A shard is a sequence of
+length-prefixed records:
+
+    RECORD_HEADER  magic "PREC", pr_number, codec, raw length, stored length, crc32 of raw bytes
+    payload        the patch, compressed with zstd (if `zstandard` is installed) or zlib
+
+New records are appended to the repository's open shard. Once it passes
+PATCH_SHARD_MAX_BYTES it is sealed: an index of (pr_number, offset, codec, lengths, crc)
+is written after the last record, followed by a fixed-size footer pointing at it.
+Sealed shards are immutable and read through mmap using the footer index only.
+The open shard is indexed by walking its record headers, so readers can use it while
+the scraper is still appending. A torn trailing record is ignored until it is complete.
+
+Configure with PATCH_STORE_DIR and PATCH_SHARD_MAX_BYTES.
+
+Usage:
+    python patch_store.py import all_patches.txt --repo facebook/react
+    python patch_store.py count --repo facebook/react
+    python patch_store.py show --repo facebook/react --pr 1234
+    python patch_store.py seal --repo facebook/react
+"""
+
+import argparse
+import contextlib
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PATCH_STORE_DIR = os.getenv("PATCH_STORE_DIR", os.path.join(BASE_DIR, "patch_store"))
+PATCH_SHARD_MAX_BYTES = int(os.getenv("PATCH_SHARD_MAX_BYTES", str(256 * 1024 * 1024)))
+
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+RECORD_MAGIC = b"PREC"
+RECORD_HEADER = struct.Struct("<4sIBIII")
+INDEX_ENTRY = struct.Struct("<IQBIII")
+FOOTER_MAGIC = b"PIDX"
+FOOTER = struct.Struct("<QI4s")
+
+SHARD_NAME_RE = re.compile(r"^shard-(\d{5})\.pst$")
+
+# (shard path, payload offset, codec, raw length, stored length, crc32)
+Location = Tuple[str, int, int, int, int, int]
+
+
+def _compress(data: bytes) -> Tuple[int, bytes]:
+    if zstandard is not None:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=10).compress(data)
+    return CODEC_ZLIB, zlib.compress(data, 6)
+
+
+def _decompress(codec: int, payload: bytes) -> bytes:
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise Exception("Patch was stored with zstd, but the 'zstandard' package is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    raise Exception(f"Unknown patch codec {codec}")
+
+
+def _read_footer(mm) -> Optional[Tuple[int, int]]:
+    """Return (index offset, entry count) if the shard is sealed, else None."""
+    if len(mm) < FOOTER.size:
+        return None
+    index_offset, count, magic = FOOTER.unpack_from(mm, len(mm) - FOOTER.size)
+    if magic != FOOTER_MAGIC or index_offset + count * INDEX_ENTRY.size != len(mm) - FOOTER.size:
+        return None
+    return index_offset, count
+
+
+def _walk_records(mm, start: int = 0) -> Tuple[List[Tuple[int, int, int, int, int, int]], int]:
+    """Walk record headers from `start`. Returns (entries, offset after the last complete record)."""
+    entries = []
+    pos = start
+    end = len(mm)
+    while pos + RECORD_HEADER.size <= end:
+        magic, pr_number, codec, raw_len, stored_len, crc = RECORD_HEADER.unpack_from(mm, pos)
+        if magic != RECORD_MAGIC:
+            break
+        payload_at = pos + RECORD_HEADER.size
+        if payload_at + stored_len > end:
+            break
+        entries.append((pr_number, payload_at, codec, raw_len, stored_len, crc))
+        pos = payload_at + stored_len
+    return entries, pos
+
+
+class _RepoShards:
+    """Per-repository view of shard files and their merged index."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index: Dict[int, Location] = {}
+        # File sizes at last scan; sealed shards never change
+        self.scanned: Dict[str, int] = {}
+        # Offset after the last complete record of each open shard
+        self.walked: Dict[str, int] = {}
+        self.sealed: Dict[str, bool] = {}
+
+    def shard_paths(self) -> List[str]:
+        try:
+            names = sorted(n for n in os.listdir(self.directory) if SHARD_NAME_RE.match(n))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, n) for n in names]
+
+    def refresh(self) -> None:
+        for path in self.shard_paths():
+            size = os.path.getsize(path)
+            if self.sealed.get(path) or self.scanned.get(path) == size or size == 0:
+                continue
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                footer = _read_footer(mm)
+                if footer is not None:
+                    index_offset, count = footer
+                    for i in range(count):
+                        pr_number, offset, codec, raw_len, stored_len, crc = INDEX_ENTRY.unpack_from(
+                            mm, index_offset + i * INDEX_ENTRY.size)
+                        self.index[pr_number] = (path, offset, codec, raw_len, stored_len, crc)
+                    self.sealed[path] = True
+                else:
+                    entries, walked_to = _walk_records(mm, self.walked.get(path, 0))
+                    for pr_number, offset, codec, raw_len, stored_len, crc in entries:
+                        self.index[pr_number] = (path, offset, codec, raw_len, stored_len, crc)
+                    self.walked[path] = walked_to
+            self.scanned[path] = size
+
+
+class PatchStore:
+    """Per-repo shards of compressed patch records with mmap random access."""
+
+    def __init__(self, root: str = PATCH_STORE_DIR, shard_max_bytes: int = PATCH_SHARD_MAX_BYTES):
+        self.root = root
+        self.shard_max_bytes = shard_max_bytes
+        self._repos: Dict[str, _RepoShards] = {}
+        self._maps: Dict[str, Tuple[int, mmap.mmap]] = {}
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+
+    def _repo_dir(self, repo: str) -> str:
+        return os.path.join(self.root, repo.strip("/").replace("/", "__"))
+
+    def _shards(self, repo: str) -> _RepoShards:
+        with self._lock:
+            shards = self._repos.get(repo)
+            if shards is None:
+                shards = self._repos[repo] = _RepoShards(self._repo_dir(repo))
+            shards.refresh()
+            return shards
+
+    def _map(self, path: str) -> mmap.mmap:
+        size = os.path.getsize(path)
+        cached = self._maps.get(path)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+        if cached is not None:
+            cached[1].close()
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps[path] = (size, mm)
+        return mm
+
+    def repos(self) -> List[str]:
+        """Repositories with at least one shard, as "owner/repo"."""
+        return sorted(name.replace("__", "/", 1) for name in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, name)))
+
+    def has_patch(self, repo: str, pr_number) -> bool:
+        return int(pr_number) in self._shards(repo).index
+
+    def pr_numbers(self, repo: str) -> List[int]:
+        """PR numbers in storage order."""
+        index = self._shards(repo).index
+        return sorted(index, key=lambda pr: (index[pr][0], index[pr][1]))
+
+    def _read(self, repo: str, pr_number: int, location: Location) -> Optional[str]:
+        path, offset, codec, raw_len, stored_len, crc = location
+        with self._lock:
+            payload = self._map(path)[offset:offset + stored_len]
+        data = _decompress(codec, payload)
+        if len(data) != raw_len or zlib.crc32(data) != crc:
+            print(f"[PATCHES] Checksum mismatch for {repo}#{pr_number}. Ignoring stored copy.")
+            return None
+        return data.decode("utf-8", errors="ignore")
+
+    def get_patch(self, repo: str, pr_number) -> Optional[str]:
+        """Return one patch, or None if it is not stored or fails its checksum."""
+        location = self._shards(repo).index.get(int(pr_number))
+        return self._read(repo, int(pr_number), location) if location is not None else None
+
+    def iter_patches(self, repo: str) -> Iterator[Tuple[int, str]]:
+        """Yield (pr_number, patch_text) for every stored patch of a repo, in storage order."""
+        index = dict(self._shards(repo).index)
+        for pr_number in sorted(index, key=lambda pr: (index[pr][0], index[pr][1])):
+            patch = self._read(repo, pr_number, index[pr_number])
+            if patch is not None:
+                yield pr_number, patch
+
+    def put_patch(self, repo: str, pr_number, patch_text: str) -> None:
+        """Compress and append one patch to the repo's open shard, sealing it once it is full."""
+        self.put_patches(repo, [(pr_number, patch_text)])
+
+    @contextlib.contextmanager
+    def _write_lock(self, repo: str):
+        """Hold the in-process lock and the repo's cross-process `.lock` for a shard mutation."""
+        directory = self._repo_dir(repo)
+        os.makedirs(directory, exist_ok=True)
+        with self._lock, open(os.path.join(directory, ".lock"), "a") as lock_file:
+            if fcntl is not None:
+                # Serialize appenders and sealers across processes on the same host
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def put_patches(self, repo: str, patches) -> int:
+        """Append many (pr_number, patch_text) pairs under one lock. Returns the number written."""
+        written = 0
+        with self._write_lock(repo):
+            shards = self._shards(repo)
+            path = self._open_shard(shards)
+            f = open(path, "ab")
+            try:
+                for pr_number, patch_text in patches:
+                    raw = patch_text.encode("utf-8")
+                    codec, payload = _compress(raw)
+                    f.write(RECORD_HEADER.pack(RECORD_MAGIC, int(pr_number), codec, len(raw), len(payload),
+                                               zlib.crc32(raw)) + payload)
+                    written += 1
+                    if f.tell() >= self.shard_max_bytes:
+                        f.close()
+                        self._seal_path(path)
+                        shards.refresh()
+                        path = self._open_shard(shards)
+                        f = open(path, "ab")
+            finally:
+                f.close()
+            shards.refresh()
+        return written
+
+    def _open_shard(self, shards: _RepoShards) -> str:
+        paths = shards.shard_paths()
+        if paths and not shards.sealed.get(paths[-1]):
+            return paths[-1]
+        number = int(SHARD_NAME_RE.match(os.path.basename(paths[-1])).group(1)) + 1 if paths else 0
+        path = os.path.join(shards.directory, f"shard-{number:05d}.pst")
+        open(path, "ab").close()
+        return path
+
+    def _seal_path(self, path: str) -> None:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if _read_footer(mm) is not None:
+                return
+            entries, walked_to = _walk_records(mm)
+        # Readers may still hold a map of the open shard
+        cached = self._maps.pop(path, None)
+        if cached is not None:
+            cached[1].close()
+        with open(path, "r+b") as f:
+            # Drop any torn trailing record before writing the index
+            f.truncate(walked_to)
+            f.seek(walked_to)
+            f.write(b"".join(INDEX_ENTRY.pack(pr, offset, codec, raw_len, stored_len, crc)
+                             for pr, offset, codec, raw_len, stored_len, crc in entries))
+            f.write(FOOTER.pack(walked_to, len(entries), FOOTER_MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def seal(self, repo: str) -> None:
+        """Seal the repo's open shard so it can be read from its footer index alone."""
+        with self._write_lock(repo):
+            shards = self._shards(repo)
+            paths = shards.shard_paths()
+            if paths and not shards.sealed.get(paths[-1]) and os.path.getsize(paths[-1]) > 0:
+                self._seal_path(paths[-1])
+                shards.refresh()
+
+    def stats(self, repo: str) -> Dict[str, int]:
+        shards = self._shards(repo)
+        paths = shards.shard_paths()
+        return {
+            "patches": len(shards.index),
+            "shards": len(paths),
+            "raw_bytes": sum(loc[3] for loc in shards.index.values()),
+            "stored_bytes": sum(loc[4] for loc in shards.index.values()),
+            "disk_bytes": sum(os.path.getsize(p) for p in paths),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            for _, mm in self._maps.values():
+                mm.close()
+            self._maps.clear()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_patch_store() -> PatchStore:
+    """Return the process-wide patch store."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PatchStore(PATCH_STORE_DIR)
+    return _store
+
+
+def get_patch(repo: str, pr_number) -> Optional[str]:
+    return get_patch_store().get_patch(repo, pr_number)
+
+
+def iter_patches(repo: str) -> Iterator[Tuple[int, str]]:
+    return get_patch_store().iter_patches(repo)
+
+
+def import_patches_file(patches_path: str, repo: str, store: Optional[PatchStore] = None,
+                        batch_size: int = 500) -> int:
+    """
+    Copy every patch from an all_patches.txt file into the patch store.
+    PRs that are already stored are skipped, so the import can be re-run.
+
+    Returns:
+        Number of patches imported
+    """
+    from patch_index import PatchIndex
+
+    store = store or get_patch_store()
+    batch, imported = [], 0
+    for pr_number, patch in PatchIndex(patches_path).iter_patches():
+        if store.has_patch(repo, pr_number):
+            continue
+        batch.append((pr_number, patch))
+        if len(batch) >= batch_size:
+            imported += store.put_patches(repo, batch)
+            batch = []
+    if batch:
+        imported += store.put_patches(repo, batch)
+    return imported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the sharded patch store.")
+    parser.add_argument("command", choices=["import", "count", "show", "seal", "stats"])
+    parser.add_argument("path", nargs="?", default="all_patches.txt", help="all_patches.txt to import")
+    parser.add_argument("--repo", required=True, help='Repository in the format "owner/repo"')
+    parser.add_argument("--pr", type=int, help="PR number for show")
+    args = parser.parse_args()
+
+    store = get_patch_store()
+    if args.command == "import":
+        count = import_patches_file(args.path, args.repo, store)
+        print(f"[PATCHES] Imported {count} patches from {args.path} into {args.repo}")
+        print(f"[PATCHES] {store.stats(args.repo)}")
+    elif args.command == "count":
+        print(len(store.pr_numbers(args.repo)))
+    elif args.command == "show":
+        patch = store.get_patch(args.repo, args.pr)
+        print(patch if patch is not None else f"PR #{args.pr} not found")
+    elif args.command == "seal":
+        store.seal(args.repo)
+        print(f"[PATCHES] {store.stats(args.repo)}")
+    else:
+        print(store.stats(args.repo))
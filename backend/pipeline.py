@@ -0,0 +1,189 @@
+"""
+pipeline.py
+
+Streaming scrape-to-analysis pipeline.
+
+Instead of downloading every patch before local_pr_analysis reads all_patches.txt back,
+each patch goes onto a bounded queue as soon as it is downloaded, and a pool of
+analysis workers calls analyze_and_store_local_pr on it right away. Network and LLM
+time overlap, and the first analyses land seconds after the run starts.
+
+The queue is the backpressure point. When the LLM stage falls behind and the queue
+fills up, the downloader blocks on put() until a worker frees a slot. It therefore
+never runs more than --queue-size patches ahead of the analysis.
+
+Usage:
+    python pipeline.py --input target_prs.csv --repo facebook/react --workers 4
+    python pipeline.py --input target_prs.csv --concurrency 2 --workers 8 --queue-size 16
+"""
+
+import argparse
+import asyncio
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import scraper
+from local_pr_analysis import analyze_and_store_local_pr, is_pr_in_db
+from metadata_store import metadata_for_repo
+
+_DONE = object()
+
+
+class PipelineStats:
+    """Counters and timings shared by the download and analysis stages."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.first_result_at: Optional[float] = None
+        self.downloaded = 0
+        self.download_failed = 0
+        self.analyzed = 0
+        self.skipped = 0
+        self.analysis_failed = 0
+        # Time the downloader spent blocked on a full queue
+        self.backpressure_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, field: str, amount: float = 1) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def mark_result(self) -> None:
+        with self._lock:
+            if self.first_result_at is None:
+                self.first_result_at = time.monotonic()
+                print(f"[PIPELINE] First analysis stored after {self.first_result_at - self.started:.1f}s")
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {
+            "elapsed_seconds": round(elapsed, 1),
+            "first_result_seconds": round(self.first_result_at - self.started, 1) if self.first_result_at else None,
+            "downloaded": self.downloaded,
+            "download_failed": self.download_failed,
+            "analyzed": self.analyzed,
+            "skipped": self.skipped,
+            "analysis_failed": self.analysis_failed,
+            "backpressure_seconds": round(self.backpressure_seconds, 1),
+        }
+
+
+def _analysis_worker(work: "queue.Queue", repo: str, metadata: Dict[str, Dict[str, Any]], stats: PipelineStats) -> None:
+    while True:
+        item = work.get()
+        try:
+            if item is _DONE:
+                return
+            pr_number, patch = item
+            if is_pr_in_db(int(pr_number), repo):
+                stats.add("skipped")
+                continue
+            # Errors are reported by analyze_and_store_local_pr itself
+            if analyze_and_store_local_pr(repo, pr_number, metadata.get(str(pr_number), {}), patch):
+                stats.add("analyzed")
+                stats.mark_result()
+            else:
+                stats.add("analysis_failed")
+        finally:
+            work.task_done()
+
+
+def _enqueue(work: "queue.Queue", repo: str, pr_number: int, stats: PipelineStats) -> None:
+    """Hand one downloaded patch to the analysis stage, blocking while the queue is full."""
+    patch = scraper.read_patch(pr_number, repo)
+    if patch is None:
+        stats.add("download_failed")
+        return
+    stats.add("downloaded")
+    start = time.monotonic()
+    work.put((pr_number, patch))
+    stats.add("backpressure_seconds", time.monotonic() - start)
+
+
+def run_pipeline(repo: str, pr_numbers: List[int], token_manager, metadata: Optional[Dict[str, Dict[str, Any]]] = None,
+                 workers: int = 4, queue_size: int = 8, concurrency: int = 0,
+                 controller=None) -> Dict[str, Any]:
+    """
+    Download patches for repo and analyze each one as soon as it arrives.
+
+    Args:
+        repo: Repository in the format "owner/repo"
+        pr_numbers: PRs to download and analyze
+        token_manager: scraper.TokenManager used for downloads
+        metadata: PR metadata (title, author) keyed by str(pr_number), e.g. MetadataStore.for_repo(repo)
+        workers: Number of analysis workers
+        queue_size: Downloaded patches allowed to wait for analysis
+        concurrency: In-flight downloads per token (0 = sequential downloader)
+        controller: Optional scraper.AIMDController for adaptive pacing
+
+    Returns:
+        Pipeline stats summary
+    """
+    metadata = metadata or {}
+    stats = PipelineStats()
+    work: "queue.Queue" = queue.Queue(maxsize=queue_size)
+    threads = [threading.Thread(target=_analysis_worker, args=(work, repo, metadata, stats), daemon=True)
+               for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        if concurrency > 0:
+            async def on_result(job_repo, pr_number, success, message):
+                if not success:
+                    stats.add("download_failed")
+                    return
+                # Block only this download worker while the analysis queue is full
+                await asyncio.to_thread(_enqueue, work, job_repo, pr_number, stats)
+
+            jobs = [(repo, pr_number) for pr_number in pr_numbers]
+            asyncio.run(scraper.download_all_async(jobs, token_manager, concurrency, controller, on_result))
+        else:
+            for pr_number in pr_numbers:
+                success, message = scraper.download_patch(pr_number, token_manager, controller, repo)
+                if success:
+                    _enqueue(work, repo, pr_number, stats)
+                else:
+                    stats.add("download_failed")
+                    print(f"[PIPELINE] PR #{pr_number}: {message}")
+    finally:
+        for _ in threads:
+            work.put(_DONE)
+        for thread in threads:
+            thread.join()
+
+    summary = stats.summary()
+    print(f"[PIPELINE] {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download PR patches and analyze them as they arrive.")
+    parser.add_argument("--input", required=True, help="CSV file with PR numbers (and title/author metadata)")
+    parser.add_argument("--repo", default=scraper.PATCH_REPO, help='Repository in the format "owner/repo"')
+    parser.add_argument("--workers", type=int, default=4, help="Analysis workers (default: 4)")
+    parser.add_argument("--queue-size", type=int, default=8,
+                        help="Downloaded patches allowed to wait for analysis before downloads pause (default: 8)")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="In-flight downloads per token (default: 0, sequential)")
+    parser.add_argument("--pacing", choices=["adaptive", "fixed"], default="adaptive")
+    parser.add_argument("--tokens", nargs="+", help="List of GitHub tokens to use")
+    parser.add_argument("--tokens-file", help="File containing GitHub tokens (one per line)")
+    parser.add_argument("--patch-store", action="store_true",
+                        help="Write patches to the sharded patch store instead of all_patches.txt")
+    parser.add_argument("--limit", type=int, default=None, help="Limit number of PRs to process")
+    args = parser.parse_args()
+
+    if args.patch_store:
+        scraper.USE_PATCH_STORE = True
+    pr_numbers = scraper.load_pr_numbers(args.input, args.repo)
+    if args.limit:
+        pr_numbers = pr_numbers[:args.limit]
+    metadata = metadata_for_repo(args.repo)
+    token_manager = scraper.TokenManager(scraper.collect_tokens(args.tokens, args.tokens_file))
+    controller = scraper.AIMDController() if args.pacing == "adaptive" else None
+
+    run_pipeline(args.repo, pr_numbers, token_manager, metadata, workers=args.workers,
+                 queue_size=args.queue_size, concurrency=args.concurrency, controller=controller)
@@ -6,15 +6,23 @@ Script for extracting and synthesizing pull request analysis from a GitHub repos
 
 from dataclasses import dataclass
 from pydantic import BaseModel
-from typing import Any, Dict, List
-import requests
-import os
+from typing import Any, Dict, List, Optional
 import json
-from github_client import fetch_comprehensive_pr_metadata, list_merged_prs
-from db import Repository, PullRequest, SessionLocal
+from github_client import (
+    fetch_comprehensive_pr_metadata,
+    fetch_pr_metadata_batch_graphql,
+    iter_merged_prs,
+    response_cache,
+    search_merged_prs,
+)
+from db import Repository, PullRequest, SessionLocal, processed_prs
 from datetime import datetime, timedelta, timezone
 import argparse
 from db import init_db
+from diff_condenser import DIFF_BUDGET_CHARS, condense_diff
+from diff_filter import filter_diff, filtered_analysis
+import llm_client
+from diff_stats import merge_direct_metadata
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
@@ -35,7 +43,6 @@ pr_prompts = Prompts(
     2. Where was it changed? Mention relevant modules, files, or layers.
     3. Why was it changed? (If possible, infer the reason from description or code.)
     4. How was it changed? Note the approach taken and any patterns in implementation.
-    5. How many lines of code were added or removed and what was the language?
 
     Focus on what functionality was introduced, modified, or removed. You don't need to restate every line of code. Summarize the intent and focus of the change.
 
@@ -293,12 +300,6 @@ pr_prompts = Prompts(
             "tag_reason": "<short justification>",
             "skills": Skill[]
         }
-        metadata: {
-            "code_changes": {
-                "lines_of_code": number;
-                "language": string;
-            }[]
-        }
     }
     type Skill = {
         name: string; // one skill at a time, be specific (skill name cannot be the same as the category name)
@@ -360,13 +361,11 @@ class PRAnalysis(BaseModel):
     title: str
     analysis: Dict[Any, Any]
 
-LLAMA_API_URL = "https://api.llama.com/v1/chat/completions"
-LLAMA_MODEL = "Llama-4-Maverick-17B-128E-Instruct-FP8"
-LLAMA_API_KEY = os.getenv("LLAMA_API_KEY")
 
-def analyze_pr(owner: str, repo: str, pr_number: int) -> PRAnalysis:
+def analyze_pr(owner: str, repo: str, pr_number: int, pr_metadata: Optional[Dict[str, Any]] = None) -> PRAnalysis:
     """
     Analyze a pull request: fetch repo context, PR metadata, check merge, fetch conversation, run AI analysis, and store result.
+    Pass pr_metadata to reuse metadata already fetched in bulk (e.g. via GraphQL) instead of fetching it here.
     """
     # Fetch repository context (assume from db for now)
     db = SessionLocal()
@@ -375,7 +374,8 @@ def analyze_pr(owner: str, repo: str, pr_number: int) -> PRAnalysis:
     repo_context = repo_obj.details if repo_obj else None
 
     # Fetch PR metadata
-    pr_metadata = fetch_comprehensive_pr_metadata(owner, repo, pr_number)
+    if pr_metadata is None:
+        pr_metadata = fetch_comprehensive_pr_metadata(owner, repo, pr_number)
 
     # Check if PR is merged
     if not pr_metadata.get("merged_at"):
@@ -387,42 +387,45 @@ def analyze_pr(owner: str, repo: str, pr_number: int) -> PRAnalysis:
     metadata_to_store = dict(pr_metadata)
     metadata_to_store.pop("diff_data", None)
     metadata_to_store.pop("review_messages", None)
+    # Per-language line counts come from the diff itself, not the LLM
+    diff_data = pr_metadata.get("diff_data", "")
+    metadata_to_store = merge_direct_metadata(metadata_to_store, diff_data)
+    filtered = filter_diff(diff_data)
+    metadata_to_store.update(filtered.metadata())
+    if filtered.all_filtered:
+        # Nothing hand-written to analyze; don't spend an LLM call on it
+        db.close()
+        print(f"[INFO] PR #{pr_number} only changes {', '.join(sorted(filtered.dropped))} files. Skipping LLM.")
+        return PRAnalysis(
+            repo_url=repo_url,
+            pr_number=pr_number,
+            developer=pr_metadata.get("author", "Unknown"),
+            title=pr_metadata.get("title", ""),
+            analysis={
+                "ai_analysis": filtered_analysis(filtered),
+                "direct_metadata": metadata_to_store
+            }
+        )
 
     # Prepare prompt for Llama (combine repo context, PR metadata, diff, review messages)
     llama_prompt = pr_prompts.synthesis_guidelines + "\n" + pr_prompts.final_type_definition
     context_str = f"Repository Context:\n{json.dumps(repo_context, indent=2)}\n" if repo_context else ""
     pr_info_str = f"PR Title: {pr_metadata.get('title', '')}\nAuthor: {pr_metadata.get('author', '')}\n"
-    diff_str = f"Diff:\n{pr_metadata.get('diff_data', '')[:5000]}\n"  # Truncate if too large
+    stubs = filtered.prompt_stubs()
+    diff_str = f"Diff:\n{condense_diff(filtered.text, DIFF_BUDGET_CHARS - len(stubs))}{stubs}\n"
     reviews_str = f"Review Comments:\n{json.dumps(pr_metadata.get('review_messages', []), indent=2)[:3000]}\n"
     full_prompt = llama_prompt + context_str + pr_info_str + diff_str + reviews_str
 
     # Call Llama API
-    if not LLAMA_API_KEY:
-        raise Exception("LLAMA_API_KEY environment variable not set.")
-    payload = {
-        "model": LLAMA_MODEL,
-        "messages": [
-            {"role": "user", "content": full_prompt}
-        ],
-        "max_completion_tokens": 2048,
-        "temperature": 0.7
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {LLAMA_API_KEY}"
-    }
-    response = requests.post(LLAMA_API_URL, json=payload, headers=headers, timeout=90)
-    if response.status_code != 200:
-        db.close()
-        raise Exception(f"Llama API error: {response.status_code} {response.text}")
-    result = response.json()
-    # Extract the AI's reply from the response
     try:
-        ai_message = result["completion_message"]["content"]["text"]
-        analysis_result_dict = json.loads(ai_message)
+        analysis_result_dict = llm_client.complete(full_prompt, max_completion_tokens=2048, timeout=90,
+                                                   label="pr_profiler", parse=llm_client.parse_json_response)
+    except llm_client.ResponseParseError as e:
+        db.close()
+        raise Exception(f"Llama response was not valid JSON: {e.text}")
     except Exception:
         db.close()
-        raise Exception(f"Llama response was not valid JSON: {result}")
+        raise
 
     db.close()
     return PRAnalysis(
@@ -481,16 +484,14 @@ def parse_time_period(period: str) -> datetime:
     else:
         raise ValueError(f"Unknown time unit: {unit}")
 
-def analyze_and_store_pr(owner, repo, pr_number):
-    from db import SessionLocal, PullRequest
+def analyze_and_store_pr(owner, repo, pr_number, pr_metadata=None):
     session = SessionLocal()
     repo_url = f"{owner}/{repo}"
     try:
-        pr_row = session.query(PullRequest).filter_by(repo_url=repo_url, pr_number=pr_number).first()
-        if pr_row:
+        if processed_prs.contains(repo_url, pr_number):
             print(f"[INFO] PR #{pr_number} already analyzed. Skipping.")
             return
-        result = analyze_pr(owner, repo, pr_number)
+        result = analyze_pr(owner, repo, pr_number, pr_metadata=pr_metadata)
         db_obj = pydantic_to_db_pr(result)
         session.add(db_obj)
         session.commit()
@@ -508,7 +509,12 @@ if __name__ == "__main__":
     parser.add_argument("--period", type=str, default="30d", help='Time period to look back (e.g., "30d", "6m", "1y")')
     parser.add_argument("--parallel", type=int, default=2, help="Number of PRs to analyze in parallel (default: 2)")
     parser.add_argument("--limit", type=int, default=10, help="Limit the number of PRs to analyze (default: 10)")
+    parser.add_argument("--graphql", action="store_true", help="Prefetch PR metadata in batched GraphQL queries")
+    parser.add_argument("--search", action="store_true", help="List PRs via the search API in parallel date windows")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Bypass the on-disk LLM response cache")
     args = parser.parse_args()
+    if args.no_llm_cache:
+        llm_client.LLM_CACHE_ENABLED = False
 
     owner, repo = args.repo.split("/")
     period = args.period
@@ -519,40 +525,50 @@ if __name__ == "__main__":
     init_db()
 
     since_date = parse_time_period(period)
-    db = SessionLocal()
     try:
-        merged_prs = list_merged_prs(owner, repo, limit=args.limit) or []
-        print(f"[INFO] Found {len(merged_prs)} merged PRs in repo {owner}/{repo}")
-
-        pr_numbers_to_analyze = []
-        for pr in merged_prs:
-            merged_at_str = pr.get("merged_at")
-            if not merged_at_str:
-                continue
-            merged_at = datetime.strptime(merged_at_str, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
-            if merged_at < since_date:
-                continue
-            if author and pr.get("user", {}).get("login") != author:
-                continue
-            pr_number = pr.get("number")
-            pr_row = db.query(PullRequest).filter_by(repo_url=f"{owner}/{repo}", pr_number=pr_number).first()
-            if not pr_row:
-                pr_numbers_to_analyze.append(pr_number)
-            else:
-                print(f"[INFO] PR #{pr_number} already analyzed. Skipping.")
-
-        print(f"[INFO] {len(pr_numbers_to_analyze)} PRs to analyze in parallel.")
-
-        pr_numbers_to_analyze = pr_numbers_to_analyze[:args.limit]
+        # Listing is a generator bounded by --period, so analysis starts while later pages load
+        if args.search:
+            merged_prs = search_merged_prs(owner, repo, since=since_date)
+        else:
+            merged_prs = iter_merged_prs(owner, repo, since=since_date)
+
+        def prs_to_analyze():
+            selected = 0
+            for pr in merged_prs:
+                if author and pr.get("user", {}).get("login") != author:
+                    continue
+                pr_number = pr.get("number")
+                if processed_prs.contains(f"{owner}/{repo}", pr_number):
+                    print(f"[INFO] PR #{pr_number} already analyzed. Skipping.")
+                    continue
+                yield pr_number
+                selected += 1
+                if selected >= args.limit:
+                    return
 
         # Parallel analysis
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [
-                executor.submit(analyze_and_store_pr, owner, repo, pr_number)
-                for pr_number in pr_numbers_to_analyze
-            ]
+            if args.graphql:
+                pr_numbers_to_analyze = list(prs_to_analyze())
+                print(f"[INFO] {len(pr_numbers_to_analyze)} PRs to analyze in parallel.")
+                prefetched = fetch_pr_metadata_batch_graphql(owner, repo, pr_numbers_to_analyze) if pr_numbers_to_analyze else {}
+                futures = [
+                    executor.submit(analyze_and_store_pr, owner, repo, pr_number, prefetched.get(pr_number))
+                    for pr_number in pr_numbers_to_analyze
+                ]
+            else:
+                futures = [
+                    executor.submit(analyze_and_store_pr, owner, repo, pr_number)
+                    for pr_number in prs_to_analyze()
+                ]
+                print(f"[INFO] {len(futures)} PRs queued for analysis.")
             for future in as_completed(futures):
                 future.result()
 
     finally:
-        db.close() 
\ No newline at end of file
+        if response_cache is not None:
+            print(f"[CACHE] GitHub response cache: {response_cache.stats()}")
+        for label, stats in llm_client.get_stats().items():
+            print(f"[LLM] {label}: {stats}")
+        if llm_client.LLM_CACHE_ENABLED:
+            print(f"[CACHE] LLM response cache: {llm_client.cache_stats()}") 
\ No newline at end of file
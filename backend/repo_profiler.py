@@ -6,16 +6,15 @@ Script for extracting and synthesizing repository profile information from a Git
 
 from dataclasses import dataclass
 import argparse
-import requests
 import sys
-import os
-from github_client import GITHUB_TOKEN
+from github_client import API_BASE_URL, github_get
 from pydantic import BaseModel
 from enum import Enum
 from typing import Any, Dict
 import json
 import re
 from db import Repository, SessionLocal, get_db, init_db
+import llm_client
 
 @dataclass
 class Prompts:
@@ -68,10 +67,6 @@ readme_prompts = Prompts(
     """
 )
 
-LLAMA_API_URL = "https://api.llama.com/v1/chat/completions"
-LLAMA_MODEL = "Llama-4-Maverick-17B-128E-Instruct-FP8"
-LLAMA_API_KEY = os.getenv("LLAMA_API_KEY")
-
 class Provider(str, Enum):
     llama = "llama"
     # Add other providers as needed
@@ -91,40 +86,16 @@ def fetch_readme(owner: str, repo: str) -> str:
     Returns the README content as a string.
     Raises an exception if not found.
     """
-    url = f"https://api.github.com/repos/{owner}/{repo}/readme"
+    url = f"{API_BASE_URL}/repos/{owner}/{repo}/readme"
     headers = {"Accept": "application/vnd.github.v3.raw"}
-    if GITHUB_TOKEN:
-        headers["Authorization"] = f"token {GITHUB_TOKEN}"
-    response = requests.get(url, headers=headers)
+    response = github_get(url, headers=headers)
     if response.status_code != 200:
         raise Exception(f"Failed to fetch README: {response.status_code} {response.text}")
     return response.text
 
 def analyze_readme_with_llama(readme_content: str, prompt: str) -> str:
-    if not LLAMA_API_KEY:
-        raise Exception("LLAMA_API_KEY environment variable not set.")
-    payload = {
-        "model": LLAMA_MODEL,
-        "messages": [
-            {"role": "user", "content": prompt + "\n" + readme_content}
-        ],
-        "max_completion_tokens": 1024,
-        "temperature": 0.7
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {LLAMA_API_KEY}"
-    }
-    response = requests.post(LLAMA_API_URL, json=payload, headers=headers, timeout=60)
-    if response.status_code != 200:
-        raise Exception(f"Llama API error: {response.status_code} {response.text}")
-    result = response.json()
-    # Extract the AI's reply from the response
-    try:
-        ai_message = result["completion_message"]["content"]["text"]
-    except Exception:
-        ai_message = result.get("response", str(result))
-    return ai_message
+    return llm_client.complete(prompt + "\n" + readme_content, max_completion_tokens=1024, timeout=60,
+                               label="repo_profiler")
 
 def extract_owner_repo_from_url(repository_url: str):
     """
@@ -0,0 +1,163 @@
+"""
+scrape_queue.py
+
+Persistent, multi-repository job queue for the patch scraper.
+
+Jobs are (owner, repo, pr_number) rows in a WAL-mode SQLite table, fed from one or
+more CSV files or directories of CSVs. A CSV needs a `pr_number` column plus either a
+`repo` column ("owner/repo") or `owner` and `repo` columns. Without those, the repo
+comes from the filename (`owner__repo.csv`), or else from the caller's default.
+
+Pending jobs are handed out round-robin across repositories, so one long-running
+scraper spreads its tokens over the whole portfolio instead of draining one repo at
+a time. Each job's outcome is recorded as it finishes; jobs left `in_progress` by a
+killed process go back to `pending` on the next start, so resuming is just running
+the same command again.
+"""
+
+import csv
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+# Attempts before a failing job is no longer handed out
+MAX_ATTEMPTS = 3
+
+
+def _repo_from_filename(path: str) -> Optional[str]:
+    name = os.path.splitext(os.path.basename(path))[0]
+    if "__" in name:
+        owner, repo = name.split("__", 1)
+        return f"{owner}/{repo}"
+    return None
+
+
+class ScrapeQueue:
+    """SQLite-backed queue of (owner, repo, pr_number) scrape jobs."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                owner TEXT NOT NULL,
+                repo TEXT NOT NULL,
+                pr_number INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                message TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (owner, repo, pr_number)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, owner, repo)")
+        self._conn.commit()
+
+    def add_jobs(self, jobs: Iterable[Tuple[str, str, int]]) -> int:
+        """Enqueue (owner, repo, pr_number) jobs; known jobs are left as they are. Returns the number added."""
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (owner, repo, pr_number, updated_at) VALUES (?, ?, ?, ?)",
+                ((owner, repo, int(pr), datetime.now(timezone.utc).isoformat()) for owner, repo, pr in jobs),
+            )
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def load_csv(self, path: str, default_repo: Optional[str] = None) -> int:
+        """Enqueue every PR listed in a CSV file. Returns the number of new jobs."""
+        default_repo = _repo_from_filename(path) or default_repo
+        jobs = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                if not row.get("pr_number"):
+                    continue
+                if row.get("owner") and row.get("repo"):
+                    owner, repo = row["owner"], row["repo"]
+                elif row.get("repo") and "/" in row["repo"]:
+                    owner, repo = row["repo"].split("/", 1)
+                elif default_repo:
+                    owner, repo = default_repo.split("/", 1)
+                else:
+                    raise Exception(f"{path} has no repo column and no default repo was given")
+                jobs.append((owner, repo, int(row["pr_number"])))
+        return self.add_jobs(jobs)
+
+    def load_source(self, source: str, default_repo: Optional[str] = None) -> int:
+        """Enqueue jobs from a CSV file or from every CSV in a directory."""
+        if os.path.isdir(source):
+            return sum(self.load_csv(os.path.join(source, name), default_repo)
+                       for name in sorted(os.listdir(source)) if name.endswith(".csv"))
+        return self.load_csv(source, default_repo)
+
+    def requeue_in_progress(self) -> int:
+        """Return jobs claimed by a process that never finished them to the pending pool."""
+        with self._lock:
+            cursor = self._conn.execute("UPDATE jobs SET status = ? WHERE status = ?", (PENDING, IN_PROGRESS))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def claim_pending(self, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Claim pending jobs, interleaved across repositories (one PR from each repo in turn).
+
+        Returns:
+            List of ("owner/repo", pr_number) in fair order
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT owner, repo, pr_number FROM (
+                    SELECT owner, repo, pr_number,
+                           ROW_NUMBER() OVER (PARTITION BY owner, repo ORDER BY pr_number) AS turn
+                    FROM jobs
+                    WHERE status = ? OR (status = ? AND attempts < ?)
+                )
+                ORDER BY turn, owner, repo
+                LIMIT ?
+                """,
+                (PENDING, FAILED, MAX_ATTEMPTS, -1 if limit is None else limit),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE jobs SET status = ? WHERE owner = ? AND repo = ? AND pr_number = ?",
+                ((IN_PROGRESS, owner, repo, pr) for owner, repo, pr in rows),
+            )
+            self._conn.commit()
+        return [(f"{owner}/{repo}", pr) for owner, repo, pr in rows]
+
+    def record_result(self, repo: str, pr_number: int, success: bool, message: str = "") -> None:
+        """Mark a claimed job done or failed."""
+        owner, name = repo.split("/", 1)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, message = ?, updated_at = ? "
+                "WHERE owner = ? AND repo = ? AND pr_number = ?",
+                (DONE if success else FAILED, message, datetime.now(timezone.utc).isoformat(), owner, name, int(pr_number)),
+            )
+            self._conn.commit()
+
+    def progress(self) -> Dict[str, Dict[str, int]]:
+        """Per-repo job counts by status."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT owner, repo, status, COUNT(*) FROM jobs GROUP BY owner, repo, status"
+            ).fetchall()
+        result: Dict[str, Dict[str, int]] = {}
+        for owner, repo, status, count in rows:
+            result.setdefault(f"{owner}/{repo}", {})[status] = count
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,21 +1,45 @@
 import os
+import asyncio
+import atexit
+import contextlib
+import inspect
+import threading
 import requests
 import time
 import random
-import pandas as pd
 import argparse
-import json
+import csv
 from tqdm import tqdm
 from collections import deque
 from datetime import datetime
+from artifact_store import get_store
+from diff_filter import filter_diff
+from metadata_store import get_metadata_store
+from patch_index import get_index
+from patch_store import get_patch_store
+from scrape_queue import ScrapeQueue
+from token_store import PeriodicFlusher, TokenStore, token_key
+import transport
 
 # Constants adjusted for your project structure
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-METADATA_FILE = os.path.join(BASE_DIR, "pr_metadata.json")
 LOG_FILE = os.path.join(BASE_DIR, "download_log.txt")
+# Legacy JSON token state, migrated into TOKEN_STATUS_DB on first run
 TOKEN_STATUS_FILE = os.path.join(BASE_DIR, "token_status.json")
+TOKEN_STATUS_DB = os.path.join(BASE_DIR, "token_status.db")
+TOKEN_FLUSH_INTERVAL = float(os.getenv("SCRAPER_TOKEN_FLUSH_INTERVAL", "2"))
 ALL_PATCHES_FILE = os.path.join(BASE_DIR, "all_patches.txt")
-PATCH_BASE_URL = "https://patch-diff.githubusercontent.com/raw/facebook/react/pull/{pr_number}.patch"
+PATCH_REPO = "facebook/react"
+# Write patches to the sharded patch store instead of all_patches.txt
+USE_PATCH_STORE = os.getenv("PATCH_STORE_ENABLED", "") == "1"
+# Replace generated/vendored/binary files with one-line stubs before storing patches.
+# The raw patch stays in the artifact store; diff_stats no longer counts stubbed files.
+FILTER_STORED_PATCHES = os.getenv("SCRAPER_FILTER_PATCHES", "") == "1"
+# Filled in with owner, repo and pr_number
+PATCH_BASE_URL = os.getenv(
+    "GITHUB_PATCH_URL", "https://patch-diff.githubusercontent.com/raw/{owner}/{repo}/pull/{pr_number}.patch"
+)
+QUEUE_DB = os.path.join(BASE_DIR, "scrape_queue.db")
 
 # Base delay in seconds
 BASE_DELAY = 2.0
@@ -24,6 +48,20 @@ MAX_DELAY = 120
 # Maximum retries per PR
 MAX_RETRIES = 5
 
+# Adaptive (AIMD) pacing, in requests per second
+AIMD_INITIAL_RATE = 2.0
+AIMD_MIN_RATE = 0.1
+AIMD_MAX_RATE = 50.0
+# Rate added per second of clean responses
+AIMD_INCREASE = 1.0
+# Multiplier applied to rate and concurrency when throttled
+AIMD_DECREASE = 0.5
+AIMD_MAX_CONCURRENCY = 32
+# X-RateLimit-Remaining below this fraction of the limit stops further increases
+AIMD_HEALTHY_REMAINING = 0.1
+# Seconds between effective-rate log lines
+RATE_LOG_INTERVAL = 30
+
 class TokenManager:
     """Manages multiple GitHub tokens with rotation and rate limit tracking"""
     
@@ -31,20 +69,31 @@ class TokenManager:
         self.tokens = deque(tokens)
         self.token_status = {}
         self.current_token = None
+        self._keys = {token: token_key(token) for token in tokens}
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._closed = False
+        self.store = TokenStore(TOKEN_STATUS_DB)
         self.load_token_status()
+        # Persist in batches off the request path, and once more on shutdown
+        self._flusher = PeriodicFlusher(self.save_token_status, TOKEN_FLUSH_INTERVAL)
+        atexit.register(self.close)
         
     def load_token_status(self):
-        """Load token status from file if available"""
-        if os.path.exists(TOKEN_STATUS_FILE):
+        """Load token status from the shared token store, migrating token_status.json once"""
+        if self.store.is_empty() and os.path.exists(TOKEN_STATUS_FILE):
             try:
-                with open(TOKEN_STATUS_FILE, 'r') as f:
-                    self.token_status = json.load(f)
-                log_message("Loaded token status from file")
+                imported = self.store.import_json(TOKEN_STATUS_FILE)
+                log_message(f"Migrated {imported} token statuses from {TOKEN_STATUS_FILE}")
             except Exception as e:
-                log_message(f"Error loading token status: {e}")
-                self._initialize_token_status()
-        else:
-            self._initialize_token_status()
+                log_message(f"Error migrating token status: {e}")
+        self._initialize_token_status()
+        stored = self.store.load(self._keys.values())
+        for token in self.tokens:
+            if self._keys[token] in stored:
+                self.token_status[token] = stored[self._keys[token]]
+        if stored:
+            log_message(f"Loaded status for {len(stored)} tokens from {TOKEN_STATUS_DB}")
     
     def _initialize_token_status(self):
         """Initialize token status for all tokens"""
@@ -54,16 +103,40 @@ class TokenManager:
                 "reset_time": datetime.now().timestamp(),
                 "remaining": 5000,  # Default GitHub rate limit
                 "backoff_until": 0,
-                "consecutive_errors": 0
+                "consecutive_errors": 0,
+                "observed_at": 0
             }
     
     def save_token_status(self):
-        """Save token status to file"""
-        with open(TOKEN_STATUS_FILE, 'w') as f:
-            json.dump(self.token_status, f, indent=2)
+        """Flush changed token statuses to the token store and adopt newer ones
+        recorded by other scraper processes"""
+        with self._lock:
+            dirty = {self._keys[t]: dict(self.token_status[t]) for t in self._dirty}
+            self._dirty.clear()
+        self.store.save(dirty)
+        stored = self.store.load(self._keys.values())
+        with self._lock:
+            for token in self.tokens:
+                row = stored.get(self._keys[token])
+                if row and row["observed_at"] > self.token_status[token]["observed_at"] and token not in self._dirty:
+                    self.token_status[token] = row
     
-    def get_next_token(self):
-        """Get the next available token with the highest remaining rate limit"""
+    def close(self):
+        """Stop the periodic flush and persist any pending changes"""
+        if self._closed:
+            return
+        self._closed = True
+        self._flusher.stop()
+        self.save_token_status()
+        self.store.close()
+    
+    def _select_token(self):
+        """Pick the available token with the highest remaining rate limit.
+        Returns (token, seconds to wait before using it)."""
+        with self._lock:
+            return self._select_token_locked()
+    
+    def _select_token_locked(self):
         now = datetime.now().timestamp()
         
         # Reset any tokens that have passed their reset time
@@ -71,6 +144,7 @@ class TokenManager:
             if status["reset_time"] < now:
                 status["remaining"] = 5000
                 status["reset_time"] = now + 3600  # Assume 1 hour reset
+                self._dirty.add(token)
                 log_message(f"Token {token[:7]}... rate limit reset")
             
             # Clear backoff if time has passed
@@ -89,6 +163,7 @@ class TokenManager:
                 continue
             available_tokens.append((token, status["remaining"]))
         
+        wait_time = 0
         # If we have available tokens, use the one with most remaining requests
         if available_tokens:
             available_tokens.sort(key=lambda x: x[1], reverse=True)
@@ -103,23 +178,53 @@ class TokenManager:
             
             self.current_token = next_available[0]
             wait_time = max(0, next_available[1] - now)
-            
-            if wait_time > 0:
-                log_message(f"All tokens are rate limited. Waiting {wait_time:.2f} seconds for next available token.")
-                time.sleep(wait_time)
+        
+        # Reserve one request so concurrent callers spread across tokens; the next
+        # response's headers overwrite this with the real value, and a response
+        # without them (patch-diff.githubusercontent.com) hands it back
+        self.token_status[self.current_token]["remaining"] -= 1
+        self._dirty.add(self.current_token)
         
         # Rotate token to the end of the queue for round-robin effect
         self.tokens.remove(self.current_token)
         self.tokens.append(self.current_token)
         
-        return self.current_token
+        return self.current_token, wait_time
+    
+    def get_next_token(self):
+        """Get the next available token with the highest remaining rate limit"""
+        token, wait_time = self._select_token()
+        if wait_time > 0:
+            log_message(f"All tokens are rate limited. Waiting {wait_time:.2f} seconds for next available token.")
+            time.sleep(wait_time)
+        return token
+    
+    async def aget_next_token(self):
+        """Async variant of get_next_token that waits on the event loop instead of sleeping"""
+        token, wait_time = self._select_token()
+        if wait_time > 0:
+            log_message(f"All tokens are rate limited. Waiting {wait_time:.2f} seconds for next available token.")
+            await asyncio.sleep(wait_time)
+        return token
     
-    def update_token_status(self, response=None, error=None):
-        """Update token status based on API response or error"""
-        if not self.current_token:
+    def update_token_status(self, response=None, error=None, token=None):
+        """Update token status based on API response or error.
+        Pass token when several requests are in flight; defaults to the last token handed out."""
+        token = token or self.current_token
+        if not token:
             return
         
-        status = self.token_status[self.current_token]
+        with self._lock:
+            self._update_token_status_locked(token, response, error)
+    
+    def _update_token_status_locked(self, token, response, error):
+        status = self.token_status[token]
+        status["observed_at"] = datetime.now().timestamp()
+        self._dirty.add(token)
+        
+        if response is not None and 'X-RateLimit-Remaining' not in response.headers:
+            # Nothing will correct _select_token_locked's reservation, so return it
+            status["remaining"] = min(status["remaining"] + 1, 5000)
         
         if error:
             status["consecutive_errors"] += 1
@@ -128,9 +233,10 @@ class TokenManager:
             if status["consecutive_errors"] >= 3:
                 backoff_time = min(30 * (2 ** (status["consecutive_errors"] - 3)), 3600)
                 status["backoff_until"] = datetime.now().timestamp() + backoff_time
-                log_message(f"Token {self.current_token[:7]}... put in backoff for {backoff_time} seconds after consecutive errors")
+                log_message(f"Token {token[:7]}... put in backoff for {backoff_time} seconds after consecutive errors")
         
-        elif response:
+        elif response is not None:
+            # Not `elif response:` - a requests.Response is falsy for 4xx, which hid every rate limit
             status["consecutive_errors"] = 0
             
             # Update rate limit info if headers are present
@@ -141,55 +247,235 @@ class TokenManager:
                 status["reset_time"] = int(response.headers.get('X-RateLimit-Reset', 0))
                 
             # Handle secondary rate limits
-            if response.status_code == 429 or "rate limit" in response.text.lower():
-                retry_after = int(response.headers.get('Retry-After', 60))
-                status["backoff_until"] = datetime.now().timestamp() + retry_after
-                log_message(f"Token {self.current_token[:7]}... hit rate limit, backing off for {retry_after} seconds")
-        
-        # Save status to file
-        self.save_token_status()
+            if is_rate_limited(response):
+                now = datetime.now().timestamp()
+                retry_after = 60
+                if 'Retry-After' in response.headers:
+                    retry_after = transport.parse_retry_after(response.headers['Retry-After'], now)
+                    if retry_after is None:
+                        # Unparsable Retry-After: wait for the window reset instead
+                        retry_after = status["reset_time"] - now if status["reset_time"] > now else 60
+                status["backoff_until"] = now + retry_after
+                log_message(f"Token {token[:7]}... hit rate limit, backing off for {retry_after:.0f} seconds")
+
+
+class AIMDController:
+    """Adaptive pacing for patch downloads (--pacing adaptive).
+    
+    Request rate and concurrency grow quickly until the first throttle (slow start), then
+    additively while responses are 200 and X-RateLimit-Remaining is healthy, and are cut multiplicatively on 429s, secondary
+    rate limits, Retry-After and 5xx/connection errors. One controller is shared by all
+    tokens, since secondary limits apply to the client as a whole."""
+    
+    def __init__(self, initial_rate=AIMD_INITIAL_RATE, max_rate=AIMD_MAX_RATE,
+                 max_concurrency=AIMD_MAX_CONCURRENCY):
+        self.rate = initial_rate
+        self.max_rate = max_rate
+        self.concurrency = 1
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.history = []  # (timestamp, effective req/s, target req/s, concurrency)
+        self._next_slot = 0.0
+        self._hold_until = 0.0
+        self._last_decrease = 0.0
+        self._slow_start = True
+        self._successes = 0
+        self._completed = 0
+        self._window_start = time.monotonic()
+        self._lock = threading.Lock()
+        self._condition = None  # asyncio.Condition, created on the running loop
+    
+    def _reserve_slot(self):
+        """Claim the next send time and return how long to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._hold_until)
+            self._next_slot = slot + 1.0 / self.rate
+            return slot - now
+    
+    def wait(self):
+        """Block until the next request may be sent"""
+        delay = self._reserve_slot()
+        if delay > 0:
+            time.sleep(delay)
+    
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Hold one of `concurrency` in-flight slots, paced to the current rate"""
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.concurrency)
+            self.in_flight += 1
+        try:
+            delay = self._reserve_slot()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+    
+    def record(self, response):
+        """Adjust rate and concurrency from one response"""
+        # Delta-seconds or HTTP-date; an unparsable value still counts as a throttle, just without a hold
+        retry_after = transport.parse_retry_after(response.headers.get("Retry-After"))
+        if is_rate_limited(response) or response.headers.get("Retry-After"):
+            self._decrease(retry_after)
+        elif response.status_code >= 500:
+            self._decrease(None)
+        elif response.status_code == 200:
+            self._increase(response.headers)
+        self._count()
+    
+    def record_error(self):
+        """Treat a connection error or timeout like a server error"""
+        self._decrease(None)
+        self._count()
+    
+    def _increase(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        limit = headers.get("X-RateLimit-Limit")
+        if remaining is not None and limit and int(remaining) < int(limit) * AIMD_HEALTHY_REMAINING:
+            # Budget is running low; hold steady and let TokenManager wait for the reset
+            return
+        with self._lock:
+            if self._slow_start:
+                # Until the first throttle, roughly double the rate every second
+                self.rate = min(self.max_rate, self.rate + 1.0)
+            else:
+                # +AIMD_INCREASE req/s per second of clean responses
+                self.rate = min(self.max_rate, self.rate + AIMD_INCREASE / self.rate)
+            self._successes += 1
+            threshold = 1 if self._slow_start else self.concurrency
+            grew = self._successes >= threshold and self.concurrency < self.max_concurrency
+            if self._successes >= threshold:
+                self._successes = 0
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+        if grew:
+            self._notify()
+    
+    def _decrease(self, retry_after):
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                self._hold_until = max(self._hold_until, now + retry_after)
+            # A burst of concurrent throttles is one congestion event
+            if now - self._last_decrease < 1.0:
+                return
+            self._last_decrease = now
+            self._slow_start = False
+            self.rate = max(AIMD_MIN_RATE, self.rate * AIMD_DECREASE)
+            self.concurrency = max(1, int(self.concurrency * AIMD_DECREASE))
+            self._successes = 0
+            log_message(f"[PACING] Throttled; backing off to {self.rate:.2f} req/s, concurrency {self.concurrency}"
+                        + (f", pausing {retry_after:.0f}s" if retry_after else ""))
+    
+    def _notify(self):
+        # Wake async waiters after concurrency grows; sequential mode has no waiters
+        if self._condition is not None:
+            async def wake():
+                async with self._condition:
+                    self._condition.notify_all()
+            asyncio.ensure_future(wake())
+    
+    def _count(self):
+        with self._lock:
+            self._completed += 1
+            elapsed = time.monotonic() - self._window_start
+            if elapsed < RATE_LOG_INTERVAL:
+                return
+            completed, self._completed = self._completed, 0
+            self._window_start = time.monotonic()
+        self.log_rate(completed / elapsed)
+    
+    def log_rate(self, effective=None):
+        """Log the effective request rate over the last window"""
+        if effective is None:
+            elapsed = time.monotonic() - self._window_start
+            effective = self._completed / elapsed if elapsed > 0 else 0.0
+        self.history.append((time.time(), effective, self.rate, self.concurrency))
+        log_message(f"[PACING] Effective rate {effective:.2f} req/s "
+                    f"(target {self.rate:.2f} req/s, concurrency {self.concurrency})")
 
 
+def is_rate_limited(response):
+    """True for 429s and rate-limit 403s. Only error bodies are inspected, since
+    a successful patch may well mention "rate limit" in its code."""
+    if response.status_code == 429:
+        return True
+    return response.status_code == 403 and "rate limit" in response.text.lower()
+
 def log_message(message):
     """Log a message to the log file and print it"""
     print(message)
     with open(LOG_FILE, "a", encoding="utf-8") as f:
         f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
 
-def load_pr_numbers(input_file):
-    """Load PR numbers from a CSV file exported from BigQuery"""
+def load_pr_numbers(input_file, repo=PATCH_REPO):
+    """Load PR numbers from a CSV file exported from BigQuery, streaming its rows into the metadata store"""
     input_path = os.path.join(BASE_DIR, input_file)
-    df = pd.read_csv(input_path)
-    return df["pr_number"].tolist(), df.to_dict('records')
+    get_metadata_store().import_csv(input_path, repo)
+    with open(input_path, newline="", encoding="utf-8") as f:
+        return [int(row["pr_number"]) for row in csv.DictReader(f) if row.get("pr_number")]
+
+def patches_file_for(repo):
+    """all_patches.txt for PATCH_REPO, all_patches.<owner>__<repo>.txt for any other repo"""
+    if repo == PATCH_REPO:
+        return ALL_PATCHES_FILE
+    root, ext = os.path.splitext(ALL_PATCHES_FILE)
+    return f"{root}.{repo.replace('/', '__')}{ext}"
 
-def save_metadata(pr_data):
-    """Save PR metadata to a JSON file"""
-    with open(METADATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(pr_data, f, indent=2)
+def patch_url(repo, pr_number):
+    owner, name = repo.split("/", 1)
+    return PATCH_BASE_URL.format(owner=owner, repo=name, pr_number=pr_number)
 
-def check_pr_already_downloaded(pr_number):
+def check_pr_already_downloaded(pr_number, repo=PATCH_REPO):
     """Check if a PR has already been downloaded"""
-    try:
-        with open(ALL_PATCHES_FILE, "r", encoding="utf-8", errors="ignore") as f:
-            content = f.read()
-            return f"===== PR #{pr_number} =====" in content
-    except FileNotFoundError:
-        # File doesn't exist yet
-        return False
+    if USE_PATCH_STORE:
+        return get_patch_store().has_patch(repo, pr_number)
+    return pr_number in get_index(patches_file_for(repo))
+
+def append_patch(pr_number, patch_text, repo=PATCH_REPO):
+    """Append one PR's patch to all_patches.txt and its offset index, or to the patch store"""
+    if FILTER_STORED_PATCHES:
+        patch_text = filter_diff(patch_text).with_stubs()
+    if USE_PATCH_STORE:
+        get_patch_store().put_patch(repo, pr_number, patch_text)
+        return
+    get_index(patches_file_for(repo)).append(pr_number, patch_text)
 
-def download_patch(pr_number, token_manager):
-    """Download a patch file for a PR number and append to all_patches.txt"""
+def read_patch(pr_number, repo=PATCH_REPO):
+    """Read one downloaded patch back from all_patches.txt or the patch store"""
+    if USE_PATCH_STORE:
+        return get_patch_store().get_patch(repo, pr_number)
+    return get_index(patches_file_for(repo)).get(pr_number)
+
+def download_patch(pr_number, token_manager, controller=None, repo=PATCH_REPO):
+    """Download a patch file for a PR number and append to all_patches.txt.
+    With an AIMDController, requests are paced by it instead of fixed retry sleeps."""
     # Check if PR is already in the file
-    if check_pr_already_downloaded(pr_number):
+    if check_pr_already_downloaded(pr_number, repo):
         return True, "Already downloaded"
     
-    url = PATCH_BASE_URL.format(pr_number=pr_number)
+    # Reuse a patch fetched earlier by any GitHub fetch path
+    store = get_store()
+    if store is not None:
+        stored_patch = store.get_text(repo, pr_number, "patch")
+        if stored_patch is not None:
+            append_patch(pr_number, stored_patch, repo)
+            return True, "Restored from artifact store"
+    
+    url = patch_url(repo, pr_number)
     delay = BASE_DELAY
     retries = 0
     
     while retries < MAX_RETRIES:
         # Get the next available token
         token = token_manager.get_next_token()
+        if controller:
+            controller.wait()
         
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
@@ -199,16 +485,17 @@ def download_patch(pr_number, token_manager):
         try:
             response = requests.get(url, headers=headers, timeout=30)
             token_manager.update_token_status(response=response)
+            if controller:
+                controller.record(response)
             
             if response.status_code == 200:
                 # Append to all_patches.txt
-                with open(ALL_PATCHES_FILE, "a", encoding="utf-8") as f:
-                    f.write(f"\n\n===== PR #{pr_number} =====\n")
-                    f.write(response.text)
-                    f.write(f"\n===== END PR #{pr_number} =====\n")
+                append_patch(pr_number, response.text, repo)
+                if store is not None:
+                    store.put_text(repo, pr_number, "patch", response.text)
                 return True, "Success"
                 
-            elif response.status_code == 429 or "rate limit" in response.text.lower():
+            elif is_rate_limited(response):
                 retries += 1
                 # Token manager already applied backoff based on response
                 continue
@@ -220,51 +507,148 @@ def download_patch(pr_number, token_manager):
                 log_message(f"Error for PR #{pr_number}: Status {response.status_code}")
                 token_manager.update_token_status(error=f"Status {response.status_code}")
                 retries += 1
-                wait_time = min(delay * (2 ** retries) + random.uniform(0, 1), MAX_DELAY)
-                time.sleep(wait_time)
+                if not controller:
+                    wait_time = min(delay * (2 ** retries) + random.uniform(0, 1), MAX_DELAY)
+                    time.sleep(wait_time)
                 
         except Exception as e:
             log_message(f"Exception for PR #{pr_number}: {str(e)}")
             token_manager.update_token_status(error=str(e))
             retries += 1
-            wait_time = min(delay * (2 ** retries) + random.uniform(0, 1), MAX_DELAY)
-            time.sleep(wait_time)
+            if controller:
+                controller.record_error()
+            else:
+                wait_time = min(delay * (2 ** retries) + random.uniform(0, 1), MAX_DELAY)
+                time.sleep(wait_time)
             
     return False, f"Failed after {MAX_RETRIES} retries"
 
-def get_downloaded_prs():
-    """Get a list of PR numbers that have already been downloaded"""
-    downloaded_prs = set()
-    try:
-        with open(ALL_PATCHES_FILE, "r", encoding="utf-8", errors="ignore") as f:
-            content = f.read()
-            import re
-            # Find all PR numbers in the file
-            pr_markers = re.findall(r"===== PR #(\d+) =====", content)
-            for pr in pr_markers:
-                downloaded_prs.add(int(pr))
-    except FileNotFoundError:
-        # File doesn't exist yet
-        pass
-    return downloaded_prs
+async def download_patch_async(client, pr_number, token_manager, token_slots, controller=None, repo=PATCH_REPO):
+    """Async variant of download_patch. Each token has its own bounded pool of in-flight
+    requests. Pacing comes from the rate-limit headers GitHub returns and, if given,
+    from the AIMDController's adaptive rate and concurrency."""
+    if check_pr_already_downloaded(pr_number, repo):
+        return True, "Already downloaded"
+    
+    store = get_store()
+    if store is not None:
+        stored_patch = store.get_text(repo, pr_number, "patch")
+        if stored_patch is not None:
+            append_patch(pr_number, stored_patch, repo)
+            return True, "Restored from artifact store"
+    
+    url = patch_url(repo, pr_number)
+    retries = 0
+    
+    while retries < MAX_RETRIES:
+        token = await token_manager.aget_next_token()
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+            "Authorization": f"token {token}"
+        }
+        
+        try:
+            async with token_slots[token], (controller.slot() if controller else contextlib.nullcontext()):
+                response = await client.get(url, headers=headers, timeout=30)
+            token_manager.update_token_status(response=response, token=token)
+            if controller:
+                controller.record(response)
+            
+            if response.status_code == 200:
+                # Single event-loop thread, so appends never interleave
+                append_patch(pr_number, response.text, repo)
+                if store is not None:
+                    store.put_text(repo, pr_number, "patch", response.text)
+                return True, "Success"
+            
+            elif is_rate_limited(response):
+                retries += 1
+                # Token manager already applied the backoff from Retry-After
+                continue
+            
+            elif response.status_code == 404:
+                return False, "PR not found"
+            
+            else:
+                log_message(f"Error for PR #{pr_number}: Status {response.status_code}")
+                token_manager.update_token_status(error=f"Status {response.status_code}", token=token)
+                retries += 1
+                if not controller:
+                    await asyncio.sleep(min(BASE_DELAY * (2 ** retries) + random.uniform(0, 1), MAX_DELAY))
+                
+        except Exception as e:
+            log_message(f"Exception for PR #{pr_number}: {str(e)}")
+            token_manager.update_token_status(error=str(e), token=token)
+            retries += 1
+            if controller:
+                controller.record_error()
+            else:
+                await asyncio.sleep(min(BASE_DELAY * (2 ** retries) + random.uniform(0, 1), MAX_DELAY))
+    
+    return False, f"Failed after {MAX_RETRIES} retries"
 
-def main():
-    parser = argparse.ArgumentParser(description="Download PR patches from GitHub with token rotation")
-    parser.add_argument("--input", required=True, help="CSV file with PR numbers from BigQuery")
-    parser.add_argument("--batch-size", type=int, default=10, help="Number of PRs to process before taking a longer break")
-    parser.add_argument("--batch-delay", type=int, default=30, help="Seconds to wait between batches")
-    parser.add_argument("--tokens", nargs="+", help="List of GitHub tokens to use")
-    parser.add_argument("--tokens-file", help="File containing GitHub tokens (one per line)")
-    parser.add_argument("--resume", action="store_true", help="Resume from last successfully processed PR")
-    args = parser.parse_args()
+async def download_all_async(pr_numbers, token_manager, per_token_concurrency, controller=None, on_result=None):
+    """Download many patches concurrently, with per_token_concurrency in-flight requests per token.
+    An AIMDController further limits total concurrency and rate to what GitHub tolerates.
+    pr_numbers may mix PR numbers of PATCH_REPO and ("owner/repo", pr_number) jobs;
+    on_result(repo, pr_number, success, message) is called as each one finishes; if it returns
+    an awaitable, the worker waits on it before taking the next job (used for backpressure).
+    Returns (successful, failed)."""
+    token_slots = {token: asyncio.Semaphore(per_token_concurrency) for token in token_manager.tokens}
+    queue = asyncio.Queue()
+    for job in pr_numbers:
+        queue.put_nowait(job if isinstance(job, tuple) else (PATCH_REPO, job))
+    
+    counts = {"successful": 0, "failed": 0}
+    progress = tqdm(total=len(pr_numbers))
+    
+    async def worker(client):
+        while True:
+            try:
+                repo, pr_number = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            success, message = await download_patch_async(client, pr_number, token_manager, token_slots,
+                                                          controller, repo)
+            progress.update(1)
+            if on_result:
+                pending = on_result(repo, pr_number, success, message)
+                if inspect.isawaitable(pending):
+                    await pending
+            if success:
+                counts["successful"] += 1
+                if counts["successful"] % 10 == 0:  # Only log every 10th success to reduce noise
+                    log_message(f"PR #{pr_number}: {message}")
+            else:
+                counts["failed"] += 1
+                log_message(f"PR #{pr_number}: {message}")
     
+    workers = per_token_concurrency * len(token_slots)
+    if controller:
+        controller.max_concurrency = min(controller.max_concurrency, workers)
+    client = transport.new_async_client(max_connections=workers)
+    try:
+        await asyncio.gather(*(worker(client) for _ in range(workers)))
+    finally:
+        await client.aclose()
+        progress.close()
+    return counts["successful"], counts["failed"]
+
+def get_downloaded_prs(repo=PATCH_REPO):
+    """Get a list of PR numbers that have already been downloaded"""
+    if USE_PATCH_STORE:
+        return set(get_patch_store().pr_numbers(repo))
+    return set(get_index(patches_file_for(repo)).pr_numbers())
+
+def collect_tokens(cli_tokens=None, tokens_file=None):
+    """Gather GitHub tokens from the command line, a tokens file and GITHUB_TOKENS"""
     # Collect tokens from arguments or file
     tokens = []
-    if args.tokens:
-        tokens.extend(args.tokens)
+    if cli_tokens:
+        tokens.extend(cli_tokens)
     
-    if args.tokens_file:
-        tokens_file_path = os.path.join(BASE_DIR, args.tokens_file)
+    if tokens_file:
+        tokens_file_path = os.path.join(BASE_DIR, tokens_file)
         if os.path.exists(tokens_file_path):
             with open(tokens_file_path, 'r') as f:
                 tokens.extend([line.strip() for line in f if line.strip()])
@@ -280,6 +664,49 @@ def main():
     if not tokens:
         log_message("No GitHub tokens provided. Using unauthenticated requests (highly rate limited).")
         tokens = [""]  # Empty token for unauthenticated requests
+    return tokens
+
+def log_queue_progress(queue):
+    """Log per-repo job counts"""
+    for repo, counts in sorted(queue.progress().items()):
+        summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+        log_message(f"{repo}: {summary}")
+
+def main():
+    global USE_PATCH_STORE, FILTER_STORED_PATCHES
+    parser = argparse.ArgumentParser(description="Download PR patches from GitHub with token rotation")
+    parser.add_argument("--input", help="CSV file with PR numbers from BigQuery")
+    parser.add_argument("--inputs", nargs="+",
+                        help="CSV files or directories of CSVs with (owner, repo, pr_number) jobs for the "
+                             "multi-repo queue; progress is kept in scrape_queue.db")
+    parser.add_argument("--repo", default=PATCH_REPO,
+                        help=f"Repository for CSVs without a repo column (default: {PATCH_REPO})")
+    parser.add_argument("--batch-size", type=int, default=10, help="Number of PRs to process before taking a longer break")
+    parser.add_argument("--batch-delay", type=int, default=30, help="Seconds to wait between batches")
+    parser.add_argument("--tokens", nargs="+", help="List of GitHub tokens to use")
+    parser.add_argument("--tokens-file", help="File containing GitHub tokens (one per line)")
+    parser.add_argument("--resume", action="store_true", help="Resume from last successfully processed PR")
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="In-flight requests per token for concurrent async downloads (default: 0, sequential)")
+    parser.add_argument("--pacing", choices=["adaptive", "fixed"], default="adaptive",
+                        help="adaptive: AIMD rate/concurrency driven by GitHub's responses; "
+                             "fixed: BASE_DELAY sleeps plus --batch-size/--batch-delay breaks (default: adaptive)")
+    parser.add_argument("--max-rate", type=float, default=AIMD_MAX_RATE,
+                        help=f"Upper bound on requests per second with adaptive pacing (default: {AIMD_MAX_RATE})")
+    parser.add_argument("--patch-store", action="store_true",
+                        help="Write patches to the sharded patch store instead of all_patches.txt")
+    parser.add_argument("--filter-patches", action="store_true",
+                        help="Stub out generated, vendored and binary files before storing patches")
+    args = parser.parse_args()
+    if not args.input and not args.inputs:
+        parser.error("one of --input or --inputs is required")
+
+    if args.patch_store:
+        USE_PATCH_STORE = True
+    if args.filter_patches:
+        FILTER_STORED_PATCHES = True
+    
+    tokens = collect_tokens(args.tokens, args.tokens_file)
     
     # Initialize token manager
     token_manager = TokenManager(tokens)
@@ -292,34 +719,71 @@ def main():
     else:
         log_message("Resuming previous download session")
     
-    # Load PR numbers and metadata from BigQuery export
-    pr_numbers, pr_data = load_pr_numbers(args.input)
-    log_message(f"Loaded {len(pr_numbers)} PR numbers from {args.input}")
-    
-    # Save metadata
-    save_metadata(pr_data)
+    queue = None
+    if args.inputs:
+        # Multi-repo job queue: resuming is implicit, finished jobs are never handed out again
+        queue = ScrapeQueue(QUEUE_DB)
+        requeued = queue.requeue_in_progress()
+        if requeued:
+            log_message(f"Requeued {requeued} jobs left in progress by an earlier run")
+        for source in args.inputs:
+            added = queue.load_source(os.path.join(BASE_DIR, source), args.repo)
+            log_message(f"Queued {added} new jobs from {source}")
+            # Same CSVs carry the title/author metadata local_pr_analysis looks up later
+            imported = get_metadata_store().import_source(os.path.join(BASE_DIR, source), args.repo)
+            log_message(f"Imported metadata for {imported} PRs from {source}")
+        pr_numbers = queue.claim_pending()
+        log_message(f"{len(pr_numbers)} jobs pending across {len(set(repo for repo, _ in pr_numbers))} repositories")
+    else:
+        # Load PR numbers from the BigQuery export; its metadata goes into the metadata store
+        pr_numbers = load_pr_numbers(args.input, args.repo)
+        log_message(f"Loaded {len(pr_numbers)} PR numbers from {args.input}")
     
     # Find start position if resuming
-    if args.resume:
-        downloaded_prs = get_downloaded_prs()
+    if args.resume and queue is None:
+        downloaded_prs = get_downloaded_prs(args.repo)
         if downloaded_prs:
             # Filter the list to only include PRs that haven't been downloaded yet
             pr_numbers = [pr for pr in pr_numbers if int(pr) not in downloaded_prs]
             log_message(f"Resuming: {len(downloaded_prs)} PRs already downloaded, {len(pr_numbers)} remaining")
     
+    controller = AIMDController(max_rate=args.max_rate) if args.pacing == "adaptive" else None
+    if controller:
+        log_message(f"Adaptive pacing: starting at {controller.rate:.2f} req/s, capped at {controller.max_rate:.2f} req/s")
+    
+    on_result = queue.record_result if queue else None
+    
+    if args.concurrency > 0:
+        if queue is None:
+            # Skip anything already downloaded, as download_patch does per PR
+            downloaded_prs = get_downloaded_prs(args.repo)
+            pr_numbers = [(args.repo, pr) for pr in pr_numbers if int(pr) not in downloaded_prs]
+        log_message(f"Concurrent download of {len(pr_numbers)} PRs with {args.concurrency} in-flight requests per token")
+        successful, failed = asyncio.run(
+            download_all_async(pr_numbers, token_manager, args.concurrency, controller, on_result))
+        if controller:
+            controller.log_rate()
+        log_message(f"Download complete: {successful} successful, {failed} failed")
+        if queue:
+            log_queue_progress(queue)
+        return
+    
     # Stats
     total = len(pr_numbers)
     successful = 0
     failed = 0
     
     # Process PRs 
-    for i, pr_number in enumerate(tqdm(pr_numbers)):
+    for i, job in enumerate(tqdm(pr_numbers)):
+        repo, pr_number = job if queue else (args.repo, job)
         # Add jitter to delay
         jitter = random.uniform(-0.3, 0.3) * BASE_DELAY
         current_delay = max(0.5, BASE_DELAY + jitter)
         
         # Download patch
-        success, message = download_patch(pr_number, token_manager)
+        success, message = download_patch(pr_number, token_manager, controller, repo)
+        if on_result:
+            on_result(repo, pr_number, success, message)
         
         if success:
             successful += 1
@@ -329,6 +793,10 @@ def main():
             failed += 1
             log_message(f"PR #{pr_number}: {message}")
         
+        if controller:
+            # The controller already paced this request
+            continue
+        
         # Take longer break between batches
         if (i + 1) % args.batch_size == 0:
             batch_delay = args.batch_delay + random.uniform(-5, 5)
@@ -339,7 +807,11 @@ def main():
         else:
             time.sleep(current_delay)
     
+    if controller:
+        controller.log_rate()
     log_message(f"Download complete: {successful} successful, {failed} failed")
+    if queue:
+        log_queue_progress(queue)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,41 @@
+from diff_condenser import condense_diff, parse_diff
+
+
+def _section(path, hunks):
+    lines = [f"diff --git a/{path} b/{path}", f"--- a/{path}", f"+++ b/{path}"]
+    for n, body in enumerate(hunks):
+        lines.append(f"@@ -{n * 100 + 1},3 +{n * 100 + 1},3 @@")
+        lines.extend(body)
+    return "\n".join(lines) + "\n"
+
+
+def test_diff_that_fits_is_returned_unchanged():
+    diff = _section("src/app.py", [["+x = 1"]])
+    assert condense_diff(diff, budget=len(diff)) == diff
+
+
+def test_condensed_diff_keeps_logic_and_summarizes_noise_in_order():
+    lock = _section("package-lock.json", [[f'+    "dep-{n}": "1.0.{n}",' for n in range(300)]])
+    first = _section("src/a.py", [["-    return None", "+    if value is None:", "+        raise ValueError(value)"]])
+    reformat = _section("src/b.py", [[f"-x{n} = {n}" for n in range(30)] + [f"+x{n}  =  {n}" for n in range(30)]])
+    last = _section("src/c.py", [["+def total(items):", "+    return sum(i.price for i in items)"]])
+    diff = first + lock + reformat + last
+
+    condensed = condense_diff(diff, budget=1000)
+    assert len(condensed) <= 1000
+    assert "raise ValueError(value)" in condensed and "return sum(i.price" in condensed
+    assert condensed.index("src/a.py") < condensed.index("src/c.py")
+    assert '"dep-1"' not in condensed
+    assert "# package-lock.json (+300/-0, generated): not shown" in condensed
+    # A whitespace-only rewrite ranks below a small logic change
+    scores = {f.path: f.hunks[0].score for f in parse_diff(diff)[1]}
+    assert scores["src/b.py"] < scores["src/a.py"]
+
+
+def test_parse_diff_stops_files_at_format_patch_boundaries():
+    diff = ("From 1111111111111111111111111111111111111111 Mon Sep 17 00:00:00 2001\nSubject: [PATCH] Fix\n\n"
+            + _section("src/a.py", [["+x = 1"]]) + "-- \n2.40.0\n")
+    preamble, files = parse_diff(diff)
+    assert [f.path for f in files] == ["src/a.py"]
+    assert files[0].hunks[0].lines == ["@@ -1,3 +1,3 @@", "+x = 1"]
+    assert preamble[-2:] == ["-- ", "2.40.0"]
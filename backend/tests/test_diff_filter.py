@@ -0,0 +1,80 @@
+from diff_filter import DEFAULT_RULES, FileClassifier, _glob_to_regex, filter_diff
+
+
+def _section(path, added, removed=()):
+    lines = [f"diff --git a/{path} b/{path}", "index 1234567..89abcde 100644", f"--- a/{path}", f"+++ b/{path}",
+             f"@@ -1,{len(removed)} +1,{len(added)} @@"]
+    lines += [f"-{line}" for line in removed] + [f"+{line}" for line in added]
+    return "\n".join(lines) + "\n"
+
+
+BINARY = ("diff --git a/logo.png b/logo.png\nnew file mode 100644\nindex 0000000..1234567\n"
+          "Binary files /dev/null and b/logo.png differ\n")
+
+
+def test_glob_to_regex_double_star_in_the_middle_matches_at_any_depth():
+    regex = _glob_to_regex("**/fixtures/**")
+    assert regex.match("fixtures/a.json")
+    assert regex.match("src/tests/fixtures/deep/a.json")
+    assert not regex.match("fixtures")
+    assert not regex.match("src/myfixtures/a.json")
+
+
+def test_glob_to_regex_directory_star_star_is_anchored():
+    regex = _glob_to_regex("dist/**")
+    assert regex.match("dist/app.js")
+    assert regex.match("dist/js/app.js")
+    assert not regex.match("src/dist/app.js")
+    assert _glob_to_regex("/build/**").match("build/out.o")
+    assert _glob_to_regex("a/**/b").match("a/b") and _glob_to_regex("a/**/b").match("a/x/y/b")
+
+
+def test_glob_to_regex_unanchored_patterns_match_the_name_at_any_depth():
+    assert _glob_to_regex("*.snap").match("src/__tests__/a.test.js.snap")
+    assert _glob_to_regex("yarn.lock").match("packages/app/yarn.lock")
+    assert not _glob_to_regex("yarn.lock").match("yarn.lock.bak")
+    assert _glob_to_regex("docs/*.md").match("docs/a.md")
+    assert not _glob_to_regex("docs/*.md").match("docs/api/a.md")
+    assert not _glob_to_regex("a?c").match("a/c")
+
+
+def test_filter_diff_puts_stubs_where_files_were():
+    source = _section("src/café.py", ["print('héllo')"], ["pass"])
+    lock = _section("package-lock.json", ["{"] * 3, ["}"])
+    generated = _section("src/api_client.py", ["# @generated by openapi", "x = 1"])
+    tail = _section("README.md", ["Usage"])
+    diff = source + lock + BINARY + generated + tail
+
+    filtered = filter_diff(diff)
+    assert filtered.kept_files == 2
+    assert not filtered.all_filtered
+    assert filtered.text == source + tail
+    assert filtered.with_stubs() == (
+        source
+        + "# [generated] package-lock.json: +3/-1 lines omitted\n"
+        + "# [binary] logo.png: +0/-0 lines omitted\n"
+        + "# [generated] src/api_client.py: +2/-0 lines omitted\n"
+        + tail
+    )
+    assert filtered.metadata()["filtered_files"] == {
+        "generated": {"files": 2, "additions": 5, "deletions": 1},
+        "binary": {"files": 1, "additions": 0, "deletions": 0},
+    }
+
+
+def test_all_filtered_only_when_every_file_was_dropped():
+    only_generated = filter_diff(_section("yarn.lock", ["a"]) + BINARY)
+    assert only_generated.all_filtered
+    assert only_generated.text == ""
+
+    untouched = filter_diff(_section("src/app.py", ["x = 1"]))
+    assert not untouched.all_filtered
+    assert untouched.with_stubs() == untouched.text == _section("src/app.py", ["x = 1"])
+
+    assert not filter_diff("").all_filtered
+
+
+def test_unset_attribute_keeps_a_default_filtered_file():
+    classifier = FileClassifier(DEFAULT_RULES + "\nyarn.lock -linguist-generated\n", rules_path=None)
+    filtered = filter_diff(_section("yarn.lock", ["a"]), classifier)
+    assert filtered.kept_files == 1 and not filtered.dropped
@@ -0,0 +1,92 @@
+from diff_stats import diff_stats, file_spans
+from patch_index import scan_records
+
+FORMAT_PATCH = """From 1111111111111111111111111111111111111111 Mon Sep 17 00:00:00 2001
+From: Dev <dev@example.com>
+Subject: [PATCH 1/2] Add parser
+
+---
+ src/parser.py | 3 ++-
+ README.md     | 1 +
+ 2 files changed, 3 insertions(+), 1 deletion(-)
+
+diff --git a/src/parser.py b/src/parser.py
+index 1234567..89abcde 100644
+--- a/src/parser.py
++++ b/src/parser.py
+@@ -1,2 +1,3 @@
+ import re
+-OLD = 1
++NEW = 1
++MORE = 2
+diff --git a/README.md b/README.md
+index 1234567..89abcde 100644
+--- a/README.md
++++ b/README.md
+@@ -1 +1,2 @@
+ # Title
++Usage
+{signature}
+2.40.0
+
+From 2222222222222222222222222222222222222222 Mon Sep 17 00:00:00 2001
+From: Dev <dev@example.com>
+Subject: [PATCH 2/2] Tweak parser, add logo
+
+---
+diff --git a/src/parser.py b/src/parser.py
+index 89abcde..fedcba9 100644
+--- a/src/parser.py
++++ b/src/parser.py
+@@ -2,2 +2,2 @@
+ NEW = 1
+-MORE = 2
++MORE = 3
+diff --git a/assets/logo.png b/assets/logo.png
+new file mode 100644
+index 0000000..1234567
+Binary files /dev/null and b/assets/logo.png differ
+{signature}
+2.40.0
+""".format(signature="-- ")
+
+
+def test_file_spans_stop_at_signature_and_next_commit():
+    data = FORMAT_PATCH.encode("utf-8")
+    spans = list(file_spans(data))
+    assert [path for path, _, _, _ in spans] == ["src/parser.py", "README.md", "src/parser.py", "assets/logo.png"]
+    for path, start, hunks_at, end in spans:
+        section = data[start:end]
+        assert section.startswith(b"diff --git a/" + path.encode())
+        assert b"\n-- \n" not in section and b"\nFrom 2222" not in section
+    # README.md ends before the first commit's signature
+    _, start, hunks_at, end = spans[1]
+    assert data[hunks_at:end].endswith(b"+Usage\n")
+    # Binary files have no hunks
+    assert spans[3][2] == -1
+
+
+def test_diff_stats_counts_every_commit():
+    stats = diff_stats(FORMAT_PATCH)
+    assert (stats["additions"], stats["deletions"], stats["changed_files"]) == (4, 2, 3)
+    by_language = {row["language"]: row for row in stats["code_changes"]}
+    assert by_language["Python"] == {"language": "Python", "lines_of_code": 5, "additions": 3,
+                                     "deletions": 2, "files": 1}
+    assert by_language["Markdown"]["additions"] == 1
+    assert by_language["Other"]["lines_of_code"] == 0
+    assert stats["files"][0]["path"] == "src/parser.py"
+    assert {row["path"] for row in stats["directories"]} == {"src", ".", "assets"}
+
+
+def test_diff_stats_same_for_str_bytes_and_dump_slices():
+    record = f"\n\n===== PR #5 =====\n{FORMAT_PATCH}\n===== END PR #5 =====\n".encode("utf-8")
+    (pr_number, body_start, marker_at, _), = scan_records(record)
+    assert pr_number == 5
+    assert diff_stats(record[body_start:marker_at]) == diff_stats(FORMAT_PATCH.encode("utf-8")) == diff_stats(FORMAT_PATCH)
+
+
+def test_file_spans_without_signature_stop_at_next_commit():
+    data = FORMAT_PATCH.replace("-- \n2.40.0\n", "").encode("utf-8")
+    _, start, hunks_at, end = list(file_spans(data))[1]
+    assert data[hunks_at:end].endswith(b"+Usage\n\n")
+    assert diff_stats(data)["deletions"] == 2
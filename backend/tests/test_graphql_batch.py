@@ -0,0 +1,56 @@
+import json
+
+import github_client
+
+
+class _Response:
+    def __init__(self, status_code, payload, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = json.dumps(payload)
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+_NODE = {"title": "Fix", "author": {"login": "octocat"}, "commits": {"totalCount": 0, "nodes": []},
+         "reviews": {"nodes": []}}
+
+
+def _patch(monkeypatch, responses):
+    scheduler = github_client.TokenScheduler(["token-a", "token-b"])
+    calls = []
+
+    def post(url, headers=None, json=None):
+        calls.append(headers["Authorization"])
+        return responses.pop(0)
+
+    monkeypatch.setattr(github_client, "TOKENS", scheduler.tokens)
+    monkeypatch.setattr(github_client, "token_scheduler", scheduler)
+    monkeypatch.setattr(github_client, "get_store", lambda: None)
+    monkeypatch.setattr(github_client.transport, "post", post)
+    return scheduler, calls
+
+
+def test_graphql_rate_limited_error_parks_token_and_retries(monkeypatch):
+    limited = _Response(200, {"errors": [{"type": "RATE_LIMITED", "message": "API rate limit exceeded"}]},
+                        {"X-RateLimit-Remaining": "12"})
+    ok = _Response(200, {"data": {"repository": {"pr_7": _NODE}}}, {"X-RateLimit-Remaining": "4000"})
+    scheduler, calls = _patch(monkeypatch, [limited, ok])
+
+    metadata = github_client.fetch_pr_metadata_batch_graphql("acme", "widgets", [7], include_diff=False)
+
+    assert metadata[7]["title"] == "Fix"
+    assert len(calls) == 2 and calls[0] != calls[1]
+    parked = [t for t in scheduler.tokens if scheduler._status(t, "graphql")["parked_until"] > 0]
+    assert parked == [calls[0].split()[1]]
+
+
+def test_graphql_secondary_limit_retries_on_another_token(monkeypatch):
+    limited = _Response(403, {"message": "You have exceeded a secondary rate limit"}, {"Retry-After": "30"})
+    ok = _Response(200, {"data": {"repository": {"pr_7": _NODE}}})
+    _, calls = _patch(monkeypatch, [limited, ok])
+
+    assert 7 in github_client.fetch_pr_metadata_batch_graphql("acme", "widgets", [7], include_diff=False)
+    assert len(calls) == 2 and calls[0] != calls[1]
@@ -0,0 +1,32 @@
+import local_pr_analysis
+
+
+def _dump(tmp_path):
+    records = [f"\n\n===== PR #{n} =====\ndiff --git a/f{n} b/f{n}\n+line {n}\n===== END PR #{n} =====\n"
+               for n in range(1, 6)]
+    # A torn record in the middle and an unfinished one at the end
+    records.insert(2, "\n\n===== PR #99 =====\n+cut off")
+    records.append("\n\n===== PR #100 =====\n+still downloading")
+    path = tmp_path / "all_patches.txt"
+    path.write_text("".join(records), encoding="utf-8")
+    return str(path)
+
+
+def test_parse_patches_yields_complete_records_in_file_order(tmp_path):
+    patches = list(local_pr_analysis.parse_patches(_dump(tmp_path)))
+    assert [pr for pr, _ in patches] == ["1", "2", "3", "4", "5"]
+    # Like the old line-based parser, the newline before the END marker is kept
+    assert patches[0][1] == "diff --git a/f1 b/f1\n+line 1\n"
+
+
+def test_parse_patches_process_pool_matches_single_pass(tmp_path, monkeypatch):
+    path = _dump(tmp_path)
+    monkeypatch.setattr(local_pr_analysis, "PARALLEL_PARSE_MIN_BYTES", 0)
+    assert list(local_pr_analysis.parse_patches(path, processes=3)) == list(local_pr_analysis.parse_patches(path))
+    assert [pr for pr, _, _ in local_pr_analysis.index_patches(path, processes=3)] == [1, 2, 3, 4, 5]
+
+
+def test_parse_patches_empty_file(tmp_path):
+    path = tmp_path / "all_patches.txt"
+    path.write_bytes(b"")
+    assert list(local_pr_analysis.parse_patches(str(path))) == []
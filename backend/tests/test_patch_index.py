@@ -0,0 +1,67 @@
+from patch_index import PatchIndex, scan_records
+
+
+def _record(pr_number, body):
+    return f"\n\n===== PR #{pr_number} =====\n{body}\n===== END PR #{pr_number} =====\n".encode("utf-8")
+
+
+def test_append_then_reopen_reads_from_sidecar(tmp_path):
+    path = str(tmp_path / "all_patches.txt")
+    index = PatchIndex(path)
+    index.append(10, "diff --git a/x b/x\n+one")
+    index.append(11, "diff --git a/y b/y\n+two")
+
+    reopened = PatchIndex(path)
+    assert reopened.pr_numbers() == [10, 11]
+    assert reopened.get(11) == "diff --git a/y b/y\n+two"
+    assert 10 in reopened and 12 not in reopened
+    with open(path + ".idx") as f:
+        assert len(f.readlines()) == 2
+
+
+def test_torn_trailing_record_is_indexed_once_complete(tmp_path):
+    path = str(tmp_path / "all_patches.txt")
+    index = PatchIndex(path)
+    index.append(1, "+first")
+    with open(path, "ab") as f:
+        f.write(b"\n\n===== PR #2 =====\n+seco")
+
+    assert PatchIndex(path).pr_numbers() == [1]
+    assert 2 not in index
+
+    with open(path, "ab") as f:
+        f.write(b"nd\n===== END PR #2 =====\n")
+    assert index.get(2) == "+second"
+    assert PatchIndex(path).pr_numbers() == [1, 2]
+
+
+def test_torn_record_between_complete_ones_is_skipped(tmp_path):
+    path = tmp_path / "all_patches.txt"
+    path.write_bytes(_record(1, "+a") + b"\n\n===== PR #2 =====\n+cut off" + _record(3, "+c"))
+
+    index = PatchIndex(str(path))
+    assert index.pr_numbers() == [1, 3]
+    assert index.get(3) == "+c"
+    # New appends land after the foreign data and are still found
+    index.append(4, "+d")
+    assert PatchIndex(str(path)).get(4) == "+d"
+
+
+def test_scan_records_split_into_ranges_matches_full_scan():
+    data = b"".join(_record(n, "+line\n" * n) for n in range(1, 8))
+    full = list(scan_records(data))
+    cuts = [0, 17, 90, 200, len(data)]
+    chunked = [r for a, b in zip(cuts, cuts[1:]) for r in scan_records(data, a, b)]
+    assert [r[0] for r in full] == list(range(1, 8))
+    assert chunked == full
+
+
+def test_stale_sidecar_is_rebuilt(tmp_path):
+    path = str(tmp_path / "all_patches.txt")
+    index = PatchIndex(path)
+    index.append(1, "+a")
+    index.append(2, "+b")
+    with open(path, "wb") as f:
+        f.write(_record(5, "+e"))
+
+    assert PatchIndex(path).pr_numbers() == [5]
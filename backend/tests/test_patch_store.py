@@ -0,0 +1,59 @@
+import os
+
+from patch_store import FOOTER, INDEX_ENTRY, RECORD_HEADER, RECORD_MAGIC, PatchStore, _read_footer
+
+
+def _shard(store, repo):
+    directory = store._repo_dir(repo)
+    return os.path.join(directory, sorted(n for n in os.listdir(directory) if n.endswith(".pst"))[-1])
+
+
+def test_append_seal_read_round_trip(tmp_path):
+    store = PatchStore(str(tmp_path))
+    assert store.put_patches("acme/widgets", [(1, "patch one\n"), (2, "patch two\n")]) == 2
+    store.put_patch("acme/widgets", 3, "patch three\n")
+    assert store.get_patch("acme/widgets", 2) == "patch two\n"
+
+    store.seal("acme/widgets")
+    store.close()
+
+    reopened = PatchStore(str(tmp_path))
+    assert reopened.pr_numbers("acme/widgets") == [1, 2, 3]
+    assert list(reopened.iter_patches("acme/widgets")) == [
+        (1, "patch one\n"), (2, "patch two\n"), (3, "patch three\n")]
+    with open(_shard(reopened, "acme/widgets"), "rb") as f:
+        data = f.read()
+    index_offset, count = _read_footer(data)
+    assert count == 3
+    assert len(data) == index_offset + count * INDEX_ENTRY.size + FOOTER.size
+    reopened.close()
+
+
+def test_torn_trailing_record_is_ignored_and_dropped_on_seal(tmp_path):
+    store = PatchStore(str(tmp_path))
+    store.put_patches("acme/widgets", [(1, "patch one\n"), (2, "patch two\n")])
+    path = _shard(store, "acme/widgets")
+    intact = os.path.getsize(path)
+    with open(path, "ab") as f:
+        # Header promises 100 payload bytes but only 5 made it to disk
+        f.write(RECORD_HEADER.pack(RECORD_MAGIC, 3, 1, 100, 100, 0) + b"abcde")
+
+    reader = PatchStore(str(tmp_path))
+    assert reader.pr_numbers("acme/widgets") == [1, 2]
+    assert not reader.has_patch("acme/widgets", 3)
+
+    reader.seal("acme/widgets")
+    with open(path, "rb") as f:
+        data = f.read()
+    index_offset, count = _read_footer(data)
+    assert (index_offset, count) == (intact, 2)
+    reader.close()
+
+    reopened = PatchStore(str(tmp_path))
+    assert list(reopened.iter_patches("acme/widgets")) == [(1, "patch one\n"), (2, "patch two\n")]
+    # New appends go to a fresh shard after the sealed one
+    reopened.put_patch("acme/widgets", 3, "patch three\n")
+    assert _shard(reopened, "acme/widgets") != path
+    assert reopened.get_patch("acme/widgets", 3) == "patch three\n"
+    reopened.close()
+    store.close()
@@ -0,0 +1,60 @@
+import time
+from email.utils import formatdate
+
+import transport
+
+
+class _Response:
+    def __init__(self, status_code, headers, text=""):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+
+def test_parse_retry_after_seconds_and_http_date():
+    now = time.time()
+    assert transport.parse_retry_after("7", now) == 7.0
+    assert 29 <= transport.parse_retry_after(formatdate(now + 30, usegmt=True), now) <= 30
+    assert transport.parse_retry_after(formatdate(now - 30, usegmt=True), now) == 0.0
+    assert transport.parse_retry_after("soon", now) is None
+    assert transport.parse_retry_after(None, now) is None
+
+
+def test_aimd_controller_holds_on_http_date_retry_after(tmp_path, monkeypatch):
+    import scraper
+
+    monkeypatch.setattr(scraper, "LOG_FILE", str(tmp_path / "log.txt"))
+    controller = scraper.AIMDController()
+    controller.record(_Response(429, {"Retry-After": formatdate(time.time() + 30, usegmt=True)}))
+    assert controller._hold_until - time.monotonic() > 25
+    assert not controller._slow_start
+
+
+def _token_manager(tmp_path, monkeypatch):
+    import scraper
+
+    monkeypatch.setattr(scraper, "TOKEN_STATUS_DB", str(tmp_path / "tokens.db"))
+    monkeypatch.setattr(scraper, "TOKEN_STATUS_FILE", str(tmp_path / "missing.json"))
+    monkeypatch.setattr(scraper, "LOG_FILE", str(tmp_path / "log.txt"))
+    return scraper.TokenManager(["token-a"])
+
+
+def test_token_manager_backs_off_on_http_date_retry_after(tmp_path, monkeypatch):
+    manager = _token_manager(tmp_path, monkeypatch)
+    try:
+        retry_at = formatdate(time.time() + 120, usegmt=True)
+        manager.update_token_status(response=_Response(429, {"Retry-After": retry_at}), token="token-a")
+        assert 110 < manager.token_status["token-a"]["backoff_until"] - time.time() <= 120
+    finally:
+        manager.close()
+
+
+def test_token_manager_falls_back_to_reset_on_bad_retry_after(tmp_path, monkeypatch):
+    manager = _token_manager(tmp_path, monkeypatch)
+    try:
+        reset = int(time.time()) + 300
+        headers = {"Retry-After": "later", "X-RateLimit-Reset": str(reset), "X-RateLimit-Remaining": "0"}
+        manager.update_token_status(response=_Response(429, headers), token="token-a")
+        assert manager.token_status["token-a"]["backoff_until"] == reset
+    finally:
+        manager.close()
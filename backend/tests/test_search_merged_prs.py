@@ -0,0 +1,33 @@
+import threading
+import time
+from datetime import datetime, timezone
+
+import github_client
+
+
+def test_closing_search_generator_cancels_pending_windows(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def fake_window(owner, repo, start, end):
+        with lock:
+            calls.append(start)
+            number = len(calls)
+        time.sleep(0.05)
+        return [{"number": number}]
+
+    monkeypatch.setattr(github_client, "_search_merged_window", fake_window)
+    prs = github_client.search_merged_prs("acme", "widgets", datetime(2024, 1, 1, tzinfo=timezone.utc),
+                                          datetime(2024, 2, 1, tzinfo=timezone.utc), windows=8, max_workers=1)
+    assert next(prs)["number"] == 1
+    prs.close()
+    time.sleep(0.2)
+    # The window running at close() may finish; the rest are never searched
+    assert len(calls) <= 2
+
+
+def test_search_merged_prs_dedupes_across_windows(monkeypatch):
+    monkeypatch.setattr(github_client, "_search_merged_window", lambda owner, repo, start, end: [{"number": 1}])
+    prs = list(github_client.search_merged_prs("acme", "widgets", datetime(2024, 1, 1, tzinfo=timezone.utc),
+                                               datetime(2024, 2, 1, tzinfo=timezone.utc), windows=4))
+    assert prs == [{"number": 1}]
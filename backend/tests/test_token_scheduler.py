@@ -0,0 +1,42 @@
+import threading
+import time
+
+from github_client import TokenScheduler
+
+
+def test_fully_reserved_token_is_busy_not_an_error():
+    scheduler = TokenScheduler(["t"])
+    scheduler._status("t", "core")["remaining"] = 1
+    assert scheduler.acquire() == "t"
+
+    token, wait = scheduler._try_acquire("core")
+    assert token is None
+    assert 0 < wait <= TokenScheduler.RESERVED_POLL_SECONDS
+
+
+def test_acquire_waits_for_a_released_reservation():
+    scheduler = TokenScheduler(["t"])
+    scheduler._status("t", "core")["remaining"] = 1
+    scheduler.acquire()
+    threading.Timer(0.2, scheduler.release, args=("t",)).start()
+
+    started = time.monotonic()
+    assert scheduler.acquire() == "t"
+    assert time.monotonic() - started < TokenScheduler.RESERVED_POLL_SECONDS + 0.5
+
+
+def test_fully_reserved_token_waits_for_its_reset():
+    scheduler = TokenScheduler(["t"])
+    status = scheduler._status("t", "core")
+    status["remaining"] = 0
+    status["reset"] = time.time() + 30
+    token, wait = scheduler._try_acquire("core")
+    assert token is None
+    assert 29 < wait <= 30
+
+
+def test_acquire_prefers_the_token_with_most_budget():
+    scheduler = TokenScheduler(["a", "b"])
+    scheduler._status("a", "core")["remaining"] = 3
+    scheduler._status("b", "core")["remaining"] = 10
+    assert scheduler.acquire() == "b"
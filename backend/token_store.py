@@ -0,0 +1,128 @@
+"""
+token_store.py
+
+Crash-safe, shared persistence for the scraper's per-token rate-limit state.
+
+State lives in a small WAL-mode SQLite database keyed by a hash of each token, so
+raw tokens never touch disk. Callers mutate state in memory and flush dirty rows
+in batches (on a timer and at shutdown) instead of rewriting a JSON file after
+every request. Each row carries the time its values were observed; an upsert only
+overwrites a row with newer observations, and a flush pulls in anything other
+processes observed more recently. Several scraper processes on the same host can
+therefore share one budget per token without clobbering each other.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable
+
+FIELDS = ("remaining", "reset_time", "backoff_until", "consecutive_errors")
+
+
+def token_key(token: str) -> str:
+    """Stable identifier for a token that does not reveal it."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+
+class TokenStore:
+    """WAL-mode SQLite table of token status rows, merged by observation time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS token_status (
+                token_key TEXT PRIMARY KEY,
+                remaining INTEGER NOT NULL,
+                reset_time REAL NOT NULL,
+                backoff_until REAL NOT NULL,
+                consecutive_errors INTEGER NOT NULL,
+                observed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def load(self, keys: Iterable[str]) -> Dict[str, Dict[str, float]]:
+        """Return stored status rows for the given token keys."""
+        keys = list(keys)
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT token_key, {', '.join(FIELDS)}, observed_at FROM token_status "
+                f"WHERE token_key IN ({', '.join('?' * len(keys))})",
+                keys,
+            ).fetchall()
+        return {row[0]: dict(zip(FIELDS + ("observed_at",), row[1:])) for row in rows}
+
+    def save(self, statuses: Dict[str, Dict[str, float]]) -> None:
+        """Upsert status rows in one transaction, keeping whichever observation is newer."""
+        if not statuses:
+            return
+        with self._lock:
+            self._conn.executemany(
+                f"""
+                INSERT INTO token_status (token_key, {', '.join(FIELDS)}, observed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(token_key) DO UPDATE SET
+                    {', '.join(f'{field} = excluded.{field}' for field in FIELDS)},
+                    observed_at = excluded.observed_at
+                WHERE excluded.observed_at >= token_status.observed_at
+                """,
+                [(key,) + tuple(status[field] for field in FIELDS) + (status["observed_at"],)
+                 for key, status in statuses.items()],
+            )
+            self._conn.commit()
+
+    def import_json(self, json_path: str) -> int:
+        """
+        One-time migration from the old token_status.json (keyed by raw token).
+        Returns the number of rows imported.
+        """
+        with open(json_path, "r") as f:
+            old = json.load(f)
+        mtime = os.path.getmtime(json_path)
+        statuses = {}
+        for token, status in old.items():
+            if all(field in status for field in FIELDS):
+                statuses[token_key(token)] = dict(status, observed_at=mtime)
+        self.save(statuses)
+        return len(statuses)
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM token_status LIMIT 1").fetchone() is None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class PeriodicFlusher:
+    """Calls flush() every `interval` seconds on a daemon thread until stopped."""
+
+    def __init__(self, flush, interval: float):
+        self._flush = flush
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="token-store-flush", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                self._flush()
+            except Exception as e:
+                print(f"[TOKENS] Flush failed: {e}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=self._interval + 1)
@@ -0,0 +1,202 @@
+"""
+transport.py
+
+Shared, pooled HTTP transport for all outbound GitHub traffic.
+
+A single keep-alive session is created lazily and reused across threads, so
+repeated calls to api.github.com / github.com reuse TCP+TLS connections
+instead of paying a fresh handshake per request. Connections are pooled per
+host; pool sizes and HTTP/2 can be tuned with environment variables or
+`configure()`:
+
+    HTTP_POOL_CONNECTIONS  number of per-host pools to keep (default 10)
+    HTTP_POOL_MAXSIZE      max keep-alive connections per host (default 32)
+    HTTP_HTTP2             "1" to multiplex over HTTP/2 via httpx (needs `h2`)
+    HTTP_TIMEOUT           default request timeout in seconds (default 30)
+"""
+
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+HTTP2_ENABLED = os.getenv("HTTP_HTTP2", "") == "1"
+DEFAULT_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header in either delta-seconds or HTTP-date form, or None."""
+    if value is None:
+        return None
+    now = time.time() if now is None else now
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - now)
+    except (TypeError, ValueError):
+        return None
+
+
+def _build_requests_session() -> requests.Session:
+    session = requests.Session()
+    # pool_block=True makes threads wait for a free connection instead of
+    # opening throwaway ones once a host's pool is exhausted.
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _build_http2_client():
+    import httpx
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        print("[TRANSPORT] HTTP/2 requested but the 'h2' package is not installed. Falling back to HTTP/1.1.")
+        return None
+    limits = httpx.Limits(
+        max_connections=POOL_CONNECTIONS * POOL_MAXSIZE,
+        max_keepalive_connections=POOL_MAXSIZE,
+    )
+    return httpx.Client(http2=True, limits=limits, timeout=DEFAULT_TIMEOUT, follow_redirects=True)
+
+
+def get_client():
+    """
+    Return the shared HTTP client, creating it on first use.
+    The client is a requests.Session, or an httpx.Client when HTTP/2 is enabled.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                client = _build_http2_client() if HTTP2_ENABLED else None
+                _client = client if client is not None else _build_requests_session()
+    return _client
+
+
+def new_async_client(max_connections: Optional[int] = None):
+    """
+    Create an httpx.AsyncClient with the same pool settings as the shared client.
+    Async clients are bound to an event loop, so callers own and close them.
+    """
+    import httpx
+    http2 = HTTP2_ENABLED
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            http2 = False
+    limits = httpx.Limits(
+        max_connections=max_connections or POOL_CONNECTIONS * POOL_MAXSIZE,
+        max_keepalive_connections=POOL_MAXSIZE,
+    )
+    return httpx.AsyncClient(http2=http2, limits=limits, timeout=DEFAULT_TIMEOUT, follow_redirects=True)
+
+
+def _is_httpx(client) -> bool:
+    return type(client).__module__.startswith("httpx")
+
+
+def stream_get(url: str, headers: Optional[Dict[str, str]] = None, max_bytes: Optional[int] = None,
+               timeout: Optional[float] = None):
+    """
+    Stream a GET body, stopping once max_bytes have been read.
+    Returns (response, body, truncated); the response carries status_code and headers,
+    and body holds at most max_bytes bytes.
+    """
+    client = get_client()
+    chunks, size, truncated = [], 0, False
+    if _is_httpx(client):
+        with client.stream("GET", url, headers=headers, timeout=timeout or DEFAULT_TIMEOUT) as response:
+            for chunk in response.iter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if max_bytes is not None and size >= max_bytes:
+                    truncated = True
+                    break
+    else:
+        response = client.get(url, headers=headers, timeout=timeout or DEFAULT_TIMEOUT, stream=True)
+        try:
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                chunks.append(chunk)
+                size += len(chunk)
+                if max_bytes is not None and size >= max_bytes:
+                    truncated = True
+                    break
+        finally:
+            response.close()
+    body = b"".join(chunks)
+    return response, body[:max_bytes] if truncated else body, truncated
+
+
+async def astream_get(client, url: str, headers: Optional[Dict[str, str]] = None,
+                      max_bytes: Optional[int] = None):
+    """
+    Async counterpart of stream_get on an httpx.AsyncClient.
+    """
+    chunks, size, truncated = [], 0, False
+    async with client.stream("GET", url, headers=headers) as response:
+        async for chunk in response.aiter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if max_bytes is not None and size >= max_bytes:
+                truncated = True
+                break
+    body = b"".join(chunks)
+    return response, body[:max_bytes] if truncated else body, truncated
+
+
+def configure(pool_connections: Optional[int] = None, pool_maxsize: Optional[int] = None,
+              http2: Optional[bool] = None) -> None:
+    """
+    Change pool sizes or HTTP/2 mode. The current client is closed and a new one
+    is built on the next request.
+    """
+    global POOL_CONNECTIONS, POOL_MAXSIZE, HTTP2_ENABLED
+    if pool_connections is not None:
+        POOL_CONNECTIONS = pool_connections
+    if pool_maxsize is not None:
+        POOL_MAXSIZE = pool_maxsize
+    if http2 is not None:
+        HTTP2_ENABLED = http2
+    close()
+
+
+def close() -> None:
+    """Close the shared client and drop all pooled connections."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def get(url: str, headers: Optional[Dict[str, str]] = None, params: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None):
+    """
+    Issue a GET through the shared pooled client.
+    Returns a response object exposing status_code, headers, text, content and json().
+    """
+    client = get_client()
+    return client.get(url, headers=headers, params=params, timeout=timeout or DEFAULT_TIMEOUT)
+
+
+def post(url: str, headers: Optional[Dict[str, str]] = None, json: Any = None, timeout: Optional[float] = None):
+    """
+    Issue a POST with a JSON body through the shared pooled client.
+    """
+    client = get_client()
+    return client.post(url, headers=headers, json=json, timeout=timeout or DEFAULT_TIMEOUT)